@@ -1,21 +1,48 @@
 # Game Ver 1.9.3.1
 # Dependencies: pip install mutagen
 
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # No banner on import; init_runtime() starts pygame.
 import pygame
 import random
 import sys
-import os
 import math
+import time
 import json
+import gzip
 import glob
-from mutagen import File  # Reads audio metadata safely
-import tkinter as tk
-from tkinter import filedialog
-import copy  # Needed for deepcopy
+import threading
+import tempfile
+import atexit
+try:
+    import sqlite3
+except ImportError:  # Some embedded Python builds ship without sqlite3.
+    sqlite3 = None
+from tetrafusion_core.engine import (
+    GRID_WIDTH, GRID_HEIGHT, BOARD_SIZES, SHAPES, SHAPE_LOOKUP, ROTATION_LOOKUP, FALL_SPEEDS, get_shape_index,
+    is_danger_zone_active, valid_position, Board, Bot, FinesseAnalyzer, finesse_table,
+)
+from tetrafusion_core.audio import (
+    get_music_files, SoundBank, MIXER_PROFILE_NAMES, mixer_profile_config,
+)
+from tetrafusion_core.render import (
+    sdl2_video, paint_fill, paint_surface, paint_stack_layer, get_overlay, paint_overlay, paint_dust, paint_trail,
+    paint_sparks, paint_ghost_piece, paint_ghost_outline, execute_render_commands, RenderWorker, GpuRenderer,
+)
+from tetrafusion_core.input import InputMapper, InputClock, open_joysticks, player_input_mappers
+from tetrafusion_core import ui
+from tetrafusion_core.ui import SceneManager, screen_scene, main_menu, pause_game, display_game_over
+try:
+    from tetrafusion_core import features  # NumPy batch planner for the spectator wall bots.
+except ImportError:
+    features = None
+try:
+    import numpy  # Only used by the tile-map stack renderer.
+    import pygame.surfarray
+except ImportError:
+    numpy = None
 
-pygame.init()
-pygame.mixer.set_num_channels(32)
-pygame.mixer.init()
+ui.bind_game(sys.modules[__name__])  # The menus read the window, fonts and settings through this module.
 
 GAME_CAPTION = "TetraFusion 1.9.3.1"  # Moved to top
 
@@ -26,118 +53,20 @@ MUSIC_END_EVENT = pygame.USEREVENT + 1
 custom_music_playlist = []  # Sorted list of music files (alphabetical order)
 current_track_index = 0
 
-# List of common audio file extensions
-AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".ogg", ".aac", ".m4a", ".wma"}
-
 # -------------------------- Helper Functions --------------------------
-def load_sound(file_path):
-    """Attempt to load a sound file; if missing, print a warning and return None."""
-    if os.path.exists(file_path):
-        try:
-            return pygame.mixer.Sound(file_path)
-        except Exception as e:
-            print(f"Error loading sound {file_path}: {e}")
-            return None
-    else:
-        print(f"Sound file not found: {file_path}")
-        return None
-
-def get_music_files(directory):
-    """
-    Recursively search the given directory for valid audio files.
-    Uses both file extension checking and Mutagen to ensure the file is playable.
-    The search order is as follows:
-      1. Process files in the current directory first. Within the directory, files are sorted so that
-         filenames starting with digits (0-9) come first, then those starting with English letters (A-Z),
-         then all other files.
-      2. Then process each subdirectory (in sorted order using the same criteria), appending their files.
-    Returns a list of valid file paths in the order they are found.
-    """
-    music_files = []
-    unsupported_files = []
-    
-    try:
-        items = os.listdir(directory)
-    except Exception as e:
-        print(f"Error reading directory {directory}: {e}")
-        return []
-
-    # Separate items into files and subdirectories, ignoring hidden items.
-    files = []
-    subdirs = []
-    for item in items:
-        if item.startswith('.'):
-            continue  # Skip hidden files/directories.
-        full_path = os.path.join(directory, item)
-        if os.path.isfile(full_path):
-            files.append(item)
-        elif os.path.isdir(full_path):
-            subdirs.append(item)
-    
-    # Define a key function for sorting:
-    # Category 0: Files starting with a digit (0-9)
-    # Category 1: Files starting with an English letter (A-Z)
-    # Category 2: All others (e.g., non-English characters, symbols)
-    def sort_key(name):
-        first_char = name[0]
-        if first_char.isdigit():
-            cat = 0
-        elif "A" <= first_char.upper() <= "Z":
-            cat = 1
-        else:
-            cat = 2
-        return (cat, name.upper())
-    
-    # Sort the files and subdirectories using the key.
-    files.sort(key=sort_key)
-    subdirs.sort(key=sort_key)
-    
-    # Process files in the current directory.
-    for file in files:
-        full_path = os.path.join(directory, file)
-        ext = os.path.splitext(full_path)[1].lower()
-        # Check if file extension is a known audio format.
-        if ext in AUDIO_EXTENSIONS:
-            try:
-                # Verify the file with Mutagen (checks actual audio header)
-                if File(full_path) is not None:
-                    music_files.append(full_path)
-                else:
-                    unsupported_files.append(file)
-            except Exception as e:
-                print(f"Skipping {file}: Error reading file - {e}")
-                unsupported_files.append(file)
-        else:
-            unsupported_files.append(file)
-    
-    # Process each subdirectory recursively.
-    for sub in subdirs:
-        sub_path = os.path.join(directory, sub)
-        # Append files from the subdirectory after processing the current directory.
-        music_files.extend(get_music_files(sub_path))
-    
-    # Print unsupported files (if any) along with supported formats.
-    if unsupported_files:
-        print(f"Unsupported files detected in '{directory}':")
-        for file in unsupported_files:
-            print(f"  {file}")
-        print("Supported formats are:", ", ".join(sorted(AUDIO_EXTENSIONS)))
-    
-    return music_files
-
 def update_custom_music_playlist(settings):
     """Updates the custom music playlist based on user settings."""
     global custom_music_playlist, current_track_index
 
-    if not settings.get('use_custom_music', False):
+    if not settings.use_custom_music:
         custom_music_playlist = [BACKGROUND_MUSIC_PATH]
         current_track_index = 0
         return
 
-    music_directory = settings['music_directory'].strip()
+    music_directory = settings.music_directory.strip()
     if not os.path.isdir(music_directory):
         print("Invalid music directory; defaulting to default background music.")
-        settings['music_directory'] = ""
+        settings.music_directory = ""
         save_settings(settings)
         custom_music_playlist = [BACKGROUND_MUSIC_PATH]
         current_track_index = 0
@@ -162,55 +91,21 @@ def update_custom_music_playlist(settings):
     custom_music_playlist = valid_playlist
     current_track_index = 0
 
-# macOS Dialog Thing
-
-if sys.platform == "darwin":
-    try:
-        from AppKit import NSOpenPanel, NSApplication
-    except ImportError:
-        NSOpenPanel = None
-
-    def select_music_directory():
-        # Use NSOpenPanel on macOS if available.
-        if NSOpenPanel is None:
-            # Fallback if PyObjC is not installed.
-            root = tk.Tk()
-            root.withdraw()
-            selected = filedialog.askdirectory()
-            root.destroy()
-            return selected
-        panel = NSOpenPanel.openPanel()
-        panel.setCanChooseFiles_(False)
-        panel.setCanChooseDirectories_(True)
-        panel.setAllowsMultipleSelection_(False)
-        result = panel.runModal()
-        # Restore focus to the game window.
-        NSApplication.sharedApplication().activateIgnoringOtherApps_(True)
-        if result == 1:
-            # panel.URL() returns an NSURL; we need its path.
-            return panel.URL().path()
-        return ""
-else:
-    # On non-macOS, simply use tkinter's filedialog.
-    def select_music_directory():
-        root = tk.Tk()
-        root.withdraw()
-        selected = filedialog.askdirectory()
-        root.destroy()
-        return selected
-
-
 # -------------------------- Constants --------------------------
-SCREEN_WIDTH = 450
-SCREEN_HEIGHT = 930
 BLOCK_SIZE = 30
-GRID_WIDTH = SCREEN_WIDTH // BLOCK_SIZE
-GRID_HEIGHT = SCREEN_HEIGHT // BLOCK_SIZE
+SCREEN_WIDTH = GRID_WIDTH * BLOCK_SIZE
+SCREEN_HEIGHT = GRID_HEIGHT * BLOCK_SIZE
 SUBWINDOW_WIDTH = 369
 DOUBLE_CLICK_TIME = 300
 
-hold_piece = None
-hold_used = False  # Prevent repeated holds until the current piece locks in
+# Gameplay and effects advance in fixed steps regardless of the render rate.
+SIMULATION_HZ = 120
+SIMULATION_STEP = 1000.0 / SIMULATION_HZ   # ms per simulation tick
+EFFECT_HZ = 60                             # Rate the particle constants were tuned for
+EFFECT_DT = EFFECT_HZ / SIMULATION_HZ      # Effect frames advanced per simulation tick
+MAX_FRAME_TIME = 250                       # Longest frame the simulation will catch up on
+FPS_CHOICES = [30, 60, 120, 144, 240, 0]   # Render targets (0 = uncapped)
+
 
 YELLOW = (255, 255, 0)
 WHITE = (255, 255, 255)
@@ -229,58 +124,247 @@ MULTIPLE_LINE_CLEAR_SOUND_PATH = os.path.join(AUDIO_FOLDER, "MultipleLineclear.o
 GAME_OVER_SOUND_PATH = os.path.join(AUDIO_FOLDER, "GAMEOVER.ogg")
 HEARTBEAT_SOUND_PATH = os.path.join(AUDIO_FOLDER, "heartbeat_grid_almost_full.ogg")
 
-line_clear_sound = load_sound(LINE_CLEAR_SOUND_PATH)
-multiple_line_clear_sound = load_sound(MULTIPLE_LINE_CLEAR_SOUND_PATH)
-game_over_sound = load_sound(GAME_OVER_SOUND_PATH)
-heartbeat_sound = load_sound(HEARTBEAT_SOUND_PATH)
+sound_bank = SoundBank()  # Sounds are loaded by init_runtime() once the mixer is open.
+sound_bank.load("line_clear", LINE_CLEAR_SOUND_PATH, "clear")
+sound_bank.load("multiple_line_clear", MULTIPLE_LINE_CLEAR_SOUND_PATH, "clear")
+sound_bank.load("game_over", GAME_OVER_SOUND_PATH, "jingle")
+sound_bank.load("heartbeat", HEARTBEAT_SOUND_PATH, "ambient")
 heartbeat_playing = False
 
-# -------------------------- Tetromino Shapes --------------------------
-SHAPES = [
-    [[1, 1, 1], [0, 1, 0]],
-    [[1, 1], [1, 1]],
-    [[1, 1, 0], [0, 1, 1]],
-    [[0, 1, 1], [1, 1, 0]],
-    [[1, 1, 1, 1]],
-    [[1, 0, 0], [1, 1, 1]],
-    [[0, 0, 1], [1, 1, 1]]
-]
-
-# -------------------------- Helper for Rotations --------------------------
-def rotate_matrix(matrix):
-    """Rotates a matrix (list of lists) 90° clockwise."""
-    return [list(row) for row in zip(*matrix[::-1])]
-
-# -------------------------- Updated: get_shape_index Function --------------------------
-def get_shape_index(tetromino):
+# -------------------------- Quality Governor --------------------------
+# tier: (particle emission scale, particle cap per effect list, explosion particles per
+# cleared cell, alpha-composited ghost piece and shadow). Ordered from most to least expensive.
+QUALITY_TIERS = {
+    "high": (1.0, 3000, 45, True),
+    "medium": (0.6, 1200, 24, True),
+    "low": (0.3, 300, 10, False),
+    "minimal": (0.0, 100, 4, False),
+}
+QUALITY_TIER_NAMES = tuple(QUALITY_TIERS)
+FRAME_BUDGET_MS = 1000 / 60
+QUALITY_DOWNGRADE_FRAMES = 30    # Frames over 90% of the budget before dropping a tier.
+QUALITY_UPGRADE_FRAMES = 180     # Frames under 50% of the budget before raising a tier.
+
+class QualityGovernor:
+    """
+    Picks the effects tier from measured frame work time (simulation, effects and drawing).
+    An exponential moving average that stays over 90% of FRAME_BUDGET_MS steps down a tier;
+    one that stays under 50% steps back up more slowly, so the tier does not flap. A tier
+    locked from the options menu is used as is. Effects read the current tier's values
+    from plain attributes.
+    """
+    def __init__(self, budget=FRAME_BUDGET_MS):
+        self.budget = budget
+        self.average = 0.0
+        self.over = 0
+        self.under = 0
+        self.tier = 0
+        self.locked = False
+        self.set_tier(0)
+
+    def set_tier(self, tier):
+        self.tier = tier
+        self.name = QUALITY_TIER_NAMES[tier]
+        self.emission, self.particle_cap, self.explosion_particles, self.composited_ghost = QUALITY_TIERS[self.name]
+        self.over = self.under = 0
+
+    def lock(self, settings):
+        """Settings listener: a named tier is fixed, 'auto' hands control back to the governor."""
+        self.locked = settings.quality_tier != "auto"
+        if self.locked:
+            self.set_tier(QUALITY_TIER_NAMES.index(settings.quality_tier))
+
+    def frame(self, work_ms):
+        self.average += (work_ms - self.average) * 0.1
+        if self.locked:
+            return
+        if self.average > self.budget * 0.9:
+            self.over += 1
+            self.under = 0
+        elif self.average < self.budget * 0.5:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+        if self.over >= QUALITY_DOWNGRADE_FRAMES and self.tier < len(QUALITY_TIER_NAMES) - 1:
+            self.set_tier(self.tier + 1)
+        elif self.under >= QUALITY_UPGRADE_FRAMES and self.tier > 0:
+            self.set_tier(self.tier - 1)
+
+quality_governor = QualityGovernor()
+
+# -------------------------- Mixer Latency Profiles --------------------------
+mixer_config = (44100, 512)  # What the mixer was last opened with; pygame's defaults at import.
+music_resume = None          # (track, start offset, monotonic time) of the last resumed playback.
+
+def current_music_track():
+    if settings.use_custom_music and custom_music_playlist:
+        return custom_music_playlist[current_track_index]
+    return BACKGROUND_MUSIC_PATH
+
+def music_position(track):
+    """Estimates the playback position in seconds; pygame only reports the time since play()."""
+    position = pygame.mixer.music.get_pos() / 1000
+    if music_resume and music_resume[0] == track and abs(time.monotonic() - music_resume[2] - position) < 0.5:
+        position += music_resume[1]  # Still the playback started by the last resume.
+    try:
+        from mutagen import File  # Reads audio metadata safely
+        length = File(track).info.length
+        if length:
+            position %= length  # The default background music loops.
+    except Exception:
+        pass
+    return position
+
+def apply_mixer_profile(changed_settings=None):
     """
-    Returns the index of the given tetromino shape in the SHAPES list.
-    Checks all four rotations to find a match.
-    If no match is found, prints an error and returns None.
+    Reopens the mixer with the buffer of the selected profile. Sound effects are reloaded
+    for the new format and the current track resumes from the same position.
     """
-    for index, shape in enumerate(SHAPES):
-        candidate = tetromino
-        for _ in range(4):
-            if candidate == shape:
-                return index
-            candidate = rotate_matrix(candidate)
-    print("Error: Tetromino shape not found in SHAPES list.")
-    return None
+    global mixer_config, music_resume
+    config = mixer_profile_config(settings)
+    if config == mixer_config and pygame.mixer.get_init():
+        return
+    track = None
+    if pygame.mixer.get_init() and pygame.mixer.music.get_busy():
+        track = current_music_track()
+        position = music_position(track)
+        volume = pygame.mixer.music.get_volume()
+    pygame.mixer.quit()
+    try:
+        pygame.mixer.init(frequency=config[0], buffer=config[1])
+        mixer_config = config
+    except pygame.error as e:
+        print(f"Error reopening the mixer with buffer {config[1]}: {e}")
+        try:
+            pygame.mixer.init(frequency=mixer_config[0], buffer=mixer_config[1])
+        except pygame.error as e:
+            # E.g. the device is gone: carry on without sound until the profile is changed again.
+            print(f"Error reopening the mixer: {e}. Audio is disabled.")
+    if not pygame.mixer.get_init():
+        sound_bank.reserve_channels()
+        sound_bank.sounds = dict.fromkeys(sound_bank.sounds)  # Sounds of the closed mixer.
+        return
+    pygame.mixer.set_num_channels(32)
+    sound_bank.reload()
+    if track is None:
+        return
+    try:
+        pygame.mixer.music.load(track)
+        pygame.mixer.music.set_volume(volume)
+        if track == BACKGROUND_MUSIC_PATH:
+            pygame.mixer.music.play(-1, start=position)
+        else:
+            pygame.mixer.music.play(0, start=position)  # Play once so MUSIC_END_EVENT fires.
+            pygame.mixer.music.set_endevent(MUSIC_END_EVENT)
+        music_resume = (track, position, time.monotonic())
+    except pygame.error as e:
+        print(f"Error resuming music: {e}")
 
 # -------------------------- Fonts --------------------------
 TETRIS_FONT_PATH = "assets/tetris-blocks.TTF"
-try:
-    tetris_font_large = pygame.font.Font(TETRIS_FONT_PATH, 40)
-    tetris_font_medium = pygame.font.Font(TETRIS_FONT_PATH, 27)
-    tetris_font_small = pygame.font.Font(TETRIS_FONT_PATH, 18)
-    tetris_font_smaller = pygame.font.Font(TETRIS_FONT_PATH, 16)
-    tetris_font_tiny = pygame.font.Font(TETRIS_FONT_PATH, 14)
-except FileNotFoundError:
-    print(f"Font file not found: {TETRIS_FONT_PATH}")
-    sys.exit()
-
-screen = pygame.display.set_mode((SCREEN_WIDTH + SUBWINDOW_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption(GAME_CAPTION)
+tetris_font_large = tetris_font_medium = tetris_font_small = None
+tetris_font_smaller = tetris_font_tiny = None
+
+def load_fonts():
+    global tetris_font_large, tetris_font_medium, tetris_font_small, tetris_font_smaller, tetris_font_tiny
+    try:
+        tetris_font_large = pygame.font.Font(TETRIS_FONT_PATH, 40)
+        tetris_font_medium = pygame.font.Font(TETRIS_FONT_PATH, 27)
+        tetris_font_small = pygame.font.Font(TETRIS_FONT_PATH, 18)
+        tetris_font_smaller = pygame.font.Font(TETRIS_FONT_PATH, 16)
+        tetris_font_tiny = pygame.font.Font(TETRIS_FONT_PATH, 14)
+    except FileNotFoundError:
+        print(f"Font file not found: {TETRIS_FONT_PATH}")
+        sys.exit()
+
+# -------------------------- Display and Scaling --------------------------
+# Everything is drawn at LOGICAL_SIZE into 'screen' and presented with one scale operation,
+# so layouts only ever deal in logical coordinates.
+LOGICAL_SIZE = (SCREEN_WIDTH + SUBWINDOW_WIDTH, SCREEN_HEIGHT)
+DISPLAY_FIT = 0.9  # Fraction of the desktop a new window may cover.
+
+display_surface = None  # The window.
+screen = None           # Logical backbuffer; the window itself when no scaling is needed.
+scale_target = None     # Letterboxed subsurface of the window the backbuffer is scaled into.
+display_size = None
+display_scaling = "smooth"
+RENDER_BACKENDS = ("software", "gpu")
+gpu_renderer = None     # GpuRenderer when the gpu backend is active; see open_gpu_renderer().
+
+def fitted_window_size():
+    """Largest window with the logical aspect ratio that covers at most DISPLAY_FIT of the desktop."""
+    try:
+        desktop_width, desktop_height = pygame.display.get_desktop_sizes()[0]
+    except (pygame.error, IndexError):
+        return LOGICAL_SIZE
+    scale = min(desktop_width * DISPLAY_FIT / LOGICAL_SIZE[0], desktop_height * DISPLAY_FIT / LOGICAL_SIZE[1])
+    if display_scaling == "integer" and scale >= 1:
+        scale = int(scale)
+    return (int(LOGICAL_SIZE[0] * scale), int(LOGICAL_SIZE[1] * scale))
+
+def layout_display():
+    """Places the scaled backbuffer in the window; runs on open and whenever the window is resized."""
+    global screen, scale_target, display_size
+    display_size = display_surface.get_size()
+    if display_size == LOGICAL_SIZE:
+        screen = display_surface  # Nothing to scale: draw straight into the window.
+        scale_target = None
+        return
+    if screen is None or screen is display_surface or screen.get_size() != LOGICAL_SIZE:
+        screen = pygame.Surface(LOGICAL_SIZE).convert()
+    scale = min(display_size[0] / LOGICAL_SIZE[0], display_size[1] / LOGICAL_SIZE[1])
+    if display_scaling == "integer" and scale >= 1:
+        scale = int(scale)
+    target_rect = pygame.Rect(0, 0, int(LOGICAL_SIZE[0] * scale), int(LOGICAL_SIZE[1] * scale))
+    target_rect.center = (display_size[0] // 2, display_size[1] // 2)
+    display_surface.fill(BLACK)
+    scale_target = display_surface.subsurface(target_rect)
+
+def present_display():
+    """Scales the logical backbuffer into the window with a single scale call and flips."""
+    if gpu_renderer is not None:
+        gpu_renderer.present_surface(screen)
+        return
+    if display_surface.get_size() != display_size:
+        layout_display()
+    if scale_target is not None:
+        target_size = scale_target.get_size()
+        if target_size[0] % LOGICAL_SIZE[0] == 0 and target_size[1] % LOGICAL_SIZE[1] == 0:
+            pygame.transform.scale(screen, target_size, scale_target)  # Exact multiple: keep pixels crisp.
+        else:
+            pygame.transform.smoothscale(screen, target_size, scale_target)
+    pygame.display.flip()
+
+def window_to_logical(pos):
+    """Maps a window position (e.g. a mouse event) to logical coordinates."""
+    if scale_target is None or gpu_renderer is not None:  # SDL already maps events for a renderer.
+        return pos
+    offset_x, offset_y = scale_target.get_abs_offset()
+    width, height = scale_target.get_size()
+    return ((pos[0] - offset_x) * LOGICAL_SIZE[0] // width, (pos[1] - offset_y) * LOGICAL_SIZE[1] // height)
+
+def apply_display_mode(settings=None):
+    """
+    Opens the window. With vsync the SDL renderer scales the logical size in hardware
+    (pygame.SCALED); otherwise the window is fitted to the desktop and present_display()
+    scales the backbuffer into it.
+    """
+    global display_surface, display_scaling
+    if gpu_renderer is not None:
+        return  # The GPU renderer scales in hardware and owns the window.
+    if settings is not None:
+        display_scaling = settings.display_scaling
+        if settings.vsync:
+            try:
+                display_surface = pygame.display.set_mode(LOGICAL_SIZE, pygame.SCALED | pygame.RESIZABLE, vsync=1)
+                layout_display()
+                return
+            except pygame.error as e:
+                print(f"VSync unavailable ({e}); using the default display mode.")
+    display_surface = pygame.display.set_mode(fitted_window_size(), pygame.RESIZABLE)
+    layout_display()
+
 clock = pygame.time.Clock()
 
 subwindow_visible = True
@@ -294,108 +378,311 @@ sound_bar_rect = None
 game_command = None  # "restart" or "menu" when a button is clicked
 
 # -------------------------- Settings System --------------------------
-# -------------------------- Load Json --------------------------
-def load_settings(filename="settings.json"):
-    """Loads game settings from a JSON file, ensuring all required keys exist."""
-    default_settings = {
-        "controls": {
-            "left": pygame.K_LEFT,
-            "right": pygame.K_RIGHT,
-            "down": pygame.K_DOWN,
-            "rotate": pygame.K_UP,
-            "pause": pygame.K_p,
-            "hard_drop": pygame.K_SPACE,
-            "hold": pygame.K_c,
-            "skip_track": pygame.K_x
-        },
-        "controller_controls": {
-            "left": None,
-            "right": None,
-            "down": None,
-            "rotate": None,
-            "hard_drop": None,
-            "hold": None,
-            "pause": None,
-            "skip_track": None
-        },
-        "controller_menu_navigation": {
+SETTINGS_VERSION = 1
+SETTINGS_SAVE_DELAY = 0.5  # Seconds of quiet before a settings change is written.
+
+# Migration hooks: SETTINGS_MIGRATIONS[n] upgrades a saved dict from version n to n + 1.
+def _migrate_settings_v0(data):
+    # Version 0 files predate the version field; their layout is unchanged.
+    return data
+
+SETTINGS_MIGRATIONS = {
+    0: _migrate_settings_v0,
+}
+
+def migrate_settings(data):
+    """
+    Runs every migration hook between the saved version and SETTINGS_VERSION. A file from a
+    newer version is left as it is: the settings this version knows are loaded from it, and
+    its version stays so saving does not stamp it down (see Settings.load_dict).
+    """
+    version = data.get("version", 0)
+    if isinstance(version, bool) or not isinstance(version, int) or version < 0:
+        raise ValueError(f"settings version {version!r} is not a whole number")
+    if version > SETTINGS_VERSION:
+        print(f"Settings file is from a newer version ({version}); loading the settings this version knows.")
+        return data
+    while version < SETTINGS_VERSION:
+        data = SETTINGS_MIGRATIONS[version](data)
+        version += 1
+    data["version"] = SETTINGS_VERSION
+    return data
+
+def write_json_atomic(filename, data):
+    """Writes JSON via a temp file, fsync and rename, so a crash never leaves a partial file."""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, filename)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+class SettingsStore:
+    """
+    Debounced background writer for settings files.
+    schedule() returns immediately; rapid changes within SETTINGS_SAVE_DELAY coalesce
+    into one atomic write on a worker thread. flush() writes anything pending now and
+    runs automatically at interpreter exit.
+    """
+    def __init__(self, delay=SETTINGS_SAVE_DELAY):
+        self.delay = delay
+        self.pending = {}  # filename -> serialized settings
+        self.deadline = None
+        self.condition = threading.Condition()
+        self.thread = None
+        # Held from taking a batch until it is written, so batches reach disk in the order
+        # they were taken and flush() waits for a write already in progress.
+        self.write_lock = threading.Lock()
+
+    def schedule(self, filename, data):
+        with self.condition:
+            self.pending[filename] = data
+            self.deadline = time.monotonic() + self.delay
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="TetraFusion settings", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                # Wait until no new change arrived for a full delay.
+                while self.pending and time.monotonic() < self.deadline:
+                    self.condition.wait(self.deadline - time.monotonic())
+            self._write_pending()
+
+    def _write_pending(self):
+        with self.write_lock:
+            with self.condition:
+                batch, self.pending = self.pending, {}
+            self._write(batch)
+
+    def _write(self, batch):
+        for filename, data in batch.items():
+            try:
+                write_json_atomic(filename, data)
+            except Exception as e:
+                print(f"Error saving settings: {e}")
+
+    def flush(self):
+        """Writes anything pending on the calling thread, after any write already in progress."""
+        self._write_pending()
+
+settings_store = SettingsStore()
+atexit.register(settings_store.flush)
+
+# -------------------------- Settings Schema --------------------------
+# name: (kind, default, constraint). Every saved value is validated once against this at
+# load time; consumers then read plain attributes from the Settings object.
+DIFFICULTIES = ('easy', 'normal', 'hard', 'very hard')
+
+SETTINGS_SCHEMA = {
+    "controls": ("keymap", {
+        "left": pygame.K_LEFT,
+        "right": pygame.K_RIGHT,
+        "down": pygame.K_DOWN,
+        "rotate": pygame.K_UP,
+        "pause": pygame.K_p,
+        "hard_drop": pygame.K_SPACE,
+        "hold": pygame.K_c,
+        "skip_track": pygame.K_x
+    }, None),
+    "controller_controls": ("buttonmap", {
+        "left": None,
+        "right": None,
+        "down": None,
+        "rotate": None,
+        "hard_drop": None,
+        "hold": None,
+        "pause": None,
+        "skip_track": None
+    }, None),
+    "controller_menu_navigation": ("buttonmap", {
         "up": None,
         "down": None,
         "select": None,
         "back": None
-    },
-        "difficulty": "normal",
-        "flame_trails": True,
-        "grid_color": [200, 200, 200],
-        "grid_opacity": 255,
-        "grid_lines": True,
-        "ghost_piece": True,
-        "music_enabled": True,
-        "use_custom_music": False,
-        "music_directory": ""
-    }
+    }, None),
+    "difficulty": ("enum", "normal", DIFFICULTIES),
+    "flame_trails": ("bool", True, None),
+    "grid_color": ("color", (200, 200, 200), None),
+    "grid_opacity": ("int", 255, (0, 255)),
+    "grid_lines": ("bool", True, None),
+    "ghost_piece": ("bool", True, None),
+    "finesse_trainer": ("bool", False, None),
+    "music_enabled": ("bool", True, None),
+    "use_custom_music": ("bool", False, None),
+    "music_directory": ("str", "", None),
+    "das": ("int", 150, (0, 1000)),
+    "arr": ("int", 50, (0, 1000)),
+    "show_input_latency": ("bool", False, None),
+    "target_fps": ("int", 60, (0, 1000)),
+    "vsync": ("bool", False, None),
+    "threaded_render": ("bool", False, None),
+    "record_stats": ("bool", True, None),
+    "audio_profile": ("enum", "balanced", MIXER_PROFILE_NAMES),
+    "audio_buffer": ("int", 512, (128, 4096)),
+    "quality_tier": ("enum", "auto", ("auto",) + QUALITY_TIER_NAMES),
+    "display_scaling": ("enum", "smooth", ("smooth", "integer")),
+    "render_backend": ("enum", "software", RENDER_BACKENDS),
+    "wall_boards": ("int", 8, (1, 16)),
+    "board_size": ("enum", "tetrafusion", tuple(BOARD_SIZES)),
+    "stack_renderer": ("enum", "blits", ("blits", "tilemap")),
+}
+
+def coerce_setting(name, value):
+    """Validates a value for the named setting. Returns the normalized value or raises ValueError."""
+    kind, default, constraint = SETTINGS_SCHEMA[name]
+    if kind == "bool":
+        if isinstance(value, bool):
+            return value
+    elif kind == "int":
+        if isinstance(value, int) and not isinstance(value, bool):
+            low, high = constraint
+            return min(high, max(low, value))
+    elif kind == "str":
+        if isinstance(value, str):
+            return value
+    elif kind == "enum":
+        if value in constraint:
+            return value
+    elif kind == "color":
+        if (isinstance(value, (list, tuple)) and len(value) == 3
+                and all(isinstance(c, int) and 0 <= c <= 255 for c in value)):
+            return tuple(value)
+    elif kind == "keymap":
+        if isinstance(value, dict):
+            keymap = dict(default)
+            for control, key in value.items():
+                if control not in default:
+                    continue
+                if isinstance(key, str):  # Saved files store key names.
+                    try:
+                        key = pygame.key.key_code(key.lower())
+                    except (KeyError, ValueError):
+                        print(f"Warning: Unrecognized key '{key}' in settings. Resetting to default.")
+                        continue
+                if isinstance(key, int) and not isinstance(key, bool):
+                    keymap[control] = key
+            return keymap
+    elif kind == "buttonmap":
+        if isinstance(value, dict):
+            buttons = dict(default)
+            for control, button in value.items():
+                if control in default and (button is None or (isinstance(button, int) and not isinstance(button, bool))):
+                    buttons[control] = button
+            return buttons
+    raise ValueError(f"invalid value {value!r} for setting '{name}'")
+
+class Settings:
+    """
+    Typed, validated settings. Every field in SETTINGS_SCHEMA is a slot, so hot paths read
+    plain attributes instead of doing dict lookups with defaults. Assigning a field validates
+    it and notifies the callbacks subscribed to that field. Code that mutates one of the
+    binding dicts in place calls notify() itself.
+    """
+    __slots__ = tuple(SETTINGS_SCHEMA) + ("_listeners", "_version", "_unknown")
+
+    def __init__(self):
+        object.__setattr__(self, "_listeners", {})
+        object.__setattr__(self, "_version", SETTINGS_VERSION)
+        object.__setattr__(self, "_unknown", {})  # Keys of a newer version's file, written back as they were.
+        for name, (kind, default, constraint) in SETTINGS_SCHEMA.items():
+            object.__setattr__(self, name, dict(default) if isinstance(default, dict) else default)
+
+    def __setattr__(self, name, value):
+        if name not in SETTINGS_SCHEMA:
+            raise AttributeError(f"unknown setting '{name}'")
+        value = coerce_setting(name, value)
+        changed = getattr(self, name) != value
+        object.__setattr__(self, name, value)
+        if changed:
+            self.notify(name)
+
+    def subscribe(self, names, callback):
+        """Calls callback(settings) whenever one of the named settings changes."""
+        for name in names:
+            self._listeners.setdefault(name, []).append(callback)
+
+    def notify(self, name):
+        for callback in self._listeners.get(name, ()):
+            callback(self)
+
+    def load_dict(self, data):
+        """Validates every known key in a saved dict; invalid values keep their default."""
+        version = data.get("version", SETTINGS_VERSION)
+        if version > SETTINGS_VERSION:
+            object.__setattr__(self, "_version", version)
+            object.__setattr__(self, "_unknown", {name: value for name, value in data.items()
+                                                  if name != "version" and name not in SETTINGS_SCHEMA})
+        for name in SETTINGS_SCHEMA:
+            if name not in data:
+                continue
+            try:
+                object.__setattr__(self, name, coerce_setting(name, data[name]))
+            except ValueError as e:
+                print(f"Warning: {e}. Using the default.")
+
+    def to_dict(self):
+        """Returns a JSON-ready dict, with keyboard bindings stored as key names."""
+        data = {"version": self._version, **self._unknown}
+        for name, (kind, default, constraint) in SETTINGS_SCHEMA.items():
+            value = getattr(self, name)
+            if kind == "keymap":
+                value = {control: pygame.key.name(key).upper() for control, key in value.items()}
+            elif kind == "buttonmap":
+                value = dict(value)
+            elif kind == "color":
+                value = list(value)
+            data[name] = value
+        return data
+
+settings = Settings()  # The defaults until main() loads settings.json.
+
+# -------------------------- Load Json --------------------------
+def load_settings(filename="settings.json"):
+    """Loads game settings from a JSON file and validates them once against SETTINGS_SCHEMA."""
+    settings = Settings()
 
     if not os.path.exists(filename):
-        save_settings(default_settings, filename)  # Save defaults if no file exists.
-        return default_settings
+        save_settings(settings, filename)  # Save defaults if no file exists.
+        return settings
 
     try:
         with open(filename, "r") as file:
             saved_settings = json.load(file)
+        if not isinstance(saved_settings, dict):
+            raise ValueError("settings file does not contain an object")
+        settings.load_dict(migrate_settings(saved_settings))
+        return settings
 
-        # Ensure required keys exist:
-        saved_settings.setdefault("controls", {})
-        saved_settings.setdefault("controller_controls", default_settings["controller_controls"])
-        saved_settings.setdefault("controller_menu_navigation", default_settings["controller_menu_navigation"])
-
-        # Convert string keys back to pygame key constants for controls.
-        for key, default_value in default_settings["controls"].items():
-            if key in saved_settings["controls"]:
-                val = saved_settings["controls"][key]
-                if isinstance(val, str):  # Convert string to key constant.
-                    try:
-                        saved_settings["controls"][key] = pygame.key.key_code(val.lower())
-                    except KeyError:
-                        print(f"Warning: Unrecognized key '{val}' in settings. Resetting to default.")
-                        saved_settings["controls"][key] = default_value
-                elif not isinstance(val, int):  # If invalid, reset.
-                    saved_settings["controls"][key] = default_value
-            else:
-                saved_settings["controls"][key] = default_value
-
-        # Ensure every key from default_settings exists in saved_settings.
-        for key, default_value in default_settings.items():
-            if key not in saved_settings:
-                saved_settings[key] = default_value
-
-        return saved_settings
-
-    except (json.JSONDecodeError, KeyError) as e:
+    except (json.JSONDecodeError, ValueError) as e:
         print(f"Error loading settings ({e}), using defaults.")
-        return default_settings
+        # Keep the unreadable file for inspection instead of silently overwriting it.
+        try:
+            os.replace(filename, filename + ".corrupt")
+        except OSError:
+            pass
+        return settings
 
 # -------------------------- Save Json --------------------------
 def save_settings(settings, filename="settings.json"):
-    """Saves the game settings to a JSON file, ensuring key names are stored as strings."""
+    """
+    Saves the game settings to a JSON file, ensuring key names are stored as strings.
+    The settings are serialized immediately but written in the background by settings_store.
+    """
     try:
-        settings_to_save = {
-            "controls": {control: pygame.key.name(key).upper() for control, key in settings["controls"].items()},
-            "controller_controls": {control: settings["controller_controls"].get(control) for control in settings.get("controller_controls", {})},
-            "controller_menu_navigation": {control: settings["controller_menu_navigation"].get(control) for control in settings.get("controller_menu_navigation", {})},
-            "difficulty": settings.get("difficulty", "normal"),
-            "flame_trails": settings.get("flame_trails", True),
-            "grid_color": settings.get("grid_color", [200, 200, 200]),
-            "grid_opacity": settings.get("grid_opacity", 255),
-            "grid_lines": settings.get("grid_lines", True),
-            "ghost_piece": settings.get("ghost_piece", True),
-            "music_enabled": settings.get("music_enabled", True),
-            "use_custom_music": settings.get("use_custom_music", False),
-            "music_directory": settings.get("music_directory", "")
-        }
-
-        with open(filename, "w") as file:
-            json.dump(settings_to_save, file, indent=4)
-
+        settings_store.schedule(filename, settings.to_dict())
     except Exception as e:
         print(f"Error saving settings: {e}")
 
@@ -404,6 +691,8 @@ class DustParticle:
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.angle = random.uniform(math.pi, math.pi*2)
         self.speed = random.uniform(1.0, 3.0)
         self.age = 0
@@ -412,25 +701,36 @@ class DustParticle:
         self.color = (random.randint(100, 150), random.randint(50, 100), 0)
         self.alpha = 255
 
-    def update(self):
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-        self.speed *= 0.92
-        self.age += 1
+    def update(self, dt=1.0):
+        # dt is measured in 60 Hz effect frames, so dt=1 matches the original tuning.
+        self.prev_x, self.prev_y = self.x, self.y
+        self.x += math.cos(self.angle) * self.speed * dt
+        self.y += math.sin(self.angle) * self.speed * dt
+        self.speed *= 0.92 ** dt
+        self.age += dt
         self.alpha = max(0, 255 - (self.age / self.max_age) * 255)
-        self.size = max(2, self.size * 0.95)
+        self.size = max(2, self.size * 0.95 ** dt)
 
-    def draw(self, screen):
+    def render_command(self, alpha=1.0):
+        """Returns an immutable draw command for this particle, or None once it has faded."""
         if self.age >= self.max_age:
-            return
-        surface = pygame.Surface((self.size*2, self.size*2), pygame.SRCALPHA)
-        pygame.draw.circle(surface, (*self.color, int(self.alpha)), (int(self.size), int(self.size)), int(self.size))
-        screen.blit(surface, (int(self.x - self.size), int(self.y - self.size)))
+            return None
+        # Interpolate between the last two simulation states.
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        return (paint_dust, x, y, self.size, self.color, int(self.alpha))
+
+    def draw(self, screen, alpha=1.0):
+        command = self.render_command(alpha)
+        if command:
+            paint_dust(screen, *command[1:])
 
 class TrailParticle:
     def __init__(self, x, y, direction):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.direction = direction
         if direction == "left":
             self.angle = random.uniform(math.pi/2, 3*math.pi/2)
@@ -454,24 +754,30 @@ class TrailParticle:
         self.drift_x = random.uniform(-0.5, 0.5)
         self.drift_y = random.uniform(-0.5, 0.5)
 
-    def update(self, wind_force=(0,0), screen=None):
-        self.x += math.cos(self.angle) * self.speed + self.drift_x + wind_force[0]
-        self.y += math.sin(self.angle) * self.speed + self.drift_y + wind_force[1]
+    def update(self, wind_force=(0,0), screen=None, dt=1.0):
+        # dt is measured in 60 Hz effect frames, so dt=1 matches the original tuning.
+        self.prev_x, self.prev_y = self.x, self.y
+        self.x += (math.cos(self.angle) * self.speed + self.drift_x + wind_force[0]) * dt
+        self.y += (math.sin(self.angle) * self.speed + self.drift_y + wind_force[1]) * dt
         if screen:
             self.x = max(self.size, min(screen.get_width()-self.size, self.x))
             self.y = max(self.size, min(screen.get_height()-self.size, self.y))
-        self.speed *= 0.92
-        self.drift_x *= 0.7
-        self.drift_y *= 0.7
-        self.y += self.gravity
-        self.age += 1
-        self.size = max(5, self.size * 0.95)
-
-    def draw(self, screen):
+        self.speed *= 0.92 ** dt
+        self.drift_x *= 0.7 ** dt
+        self.drift_y *= 0.7 ** dt
+        self.y += self.gravity * dt
+        self.age += dt
+        self.size = max(5, self.size * 0.95 ** dt)
+
+    def render_command(self, alpha=1.0, bounds=None):
+        """Returns an immutable draw command for this particle, or None if it is not visible."""
         if self.age >= self.max_age:
-            return
-        if not (0 <= self.x <= screen.get_width() and 0 <= self.y <= screen.get_height()):
-            return
+            return None
+        # Interpolate between the last two simulation states.
+        x = self.prev_x + (self.x - self.prev_x) * alpha
+        y = self.prev_y + (self.y - self.prev_y) * alpha
+        if bounds and not (0 <= x <= bounds[0] and 0 <= y <= bounds[1]):
+            return None
         color_progress = self.age / self.max_age
         if color_progress < 0.33:
             color = self.colors[0]
@@ -479,69 +785,107 @@ class TrailParticle:
             color = self.colors[1]
         else:
             color = self.colors[2]
-        alpha = int(255 * (1 - color_progress**1.5))
-        radius = int(self.size)
-        blended_color = (color[0], color[1], color[2], alpha)
-        particle_surface = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
-        pygame.draw.circle(particle_surface, blended_color, (radius, radius), radius)
-        screen.blit(particle_surface, (int(self.x - radius), int(self.y - radius)))
+        opacity = int(255 * (1 - color_progress**1.5))
+        return (paint_trail, x, y, int(self.size), (color[0], color[1], color[2], opacity))
+
+    def draw(self, screen, alpha=1.0):
+        command = self.render_command(alpha, screen.get_size())
+        if command:
+            paint_trail(screen, *command[1:])
 
 class Explosion:
-    def __init__(self, x, y, color, particle_count=30, max_speed=8, duration=45):
+    """
+    A group of burst particles sharing one lifetime.
+    Each particle carries its own color, so a single Explosion can hold the bursts
+    for every cell of a line clear instead of allocating one object per cell.
+    """
+    def __init__(self, x=None, y=None, color=None, particle_count=30, max_speed=8, duration=45, scale=1.0):
         self.x = x
         self.y = y
         self.color = color
+        self.max_speed = max_speed
+        self.scale = scale  # Shrinks the burst spread and spark size for small boards.
         self.particles = []
         self.lifetime = duration
+        if color is not None:
+            self.add_burst(x, y, color, particle_count)
+
+    def add_burst(self, x, y, color, particle_count):
+        max_speed = self.max_speed
+        spread = 15 * self.scale
+        uniform = random.uniform
         for _ in range(particle_count):
+            px = x + uniform(-spread,spread)
+            py = y + uniform(-spread,spread)
+            # [x, y, vx, vy, gravity, alpha, color, previous x, previous y]
             self.particles.append([
-                x + random.uniform(-15,15),
-                y + random.uniform(-15,15),
-                random.uniform(-max_speed, max_speed),
-                random.uniform(-max_speed, max_speed),
-                random.uniform(0.1, 0.3),
-                random.randint(200,255)
+                px,
+                py,
+                uniform(-max_speed, max_speed),
+                uniform(-max_speed, max_speed),
+                uniform(0.1, 0.3),
+                random.randint(200,255),
+                color,
+                px,
+                py
             ])
 
-    def update(self):
-        self.lifetime -= 1
+    def update(self, dt=1.0):
+        # dt is measured in 60 Hz effect frames, so dt=1 matches the original tuning.
+        self.lifetime -= dt
+        fade = 4 * dt
         for p in self.particles:
-            p[0] += p[2]
-            p[1] += p[3]
-            p[3] += p[4]
-            p[5] = max(0, p[5]-4)
-
-    def draw(self, surface, offset=(0,0)):
+            p[7] = p[0]
+            p[8] = p[1]
+            p[0] += p[2] * dt
+            p[1] += p[3] * dt
+            p[3] += p[4] * dt
+            p[5] = max(0, p[5]-fade)
+
+    def render_command(self, offset=(0,0), alpha=1.0):
+        """Returns an immutable draw command holding every visible spark."""
+        sparks = []
         for p in self.particles:
             if p[5] > 0:
-                size = 4 + int(p[5]/50)
-                pygame.draw.circle(surface, (*self.color, p[5]),
-                                   (int(p[0]+offset[0]), int(p[1]+offset[1])), size)
-                                                         
-# -------------------------- Joystick Initialization --------------------------
-joystick = None
-if pygame.joystick.get_count() > 0:
-    joystick = pygame.joystick.Joystick(0)
-    joystick.init()
-
-# -------------------------- Tetromino Bag --------------------------
-class TetrominoBag:
-    def __init__(self, shapes):
-        self.shapes = shapes
-        self.bag = []
-        self.refill_bag()
-
-    def refill_bag(self):
-        self.bag = self.shapes[:]
-        random.shuffle(self.bag)
-
-    def get_next_tetromino(self):
-        if not self.bag:
-            self.refill_bag()
-        return self.bag.pop()
+                # Interpolate between the last two simulation states.
+                x = p[7] + (p[0] - p[7]) * alpha
+                y = p[8] + (p[1] - p[8]) * alpha
+                sparks.append(((*p[6], int(p[5])), (int(x+offset[0]), int(y+offset[1])),
+                               max(1, int((4 + int(p[5]/50)) * self.scale))))
+        return (paint_sparks, tuple(sparks))
+
+    def draw(self, surface, offset=(0,0), alpha=1.0):
+        paint_sparks(surface, self.render_command(offset, alpha)[1])
+
+# -------------------------- Input --------------------------
+input_mapper = InputMapper()  # Every keyboard and joystick; the spectator wall adds one per player.
+input_clock = InputClock()
 
 # -------------------------- Drawing Functions --------------------------
-def draw_3d_block(screen, color, x, y, block_size):
+def block_sprite(color, block_size):
+    """Returns the cached sprite for a raised block; see render_3d_block for the drawing itself."""
+    key = (color, block_size)
+    sprite = block_sprites.get(key)
+    if sprite is None:
+        # The side faces reach 5 px below the block and the 2 px outlines 1 px past its right edge.
+        sprite = pygame.Surface((block_size + 2, block_size + 6), pygame.SRCALPHA)
+        if block_size >= BEVEL_MIN_BLOCK_SIZE:
+            render_3d_block(sprite, color, 0, 0, block_size)
+        else:
+            render_flat_block(sprite, color, 0, 0, block_size)
+        if pygame.display.get_surface() is not None:  # There is no display surface under the GPU backend.
+            sprite = sprite.convert_alpha()
+        block_sprites[key] = sprite
+    return sprite
+
+def draw_3d_block(surface, color, x, y, block_size):
+    surface.blit(block_sprite(color, block_size), (x, y))
+
+# Block sprites are drawn once per (color, size) instead of as polygons every frame.
+block_sprites = {}
+BEVEL_MIN_BLOCK_SIZE = 16  # Smaller blocks (e.g. on the spectator wall) are drawn flat.
+
+def render_3d_block(screen, color, x, y, block_size):
     top_color = tuple(min(255, c+40) for c in color)
     side_color = tuple(max(0, c-40) for c in color)
     front_color = color
@@ -559,19 +903,38 @@ def draw_3d_block(screen, color, x, y, block_size):
     pygame.draw.polygon(screen, outline_color, left_polygon, 2)
     pygame.draw.polygon(screen, outline_color, right_polygon, 2)
 
+def render_flat_block(screen, color, x, y, block_size):
+    pygame.draw.rect(screen, color, (x, y, block_size, block_size))
+    pygame.draw.rect(screen, tuple(max(0, c-80) for c in color), (x, y, block_size, block_size), 1)
+
 # ---------- FIXED draw_3d_grid (using full opacity value and thicker lines) ----------
-def draw_3d_grid(grid_surface, grid_color, grid_opacity):
-    if not settings.get('grid_lines', True):
+def draw_3d_grid(grid_surface, grid_color, grid_opacity, block_size=BLOCK_SIZE):
+    if not settings.grid_lines:
         grid_surface.fill((0, 0, 0, 0))
         return
     grid_surface.fill((0, 0, 0, 0))
+    width, height = grid_surface.get_size()
     alpha_color = (grid_color[0], grid_color[1], grid_color[2], grid_opacity)
     thickness = 2  # Thicker grid lines
-    for x in range(0, SCREEN_WIDTH, BLOCK_SIZE):
-        pygame.draw.line(grid_surface, alpha_color, (x, 0), (x, SCREEN_HEIGHT), thickness)
-    for y in range(0, SCREEN_HEIGHT, BLOCK_SIZE):
-        pygame.draw.line(grid_surface, alpha_color, (0, y), (SCREEN_WIDTH, y), thickness)
-    pygame.draw.line(grid_surface, alpha_color, (SCREEN_WIDTH - 1, 0), (SCREEN_WIDTH - 1, SCREEN_HEIGHT), thickness)
+    for x in range(0, width, block_size):
+        pygame.draw.line(grid_surface, alpha_color, (x, 0), (x, height), thickness)
+    for y in range(0, height, block_size):
+        pygame.draw.line(grid_surface, alpha_color, (0, y), (width, y), thickness)
+    pygame.draw.line(grid_surface, alpha_color, (width - 1, 0), (width - 1, height), thickness)
+
+# The grid overlay only depends on grid_color, grid_opacity and grid_lines (and the board's
+# block size and visible area), so each one is drawn once and rebuilt only when a setting changes.
+grid_overlays = {}
+
+def get_grid_overlay(size=(SCREEN_WIDTH, SCREEN_HEIGHT), block_size=BLOCK_SIZE):
+    overlay = grid_overlays.get((size, block_size))
+    if overlay is None:
+        overlay = grid_overlays[(size, block_size)] = pygame.Surface(size, pygame.SRCALPHA)
+        draw_3d_grid(overlay, settings.grid_color, settings.grid_opacity, block_size)
+    return overlay
+
+def invalidate_grid_overlay(changed_settings=None):
+    grid_overlays.clear()
 
 def load_high_score(filename="high_score.txt"):
     try:
@@ -586,63 +949,328 @@ def load_high_score(filename="high_score.txt"):
         print(f"Error loading high score: {e}")
         return 0, "---"
 
-def save_high_score(high_score, high_score_name, filename="high_score.txt"):
-    try:
-        with open(filename, "w") as file:
-            file.write(f"{high_score} {high_score_name}")
-    except Exception as e:
-        print(f"Error saving high score: {e}")
+# -------------------------- Leaderboard --------------------------
+LEADERBOARD_SIZE = 10
+LEADERBOARD_FIELDS = ("name", "score", "lines", "level", "pieces", "duration", "seed",
+                      "difficulty", "timestamp", "day")
 
-high_score, high_score_name = load_high_score()
+class Leaderboard:
+    """
+    Ranked high score table with per-day and all-time boards for each difficulty.
+    Entries are stored in SQLite when it is available, otherwise they are appended to a
+    JSON-lines file. submit() only queues the entry; a background thread writes it, and
+    queued entries are merged into query results so the game-over screen never waits on disk.
+    SQLite keeps the top LEADERBOARD_SIZE rows of the all-time board and of today's board;
+    older days drop out as new scores arrive.
+    """
+    def __init__(self, db_filename="leaderboard.db", log_filename="leaderboard.jsonl",
+                 legacy_filename="high_score.txt", size=LEADERBOARD_SIZE):
+        self.db_filename = db_filename
+        self.log_filename = log_filename
+        self.legacy_filename = legacy_filename
+        self.size = size
+        self.pending = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.connection = None
+        self.entries = None  # In-memory copy of the append-only file when SQLite is unavailable.
+
+    # ---------------- Storage ----------------
+    def _open(self):
+        if self.connection is not None or self.entries is not None:
+            return
+        if sqlite3 is not None:
+            try:
+                self.connection = self._connect()
+            except sqlite3.Error as e:
+                print(f"Error opening leaderboard database ({e}), using {self.log_filename}.")
+                self.connection = None
+        if self.connection is None:
+            self.entries = []
+            try:
+                with open(self.log_filename, "r") as file:
+                    for line in file:
+                        try:
+                            self.entries.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue  # Skip a line cut short by a crash.
+            except FileNotFoundError:
+                pass
+        if not self.top("normal", 1) and os.path.exists(self.legacy_filename):
+            # Carry over the score from the old single-line high score file.
+            legacy_score, legacy_name = load_high_score(self.legacy_filename)
+            if legacy_score > 0:
+                self.submit({"name": legacy_name, "score": legacy_score, "difficulty": "normal"})
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_filename)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, "
+            "score INTEGER, lines INTEGER, level INTEGER, pieces INTEGER, duration INTEGER, "
+            "seed INTEGER, difficulty TEXT, timestamp REAL, day TEXT)")
+        connection.execute("CREATE INDEX IF NOT EXISTS scores_all_time ON scores (difficulty, score DESC)")
+        connection.execute("CREATE INDEX IF NOT EXISTS scores_daily ON scores (difficulty, day, score DESC)")
+        connection.commit()
+        return connection
+
+    def _run(self):
+        connection = None
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                entry = self.pending[0]
+            if self.entries is None:
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    self._write_sqlite(connection, entry)
+                except sqlite3.Error as e:
+                    print(f"Error saving high score: {e}")
+            else:
+                self._write_log(entry)
+            with self.condition:
+                self.pending.remove(entry)
+                self.condition.notify_all()
+
+    def _write_sqlite(self, connection, entry):
+        connection.execute(
+            f"INSERT INTO scores ({', '.join(LEADERBOARD_FIELDS)}) "
+            f"VALUES ({', '.join('?' for _ in LEADERBOARD_FIELDS)})",
+            [entry[field] for field in LEADERBOARD_FIELDS])
+        connection.execute(
+            "DELETE FROM scores WHERE difficulty = ? "
+            "AND id NOT IN (SELECT id FROM scores WHERE difficulty = ? ORDER BY score DESC, id LIMIT ?) "
+            "AND id NOT IN (SELECT id FROM scores WHERE difficulty = ? AND day = ? ORDER BY score DESC, id LIMIT ?)",
+            (entry["difficulty"], entry["difficulty"], self.size,
+             entry["difficulty"], entry["day"], self.size))
+        connection.commit()
+
+    def _write_log(self, entry):
+        try:
+            with open(self.log_filename, "a") as file:
+                file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+        except OSError as e:
+            print(f"Error saving high score: {e}")
+
+    # ---------------- Queries ----------------
+    def submit(self, entry):
+        """Queues a finished game for writing. Missing fields get neutral defaults."""
+        self._open()
+        now = time.time()
+        entry = dict({"name": "---", "score": 0, "lines": 0, "level": 1, "pieces": 0, "duration": 0,
+                      "seed": 0, "difficulty": "normal", "timestamp": now,
+                      "day": time.strftime("%Y-%m-%d", time.localtime(now))}, **entry)
+        if self.entries is not None:
+            self.entries.append(entry)
+        with self.condition:
+            self.pending.append(entry)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="TetraFusion leaderboard", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def top(self, difficulty, k=None, day=None):
+        """Returns the best k entries for a difficulty, all-time or for one day ("YYYY-MM-DD")."""
+        self._open()
+        k = k or self.size
+        if self.entries is not None:
+            rows = [e for e in self.entries
+                    if e.get("difficulty") == difficulty and (day is None or e.get("day") == day)]
+        else:
+            query = f"SELECT {', '.join(LEADERBOARD_FIELDS)} FROM scores WHERE difficulty = ?"
+            params = [difficulty]
+            if day is not None:
+                query += " AND day = ?"
+                params.append(day)
+            query += " ORDER BY score DESC, id LIMIT ?"
+            params.append(k)
+            try:
+                rows = [dict(zip(LEADERBOARD_FIELDS, row)) for row in self.connection.execute(query, params)]
+            except sqlite3.Error as e:
+                print(f"Error loading high scores: {e}")
+                rows = []
+            seen = {row["timestamp"] for row in rows}
+            with self.condition:
+                rows += [e for e in self.pending if e["difficulty"] == difficulty
+                         and (day is None or e["day"] == day) and e["timestamp"] not in seen]
+        rows.sort(key=lambda e: -e["score"])  # Stable, so earlier entries win ties.
+        return rows[:k]
+
+    def today(self, difficulty, k=None):
+        return self.top(difficulty, k, time.strftime("%Y-%m-%d"))
+
+    def best(self, difficulty):
+        """Returns (score, name) of the all-time best for a difficulty."""
+        rows = self.top(difficulty, 1)
+        return (rows[0]["score"], rows[0]["name"]) if rows else (0, "---")
+
+    def qualifies(self, difficulty, score):
+        """True if the score would place on today's board (and so possibly the all-time board)."""
+        rows = self.today(difficulty)
+        return score > 0 and (len(rows) < self.size or score > rows[-1]["score"])
+
+    def flush(self, timeout=2.0):
+        """Waits briefly for queued writes; runs at interpreter exit."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.pending and self.thread is not None and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+
+leaderboard = Leaderboard()
+atexit.register(leaderboard.flush)
+
+# Best score for the current difficulty, shown in the side panel.
+high_score, high_score_name = 0, "---"
+
+# -------------------------- Statistics Telemetry --------------------------
+STATS_DIRECTORY = "stats"
+STATS_FILENAME = "pieces.jsonl.gz"
+STATS_MAX_BYTES = 4 * 1024 * 1024   # Roll the live file over at this size...
+STATS_KEEP_FILES = 20               # ...and keep this many rolled files.
+STATS_BATCH_SIZE = 256
+STATS_RING_SIZE = 4096
+PIECE_EVENT_FIELDS = ("game", "piece", "shape", "rotation", "x", "y", "left", "right", "spawn_x",
+                      "board_width", "hard_drop", "drop", "lock_ms", "t", "lines", "level",
+                      "moves", "rotations", "held", "board_height", "soft_drops", "min_inputs")
+
+class StatsRecorder:
+    """
+    Records one tuple per locked piece into a fixed ring buffer. Recording is a slot store
+    and an index bump; every STATS_BATCH_SIZE events a background thread copies the unflushed
+    slots out and appends them as one gzip member to stats/pieces.jsonl.gz, which rolls over
+    at STATS_MAX_BYTES. If the writer ever falls a full ring behind, the oldest events are
+    dropped and counted rather than blocking the game. stats_report.py aggregates the files.
+    """
+    def __init__(self, directory=STATS_DIRECTORY, capacity=STATS_RING_SIZE, batch_size=STATS_BATCH_SIZE):
+        self.directory = directory
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.buffer = [None] * capacity
+        self.head = 0      # Total events recorded.
+        self.flushed = 0   # Events handed to the writer.
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.write_lock = threading.Lock()
+
+    def record(self, event):
+        self.buffer[self.head % self.capacity] = event
+        self.head += 1
+        if self.head - self.flushed >= self.batch_size:
+            self.request_flush()
+
+    def request_flush(self):
+        """Wakes the writer without waiting for it; used at batch boundaries and game over."""
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="TetraFusion stats", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def _take_batch(self):
+        with self.condition:
+            start = max(self.flushed, self.head - self.capacity)
+            self.dropped += start - self.flushed
+            batch = [self.buffer[i % self.capacity] for i in range(start, self.head)]
+            self.flushed = self.head
+        return batch
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.head == self.flushed:
+                    self.condition.wait()
+            with self.write_lock:
+                self._write(self._take_batch())
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            filename = os.path.join(self.directory, STATS_FILENAME)
+            if os.path.exists(filename) and os.path.getsize(filename) >= STATS_MAX_BYTES:
+                self._roll(filename)
+            # Each batch is its own gzip member; gzip readers concatenate members transparently.
+            with gzip.open(filename, "at") as file:
+                file.write(json.dumps({"fields": PIECE_EVENT_FIELDS, "rows": batch}) + "\n")
+        except OSError as e:
+            print(f"Error saving statistics: {e}")
+
+    def _roll(self, filename):
+        base = STATS_FILENAME.split(".", 1)
+        os.replace(filename, os.path.join(self.directory, f"{base[0]}-{time.strftime('%Y%m%d-%H%M%S')}.{base[1]}"))
+        rolled = sorted(glob.glob(os.path.join(self.directory, f"{base[0]}-*.{base[1]}")))
+        for old in rolled[:-STATS_KEEP_FILES]:
+            os.remove(old)
+
+    def flush(self):
+        """Writes everything still in the ring on the calling thread; runs at interpreter exit."""
+        with self.write_lock:
+            self._write(self._take_batch())
+
+stats_recorder = StatsRecorder()
+atexit.register(stats_recorder.flush)
+
+def play_line_clear_sound(result):
+    """Lock emitter: plays the line clear sound for the number of rows cleared."""
+    if result.lines_cleared == 4:
+        sound_bank.play("multiple_line_clear")
+    elif result.lines_cleared:
+        sound_bank.play("line_clear")
+
+def line_clear_explosions(board, block_size, explosions):
+    """
+    Returns the lock emitter that bursts every cleared cell of 'board' into one Explosion
+    appended to 'explosions', scaled for 'block_size' and kept under the quality tier's
+    particle cap. run_game() subscribes it; benchmark_lock.py times it.
+    """
+    scale = block_size / BLOCK_SIZE
+    half_block = block_size // 2
 
-def create_grid():
-    return [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
+    def emit_explosions(result):
+        if not result.lines_cleared:
+            return
+        explosion = Explosion(max_speed=15 * scale, duration=75, scale=scale)
+        # Particles per cleared cell, kept under the tier's cap across the whole clear.
+        burst = min(quality_governor.explosion_particles,
+                    quality_governor.particle_cap // (result.lines_cleared * board.width))
+        for y, row in result.cleared:
+            center_y = y * block_size + half_block
+            for x, cell in enumerate(row):
+                if cell:
+                    explosion.add_burst(x * block_size + half_block, center_y, COLORS[cell - 1], burst)
+        explosions.append(explosion)
+    return emit_explosions
 
-def is_danger_zone_active(grid):
-    for y in range(4):
-        if any(grid[y]):
-            return True
-    return False
+FINESSE_INPUT_LABELS = {'rotate': "Rot", 'left': "L", 'right': "R", 'das_left': "DAS L", 'das_right': "DAS R",
+                        'soft_drop': "Down"}
 
-def valid_position(tetromino, offset, grid):
-    for cy, row in enumerate(tetromino):
-        for cx, cell in enumerate(row):
-            if cell:
-                x = offset[0] + cx
-                y = offset[1] + cy
-                if x < 0 or x >= GRID_WIDTH or y >= GRID_HEIGHT or (y >= 0 and grid[y][x]):
-                    return False
-    return True
-
-def rotate_tetromino_with_kick(tetromino, offset, grid):
-    rotated = [list(row) for row in zip(*tetromino[::-1])]
-    kicks = [(0,0), (-1,0), (1,0), (0,-1), (-2,0), (2,0)]
-    for dx, dy in kicks:
-        new_offset = [offset[0]+dx, offset[1]+dy]
-        if valid_position(rotated, new_offset, grid):
-            return rotated, new_offset
-    return tetromino, offset
-
-def clear_lines(grid):
-    full_lines = [y for y in range(GRID_HEIGHT) if all(grid[y])]
-    if full_lines:
-        if len(full_lines) == 4 and multiple_line_clear_sound:
-            multiple_line_clear_sound.play()
-        elif line_clear_sound:
-            line_clear_sound.play()
-    for y in full_lines:
-        del grid[y]
-        grid.insert(0, [0 for _ in range(GRID_WIDTH)])
-    return grid, len(full_lines)
-
-def update_score(score, lines_cleared):
-    return score + lines_cleared * 100
-
-def check_game_over(grid):
-    return any(cell != 0 for cell in grid[0])
-
-def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_total,
-                   is_tetris=False, tetris_last_flash=0, tetris_flash_time=2000):
+def subwindow_surface(*args):
+    """
+    Returns the info panel for these draw_subwindow() arguments, redrawn only when they, the
+    music volume or the panel's settings change. Runs on the game thread, which owns the
+    fonts, the mixer and the button rects; the render worker only blits the result.
+    """
+    global subwindow_cache
+    is_tetris, tetris_last_flash, tetris_flash_time = args[6:9]
+    if is_tetris and pygame.time.get_ticks() - tetris_last_flash < tetris_flash_time:
+        return draw_subwindow(*args)  # The flash text changes color every frame.
+    volume = pygame.mixer.music.get_volume() if pygame.mixer.get_init() and pygame.mixer.music.get_busy() else 0
+    key = (args, volume, high_score, high_score_name, settings.use_custom_music, settings.finesse_trainer,
+           input_clock.latency() if settings.show_input_latency else None)
+    if subwindow_cache is None or subwindow_cache[0] != key:
+        subwindow_cache = (key, draw_subwindow(*args))
+    return subwindow_cache[1]
+
+subwindow_cache = None
+
+def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_total, hold_piece=None,
+                   is_tetris=False, tetris_last_flash=0, tetris_flash_time=2000, finesse=None):
+    """Draws the info panel (and sets the button rects it contains); returns a new surface."""
     global restart_button_rect, menu_button_rect, skip_button_rect, sound_bar_rect
     subwindow = pygame.Surface((SUBWINDOW_WIDTH, SCREEN_HEIGHT))
     subwindow.fill(BLACK)
@@ -659,6 +1287,26 @@ def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_t
     subwindow.blit(pieces_text, (10, 100))
     subwindow.blit(lines_text, (10, 130))
     
+    if settings.show_input_latency:
+        average_latency, worst_latency = input_clock.latency()
+        latency_text = tetris_font_tiny.render(
+            f"Input Latency: {average_latency:.0f} ms (max {worst_latency} ms)", True, WHITE)
+        subwindow.blit(latency_text, (10, SCREEN_HEIGHT - 265))
+
+    # --- Finesse Trainer: (faults, pieces judged, extra inputs on the last piece, its shortest inputs) ---
+    if settings.finesse_trainer and finesse is not None:
+        faults, judged, extra, optimal = finesse
+        summary_text = tetris_font_tiny.render(
+            f"Finesse: {faults} faults in {judged} pieces", True, WHITE)
+        subwindow.blit(summary_text, (10, SCREEN_HEIGHT - 320))
+        if optimal is not None:
+            if extra:
+                best = ", ".join(FINESSE_INPUT_LABELS[name] for name in optimal) or "no moves"
+                last_text = tetris_font_tiny.render(f"Last: {extra} extra (best: {best})", True, (255, 120, 80))
+            else:
+                last_text = tetris_font_tiny.render("Last: optimal", True, (80, 220, 120))
+            subwindow.blit(last_text, (10, SCREEN_HEIGHT - 295))
+
     # --- Next Tetromino Section ---
     next_label = tetris_font_small.render("Next:", True, WHITE)
     subwindow.blit(next_label, (10, 160))
@@ -716,7 +1364,7 @@ def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_t
             subwindow.blit(flash_text, (text_x, text_y))
     
     # --- Sound Bar ---
-    current_volume = pygame.mixer.music.get_volume() if pygame.mixer.music.get_busy() else 0
+    current_volume = pygame.mixer.music.get_volume() if pygame.mixer.get_init() and pygame.mixer.music.get_busy() else 0
     sound_label = tetris_font_small.render("Music:", True, WHITE)
     subwindow.blit(sound_label, (10, SCREEN_HEIGHT - 220))
     bar_x = 10
@@ -729,7 +1377,7 @@ def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_t
     pygame.draw.rect(subwindow, (0, 200, 0), (bar_x, bar_y, fill_width, bar_height))
     
     # --- Buttons ---
-    if settings.get('use_custom_music', False):
+    if settings.use_custom_music:
         # If custom music is ON, we show 3 buttons: Restart, Skip, Main Menu
         btn_space = 40
         button_width = (SUBWINDOW_WIDTH - btn_space) // 3
@@ -772,74 +1420,280 @@ def draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_t
         subwindow.blit(menu_text, (
             menu_button_rect.x + (menu_button_rect.width - menu_text.get_width()) // 2,
             menu_button_rect.y + (menu_button_rect.height - menu_text.get_height()) // 2))
-    
-    # Finally, draw the subwindow onto the main screen
-    screen.blit(subwindow, (SCREEN_WIDTH, 0))
 
-# ---------- Updated Ghost Piece with Color Option ----------
-def draw_ghost_piece(tetromino, offset, grid, color):
-    if not settings.get('ghost_piece', True):
-        return
+    return subwindow
 
+# ---------- Updated Ghost Piece with Color Option ----------
+def ghost_piece_cells(tetromino, offset, grid, block_size=BLOCK_SIZE, origin=(0, 0)):
+    """
+    Returns the pixel positions of the ghost piece cells and of the ghost cells that get
+    a shadow overlay (those resting on the floor or on a placed block).
+    'origin' is where the board's top-left cell is drawn.
+    """
     # Determine the landing position by dropping the tetromino until it can no longer move down.
     ghost_y = offset[1]
     while valid_position(tetromino, [offset[0], ghost_y + 1], grid):
         ghost_y += 1
-    ghost_offset = [offset[0], ghost_y]
-    ghost_fill_alpha = int(255 * 0.2)   # 20% opacity fill
-    ghost_outline_alpha = int(255 * 0.4)  # 40% opacity outline
-    border_thickness = 2
+    ghost_cells = []
+    shadow_cells = []
     for cy, row in enumerate(tetromino):
         for cx, cell in enumerate(row):
             if cell:
-                x = (ghost_offset[0] + cx) * BLOCK_SIZE
-                y = (ghost_offset[1] + cy) * BLOCK_SIZE
-                ghost_block = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
-                ghost_block.fill((color[0], color[1], color[2], ghost_fill_alpha))
-                pygame.draw.rect(ghost_block, (color[0], color[1], color[2], ghost_outline_alpha),
-                                 (0, 0, BLOCK_SIZE, BLOCK_SIZE), border_thickness)
-                screen.blit(ghost_block, (x, y))
-
-    # Overlay the shadow on supported cells.
-    draw_shadow_reflection(tetromino, ghost_offset, grid)
-
-
-# -------------------------- Shadow Reflection --------------------------
-def draw_shadow_reflection(tetromino, ghost_offset, grid):
-    # Set a very transparent shadow.
-    shadow_alpha = 10  # Lower value = more transparent.
-    shadow_color = (30, 30, 30)  # Dark shadow color.
-
-    # For each cell in the tetromino, determine if it is "supported"
-    # (i.e. its cell below is either the floor or occupied by a placed block).
-    # If so, draw a shadow overlay on that cell.
-    for cy, row in enumerate(tetromino):
-        for cx, cell in enumerate(row):
-            if cell:
-                gx = ghost_offset[0] + cx
-                gy = ghost_offset[1] + cy
-
-                # Check if this ghost cell is supported:
-                is_on_floor = (gy == GRID_HEIGHT - 1)
-                is_supported = (gy + 1 < GRID_HEIGHT and grid[gy + 1][gx] != 0)
+                gx = offset[0] + cx
+                gy = ghost_y + cy
+                position = (origin[0] + gx * block_size, origin[1] + gy * block_size)
+                ghost_cells.append(position)
+                # Check if this ghost cell is supported by the floor or a placed block.
+                is_on_floor = (gy == len(grid) - 1)
+                is_supported = (gy + 1 < len(grid) and grid[gy + 1][gx] != 0)
                 if is_on_floor or is_supported:
-                    x = gx * BLOCK_SIZE
-                    y = gy * BLOCK_SIZE
-                    shadow_block = pygame.Surface((BLOCK_SIZE, BLOCK_SIZE), pygame.SRCALPHA)
-                    shadow_block.fill((shadow_color[0], shadow_color[1], shadow_color[2], shadow_alpha))
-                    screen.blit(shadow_block, (x, y))
+                    shadow_cells.append(position)
+    return tuple(ghost_cells), tuple(shadow_cells)
+
+def draw_ghost_piece(tetromino, offset, grid, color):
+    if not settings.ghost_piece:
+        return
+    ghost_cells, shadow_cells = ghost_piece_cells(tetromino, offset, grid)
+    paint_ghost_piece(screen, ghost_cells, shadow_cells, color, BLOCK_SIZE)
+
+# -------------------------- Stack Compositing --------------------------
+# Two ways to draw a whole settled stack onto a BoardView's layer, with the same pixels:
+# settings.stack_renderer picks one, and benchmark_stack.py times both on this machine.
+def draw_stack_blits(surface, grid, palette, block_size, first_row=0):
+    """One cached sprite per filled cell, top row first, handed to a single Surface.blits() call."""
+    sprites = [block_sprite(color, block_size) for color in palette]
+    surface.blits([(sprites[cell - 1], (x * block_size, y * block_size))
+                   for y in range(first_row, len(grid)) for x, cell in enumerate(grid[y]) if cell], False)
+
+def stack_tiles(block_size, surface):
+    """
+    Returns the tile pixels for draw_stack_tilemap() as a (tile, x, y) array of pixel values
+    in the format of 'surface' (the pixel format is part of the cache key). Tile 0 is
+    black and tiles 1 to len(COLORS) are the blocks. Sprites hang a few pixels into the cells
+    below and to the right, so an empty cell gets one tile for every combination of the cells
+    above, to the left and above-left, composed in the order the blits path draws them.
+    """
+    key = (block_size, surface.get_bitsize(), surface.get_masks())
+    tiles = stack_tile_sets.get(key)
+    if tiles is None:
+        kinds = len(COLORS) + 1
+        sprites = [None] + [block_sprite(color, block_size) for color in COLORS]
+        tile = pygame.Surface((block_size, block_size), 0, surface)
+
+        def compose(*placed):
+            tile.fill(BLACK)
+            for sprite, position in placed:
+                if sprite:
+                    tile.blit(sprite, position)
+            return pygame.surfarray.array2d(tile)
+
+        arrays = [compose((sprite, (0, 0))) for sprite in sprites]
+        for above in range(kinds):
+            for left in range(kinds):
+                for above_left in range(kinds):
+                    arrays.append(compose((sprites[above_left], (-block_size, -block_size)),
+                                          (sprites[above], (0, -block_size)),
+                                          (sprites[left], (-block_size, 0))))
+        tiles = stack_tile_sets[key] = numpy.stack(arrays)
+    return tiles
+
+stack_tile_sets = {}
+
+def draw_stack_tilemap(surface, grid, palette, block_size, first_row=0):
+    """
+    Draws the stack as a palette-indexed tile map: each cell's tile is gathered from
+    stack_tiles() by color index and neighbours, and the pixels are written into 'surface'
+    with one copy into its pixels. 'palette' is applied by remapping the indices, so recoloring
+    the board never touches the grid. Needs NumPy.
+    """
+    tiles = stack_tiles(block_size, surface)
+    if first_row >= len(grid):
+        return
+    kinds = len(COLORS) + 1
+    remap = numpy.array([0] + [COLORS.index(color) + 1 for color in palette])
+    cells = remap[numpy.asarray(grid[first_row:])]
+    padded = numpy.pad(cells, ((1, 0), (1, 0)))  # Row 'first_row - 1' and the left wall are empty.
+    neighbours = (padded[:-1, 1:] * kinds + padded[1:, :-1]) * kinds + padded[:-1, :-1]
+    index = numpy.where(cells > 0, cells, kinds + neighbours)
+    rows, columns = cells.shape
+    target = surface.subsurface((0, first_row * block_size, columns * block_size, rows * block_size))
+    # The surface's (x, y) pixels seen as (column, x in tile, row, y in tile), filled in one assignment.
+    pixels = pygame.surfarray.pixels2d(target).reshape(columns, block_size, rows, block_size)
+    pixels[...] = tiles[index].transpose(1, 2, 0, 3)
+    del pixels  # Unlocks the surface.
+
+# -------------------------- Board View --------------------------
+class BoardView:
+    """
+    Places one Board in the play area. A board that fits keeps BLOCK_SIZE; a wider one
+    shrinks its blocks to the area's width and a taller one scrolls, the camera easing toward
+    the falling piece's landing spot. Settled blocks live on a cached stack layer that is only
+    touched after a lock (just the new cells unless rows cleared) or a palette change, so a
+    frame draws the stack with one blit of the visible rows, whatever the board size.
+    """
+    CAMERA_MARGIN = 3   # Rows kept in view below the landing spot.
+    CAMERA_EASE = 0.2   # Share of the distance to its target the camera covers per tick.
+
+    def __init__(self, board, size=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        self.board = board
+        self.size = size
+        self.block_size = min(BLOCK_SIZE, size[0] // board.width)
+        self.width = board.width * self.block_size
+        self.height = board.height * self.block_size
+        self.left = (size[0] - self.width) // 2
+        self.scrolls = self.height > size[1]
+        self.top_margin = 0 if self.scrolls else (size[1] - self.height) // 2
+        self.camera = float(self.height - size[1]) if self.scrolls else 0.0  # Starts on the empty floor.
+        # Grid lines cover the visible rows plus one, so the overlay can slide with the camera.
+        self.grid_rows = min(board.height, -(-size[1] // self.block_size) + 1)
+        self.layer = None
+        self.layer_palette = None
+        self.pending = []  # (x, y, color index) locked since the layer was drawn; None redraws it all.
+        board.lock_pipeline.subscribe(self.record_lock)
+
+    @property
+    def origin(self):
+        """Play-area position of the board's top-left cell."""
+        return self.left, self.top_margin - int(self.camera)
+
+    def record_lock(self, result):
+        # Lock emitter: a clear moves rows, so the layer is redrawn; otherwise only the new cells are.
+        if result.lines_cleared or self.pending is None:
+            self.pending = None
+            return
+        x, y = result.offset
+        for cy, row in enumerate(result.tetromino):
+            for cx, cell in enumerate(row):
+                if cell and y + cy >= 0:
+                    self.pending.append((x + cx, y + cy, result.color_index))
+
+    def follow(self):
+        """Eases the camera toward the stack under the falling piece; called once per simulation tick."""
+        if not self.scrolls:
+            return
+        board = self.board
+        heights = board.masks.heights
+        columns = range(max(0, board.offset[0]), min(board.width, board.offset[0] + len(board.tetromino[0])))
+        floor = min((board.height - heights[x] for x in columns), default=board.height)
+        target = (floor + self.CAMERA_MARGIN) * self.block_size - self.size[1]
+        target = min(max(target, 0), self.height - self.size[1])
+        self.camera += (target - self.camera) * self.CAMERA_EASE
+
+    def stack_layer(self, palette):
+        """Returns the settled blocks drawn through 'palette' on one surface the size of the board."""
+        block_size = self.block_size
+        board = self.board
+        if self.layer is None or self.pending is None or palette != self.layer_palette:
+            self.layer = pygame.Surface((self.width, self.height))
+            self.layer_palette = list(palette)
+            # Rows above the stack are empty; the row masks say where it starts.
+            first_row = board.height - board.masks.stack_height()
+            if settings.stack_renderer == 'tilemap' and numpy is not None:
+                draw_stack_tilemap(self.layer, board.grid, palette, block_size, first_row)
+            else:
+                draw_stack_blits(self.layer, board.grid, palette, block_size, first_row)
+        elif self.pending:
+            # A new surface rather than drawing into the old one, which a render thread may still be reading.
+            self.layer = self.layer.copy()
+            new_cells = set()
+            # Top row first, like a full redraw, in case several locks are pending.
+            for x, y, color_index in sorted(self.pending, key=lambda cell: (cell[1], cell[0])):
+                draw_3d_block(self.layer, palette[color_index - 1], x * block_size, y * block_size, block_size)
+                new_cells.add((x, y))
+            # The new sprites' edges hang into the cells below and to the right; where those are
+            # filled, a full redraw would cover the edges, so those blocks are drawn again over them.
+            grid = board.grid
+            for x, y in sorted({(x + dx, y + dy) for x, y in new_cells for dx, dy in ((1, 0), (0, 1), (1, 1))},
+                               key=lambda cell: (cell[1], cell[0])):
+                if x < board.width and y < board.height and grid[y][x] and (x, y) not in new_cells:
+                    self.layer.blit(block_sprite(palette[grid[y][x] - 1], block_size),
+                                    (x * block_size, y * block_size), (0, 0, block_size, block_size))
+        self.pending = []
+        return self.layer
+
+    # dx, dy: extra offset, e.g. screen shake or where the play area sits on the screen.
+    def stack_command(self, palette, dx=0, dy=0):
+        layer = self.stack_layer(palette)
+        left, top = self.origin
+        if not self.scrolls:
+            return (paint_stack_layer, layer, (left + dx, top + dy), None, self)
+        return (paint_stack_layer, layer, (left + dx, dy), (0, int(self.camera), self.width, self.size[1]), self)
+
+    def grid_command(self, dx=0, dy=0):
+        """Grid lines over the visible rows only."""
+        block_size = self.block_size
+        left, top = self.origin
+        first_row = min(max(0, -top // block_size), self.board.height - self.grid_rows)
+        overlay = get_grid_overlay((self.width, self.grid_rows * block_size), block_size)
+        return (paint_surface, overlay, (left + dx, top + first_row * block_size + dy))
+
+# -------------------------- Level Transition --------------------------
+# Frames are drawn through render commands (tetrafusion_core/render.py).
+class LevelTransition:
+    """
+    Level-up effect: the board flashes through random palettes while the new level is shown
+    over a dimmed screen. The text is rendered once per color when the transition starts, and
+    recoloring happens at render time through 'palette', so the grid itself is never modified.
+    """
+    DURATION = 2000
+    FLASH_INTERVAL = 100
+
+    def __init__(self, level, start_time):
+        self.start_time = start_time
+        self.last_flash_time = start_time
+        self.palette = COLORS
+        self.texts = [tetris_font_large.render(f"LEVEL {level}", True, color) for color in COLORS]
+
+    def update(self, now):
+        """Advances the flashing; returns False once the transition is over."""
+        if now - self.start_time > self.DURATION:
+            return False
+        if now - self.last_flash_time > self.FLASH_INTERVAL:
+            self.palette = [random.choice(COLORS) for _ in COLORS]
+            self.last_flash_time = now
+        return True
+
+    def render_commands(self):
+        text = random.choice(self.texts)
+        position = (SCREEN_WIDTH // 2 - text.get_width() // 2 + random.randint(-10, 10),
+                    SCREEN_HEIGHT // 2 - text.get_height() // 2 + random.randint(-10, 10))
+        overlay = get_overlay(BLACK, 128, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        return [(paint_overlay, overlay, BLACK, 128), (paint_surface, text, position)]
+
+def open_gpu_renderer(settings):
+    """Switches to the GPU backend, falling back to the software window if SDL cannot create a renderer."""
+    global gpu_renderer, display_surface, screen, scale_target, display_size
+    if sdl2_video is None:
+        print("GPU renderer unavailable (pygame._sdl2 is missing); using software rendering.")
+        return
+    # A window with a software surface cannot also get an SDL Renderer, so the display
+    # module's window is closed and the renderer opens its own.
+    pygame.display.quit()
+    pygame.display.init()
+    try:
+        gpu_renderer = GpuRenderer(GAME_CAPTION, fitted_window_size(), LOGICAL_SIZE, settings.vsync)
+    except sdl2_video.error as e:
+        print(f"GPU renderer unavailable ({e}); using software rendering.")
+        screen = None
+        apply_display_mode(settings)
+        pygame.display.set_caption(GAME_CAPTION)
+        return
+    display_surface = scale_target = display_size = None
+    screen = pygame.Surface(LOGICAL_SIZE)  # Menus still draw here; present_display() uploads it.
 
 # -------------------------- Custom Music Functions --------------------------
 def play_custom_music(settings):
     global custom_music_playlist, current_track_index, last_track_index
-    if not settings.get('music_enabled', True):
+    if not pygame.mixer.get_init():
+        return
+    if not settings.music_enabled:
         pygame.mixer.music.stop()
         return
 
     update_custom_music_playlist(settings)
     
     # Restore a previously saved track index if applicable; otherwise, start at 0.
-    if settings.get('use_custom_music', False) and last_track_index is not None and last_track_index < len(custom_music_playlist):
+    if settings.use_custom_music and last_track_index is not None and last_track_index < len(custom_music_playlist):
         current_track_index = last_track_index
     else:
         current_track_index = 0
@@ -866,6 +1720,8 @@ def play_custom_music(settings):
 
 def load_next_track(update_last_index=False):
     global current_track_index, last_track_index
+    if not pygame.mixer.get_init():
+        return
     # Increment track index cyclically.
     current_track_index = (current_track_index + 1) % len(custom_music_playlist)
     try:
@@ -879,1089 +1735,27 @@ def load_next_track(update_last_index=False):
 
 def skip_current_track():
     # If music is disabled, do nothing.
-    if not settings.get('music_enabled', True):
+    if not settings.music_enabled:
         return
     if custom_music_playlist:
         load_next_track(update_last_index=True)
 
 def stop_music():
-    pygame.mixer.music.stop()
+    if pygame.mixer.get_init():
+        pygame.mixer.music.stop()
     
 def handle_music_end_event():
-    if settings.get('use_custom_music', False) and custom_music_playlist:
+    if settings.use_custom_music and custom_music_playlist:
         load_next_track(update_last_index=False)
 
-# -------------------------- Menu System --------------------------
-def draw_main_menu(selected_index, menu_options):
-    """
-    Draws the main menu screen with a title and a list of selectable options.
-    The option at index 'selected_index' is highlighted.
-    """
-    screen.fill(BLACK)
-    title_text = tetris_font_large.render("TetraFusion", True, random.choice(COLORS))
-    # Draw title above the menu options.
-    screen.blit(title_text, (SCREEN_WIDTH//2 - title_text.get_width()//2, SCREEN_HEIGHT//3 - 100))
-    # Draw each menu option.
-    for i, option in enumerate(menu_options):
-        color = RED if i == selected_index else WHITE
-        option_text = tetris_font_medium.render(option, True, color)
-        x = SCREEN_WIDTH//2 - option_text.get_width()//2
-        y = SCREEN_HEIGHT//2 + i * 50
-        screen.blit(option_text, (x, y))
-    pygame.display.flip()
-
-def main_menu():
-    global game_command
-    # Start background music if enabled.
-    if settings.get('music_enabled', True):
-        if settings.get('use_custom_music', False):
-            # If custom music is enabled, start it if not already playing.
-            if not pygame.mixer.music.get_busy():
-                play_custom_music(settings)
-        else:
-            # Otherwise, load and loop the default background music.
-            if not pygame.mixer.music.get_busy():
-                try:
-                    pygame.mixer.music.load(BACKGROUND_MUSIC_PATH)
-                    pygame.mixer.music.set_volume(1.0)  # Set volume to 100%
-                    pygame.mixer.music.play(-1)  # Loop indefinitely
-                except Exception as e:
-                    print(f"Error loading default background music: {e}")
-                    
-    # Define the menu options.
-    menu_options = ["Start", "Options", "Quit"]
-    selected_index = 0
-    joy_delay = 150  # milliseconds delay for joystick hat input
-    last_move = pygame.time.get_ticks()
-    
-    # Optional: a flag to prevent repeated fallback triggers
-    fallback_triggered = False
-
-    while True:
-        draw_main_menu(selected_index, menu_options)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            elif event.type == MUSIC_END_EVENT:
-                handle_music_end_event()
-            # --- Keyboard Input ---
-            elif event.type == pygame.KEYDOWN:
-                if event.key in (pygame.K_DOWN, pygame.K_s):
-                    selected_index = (selected_index + 1) % len(menu_options)
-                elif event.key in (pygame.K_UP, pygame.K_w):
-                    selected_index = (selected_index - 1) % len(menu_options)
-                elif event.key == pygame.K_RETURN:
-                    if menu_options[selected_index] == "Start":
-                        return  # Exit menu and start game
-                    elif menu_options[selected_index] == "Options":
-                        options_menu()
-                    elif menu_options[selected_index] == "Quit":
-                        save_settings(settings)
-                        pygame.quit()
-                        sys.exit()
-                elif event.key == pygame.K_o:
-                    options_menu()
-                elif event.key == pygame.K_ESCAPE:
-                    save_settings(settings)
-                    pygame.quit()
-                    sys.exit()
-            # --- Controller Navigation using controller_menu_navigation settings ---
-            elif event.type == pygame.JOYBUTTONDOWN:
-                nav = settings.get("controller_menu_navigation", {})
-                up_btn = nav.get("up")
-                down_btn = nav.get("down")
-                select_btn = nav.get("select")
-                # Check if the pressed button matches one of our navigation bindings.
-                if up_btn is not None and event.button == up_btn:
-                    selected_index = (selected_index - 1) % len(menu_options)
-                elif down_btn is not None and event.button == down_btn:
-                    selected_index = (selected_index + 1) % len(menu_options)
-                elif select_btn is not None and event.button == select_btn:
-                    if menu_options[selected_index] == "Start":
-                        return
-                    elif menu_options[selected_index] == "Options":
-                        options_menu()
-                    elif menu_options[selected_index] == "Quit":
-                        save_settings(settings)
-                        pygame.quit()
-                        sys.exit()
-            # --- Optional: D-Pad (Hat) Navigation ---
-            elif event.type == pygame.JOYHATMOTION:
-                hx, hy = event.value
-                if hy == 1:
-                    selected_index = (selected_index - 1) % len(menu_options)
-                elif hy == -1:
-                    selected_index = (selected_index + 1) % len(menu_options)
-        
-        # Fallback for Custom Music Looping:
-        if settings.get('use_custom_music', False):
-            if not pygame.mixer.music.get_busy() and not fallback_triggered:
-                fallback_triggered = True  # Mark that fallback has been triggered.
-                load_next_track(update_last_index=False)
-            elif pygame.mixer.music.get_busy():
-                # Reset the flag when music is playing normally.
-                fallback_triggered = False
-
-        # Additionally, handle the skip command:
-        if game_command == "skip":
-            skip_current_track()
-            game_command = None
-
-        clock.tick(30)
-
-# Main Options
-def options_menu():
-    global settings, last_track_index
-    selected_option = 0
-    enter_pressed = False  # Flag to track whether Enter is held down
-    options = [
-        ('keybinds', 'Keyboard Keybinds'),
-        ('controller_keybinds', 'Controller Keybinds'),
-        ('difficulty', 'Difficulty'),
-        ('flame_trails', 'Flame Trails'),
-        ('grid_opacity', 'Grid Opacity'),
-        ('grid_lines', 'Grid Lines'),
-        ('ghost_piece', 'Ghost Piece'),
-        ('music_enabled', 'Music'),
-        ('use_custom_music', 'Use Custom Music'),
-        ('select_music_dir', 'Select Music Directory'),
-        ('back', 'Back to Main Menu')
-    ]
-    changing_key = None
-
-    # Define vertical spacing for options and desired extra bottom padding.
-    option_spacing = 45
-    extra_bottom_padding = 0
-
-    # Total height = (number of options * spacing) + extra bottom padding
-    total_options_height = (len(options) * option_spacing) + extra_bottom_padding
-
-    # Calculate base_y so that the list is vertically centered.
-    base_y = (SCREEN_HEIGHT - total_options_height) // 2
-
-    # --- Sub-Function: process_navigation_events ---
-    def process_navigation_events(options, selected_option, changing_key, enter_pressed):
-        """
-        Processes both keyboard and controller (including D-pad) navigation events
-        for the options menu. Returns updated values for selected_option, changing_key,
-        enter_pressed, and an action flag (which will be the current option key if selected,
-        or "back" if the user wants to exit).
-        """
-        action = None  # Action flag to indicate an option was chosen.
-        for event in pygame.event.get():
-            # ---------------------- QUIT EVENT ----------------------
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            # ---------------------- MUSIC END EVENT ----------------------
-            elif event.type == MUSIC_END_EVENT:
-                handle_music_end_event()
-            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
-            elif event.type == pygame.JOYBUTTONDOWN:
-                if changing_key is None:  # Only process navigation if not capturing a new key binding.
-                    nav = settings.get("controller_menu_navigation", {})
-                    up_btn = nav.get("up")
-                    down_btn = nav.get("down")
-                    select_btn = nav.get("select")
-                    back_btn = nav.get("back")
-                    if up_btn is not None and event.button == up_btn:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif down_btn is not None and event.button == down_btn:
-                        selected_option = (selected_option + 1) % len(options)
-                    elif select_btn is not None and event.button == select_btn:
-                        current_key = options[selected_option][0]
-                        # For options that capture keyboard bindings, ignore controller select.
-                        if current_key not in settings['controls']:
-                            action = current_key
-                    elif back_btn is not None and event.button == back_btn:
-                        action = "back"
-            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
-            elif event.type == pygame.JOYHATMOTION:
-                if changing_key is None:
-                    hx, hy = event.value
-                    if hy == 1:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif hy == -1:
-                        selected_option = (selected_option + 1) % len(options)
-            # ---------------------- KEYBOARD EVENTS (NAVIGATION & BINDING) ----------------------
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    if changing_key is not None:
-                        changing_key = None  # Cancel pending binding capture.
-                    else:
-                        action = "back"
-                elif changing_key is not None:
-                    # When capturing a new key binding, only keyboard keys are processed.
-                    settings['controls'][changing_key] = event.key
-                    changing_key = None
-                elif event.key == pygame.K_RETURN and not enter_pressed:
-                    enter_pressed = True  # Mark Enter as pressed.
-                    current_key = options[selected_option][0]
-                    if current_key in settings['controls']:
-                        # Begin capturing a new keyboard binding.
-                        changing_key = current_key
-                    else:
-                        action = current_key
-                elif event.key == pygame.K_UP:
-                    selected_option = (selected_option - 1) % len(options)
-                elif event.key == pygame.K_DOWN:
-                    selected_option = (selected_option + 1) % len(options)
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_RETURN:
-                    enter_pressed = False
-        return selected_option, changing_key, enter_pressed, action
-
-    # ---------------------- MAIN LOOP FOR OPTIONS MENU ----------------------
-    while True:
-        screen.fill(BLACK)
-        title_text = tetris_font_large.render("Options", True, WHITE)
-        screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 50))
-        
-        # Render each option.
-        for i, (key, label) in enumerate(options):
-            color = RED if i == selected_option else WHITE
-            text = label
-            if key in settings['controls']:
-                text = f"{label}: {pygame.key.name(settings['controls'][key]).upper()}"
-            elif key == 'difficulty':
-                text = f"Difficulty: {settings['difficulty'].capitalize()}"
-            elif key == 'flame_trails':
-                text = f"Flame Trails: {'On' if settings['flame_trails'] else 'Off'}"
-            elif key == 'grid_opacity':
-                text = f"Grid Opacity: {settings['grid_opacity']}"
-            elif key == 'grid_lines':
-                text = f"Grid Lines: {'On' if settings.get('grid_lines', True) else 'Off'}"
-            elif key == 'ghost_piece':
-                text = f"Ghost Piece: {'On' if settings.get('ghost_piece', True) else 'Off'}"
-            elif key == 'music_enabled':
-                text = f"Music: {'On' if settings.get('music_enabled', True) else 'Off'}"
-            elif key == 'use_custom_music':
-                text = f"Use Custom Music: {'On' if settings.get('use_custom_music', False) else 'Off'}"
-            elif key == 'select_music_dir':
-                dir_display = settings.get('music_directory', '')
-                text = f"Dir: {dir_display}" if dir_display else "Music Dir: Not Selected"
-            option_text = tetris_font_medium.render(text, True, color)
-            # Scale the text for select_music_dir based on whether a valid path is set.
-            if key == 'select_music_dir':
-                if settings.get('music_directory', ''):
-                    scale_factor = 0.6  # When a valid music directory is set.
-                else:
-                    scale_factor = 1.0  # When no valid music directory is set.
-                scaled_width = int(option_text.get_width() * scale_factor)
-                scaled_height = int(option_text.get_height() * scale_factor)
-                option_text = pygame.transform.scale(option_text, (scaled_width, scaled_height))
-            y_coordinate = base_y + i * option_spacing
-            screen.blit(option_text, (SCREEN_WIDTH // 2 - option_text.get_width() // 2, y_coordinate))
-        
-        pygame.display.flip()
-
-        # Call the navigation sub-function to process events.
-        selected_option, changing_key, enter_pressed, action = process_navigation_events(
-            options, selected_option, changing_key, enter_pressed
-        )
-        # Process the returned action flag.
-        if action is not None:
-            current_key = action
-            if current_key == 'keybinds':
-                keyboard_keybinds_menu()
-                pygame.event.clear()
-            elif current_key == 'controller_keybinds':
-                controller_keybinds_menu()
-                pygame.event.clear()
-            elif current_key == 'difficulty':
-                difficulties = ['easy', 'normal', 'hard', 'very hard']
-                new_idx = (difficulties.index(settings['difficulty']) + 1) % len(difficulties)
-                settings['difficulty'] = difficulties[new_idx]
-            elif current_key == 'flame_trails':
-                settings['flame_trails'] = not settings['flame_trails']
-            elif current_key == 'grid_opacity':
-                if settings['grid_opacity'] < 255:
-                    new_opacity = settings['grid_opacity'] + 64
-                    settings['grid_opacity'] = new_opacity if new_opacity <= 255 else 255
-                else:
-                    settings['grid_opacity'] = 0
-            elif current_key == 'grid_lines':
-                settings['grid_lines'] = not settings.get('grid_lines', True)
-            elif current_key == 'ghost_piece':
-                settings['ghost_piece'] = not settings.get('ghost_piece', True)
-            elif current_key == 'music_enabled':
-                settings['music_enabled'] = not settings.get('music_enabled', True)
-                if not settings['music_enabled']:
-                    stop_music()
-                else:
-                    if settings.get('use_custom_music', False):
-                        play_custom_music(settings)
-                    else:
-                        try:
-                            pygame.mixer.music.load(BACKGROUND_MUSIC_PATH)
-                            pygame.mixer.music.play(-1)
-                        except Exception as e:
-                            print(f"Error loading default music: {e}")
-            elif current_key == 'use_custom_music':
-                settings['use_custom_music'] = not settings.get('use_custom_music', False)
-                last_track_index = None
-                if settings.get('music_enabled', True):
-                    if settings.get('use_custom_music', False):
-                        play_custom_music(settings)
-                    else:
-                        try:
-                            pygame.mixer.music.load(BACKGROUND_MUSIC_PATH)
-                            pygame.mixer.music.play(-1)
-                        except Exception as e:
-                            print(f"Error loading default background music: {e}")
-                else:
-                    stop_music()
-            elif current_key == 'select_music_dir':
-                selected_dir = select_music_directory()
-                if selected_dir:
-                    settings['music_directory'] = selected_dir
-                    last_track_index = None
-                    if settings.get('use_custom_music', False) and settings.get('music_enabled', True):
-                        play_custom_music(settings)
-            elif current_key == 'back':
-                save_settings(settings)
-                return
-
-# Options Keyboard Controls            
-def keyboard_keybinds_menu():
-    selected_option = 0
-    changing_key = None
-    enter_pressed = False  # Flag to track whether Enter is held down
-
-    # Ensure the music skip key is available.
-    if 'skip_track' not in settings['controls']:
-        settings['controls']['skip_track'] = pygame.K_x
-
-    # List of keybind options: first element is the setting key,
-    # second element is a label to show.
-    keybind_options = [
-        ('left', 'Move Left'),
-        ('right', 'Move Right'),
-        ('down', 'Soft Drop'),
-        ('rotate', 'Rotate'),
-        ('hard_drop', 'Hard Drop'),
-        ('hold', 'Hold Piece'),
-        ('pause', 'Pause'),
-        ('skip_track', 'Skip Track'),
-        ('back', 'Back to Options')
-    ]
-    option_spacing = 45
-    base_y = 150  # starting vertical position
-
-    # --- Sub-Function: process_kb_nav_events ---
-    def process_kb_nav_events(options, selected_option, changing_key, enter_pressed):
-        """
-        Processes both keyboard and controller (including D-pad) navigation events
-        for the keyboard keybinds menu. Returns updated values for selected_option,
-        changing_key, enter_pressed, and an action flag.
-        
-        NOTE:
-          - This menu supports full controller navigation so that you can move up and down
-            and use the controller "back" button to exit.
-          - When the controller's select button is pressed on a bindable option,
-            binding capture is triggered (changing_key is set) so that subsequent controller keys
-            will not bind anything; only a keyboard key will be accepted.
-          - The action flag will be "back" if the user wants to exit, or None otherwise.
-        """
-        action = None  # Will hold the action if one is triggered.
-        # ---------------------- Process Each Event ----------------------
-        for event in pygame.event.get():
-            # ---------------------- QUIT EVENT ----------------------
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            # ---------------------- MUSIC END EVENT ----------------------
-            elif event.type == MUSIC_END_EVENT:
-                handle_music_end_event()
-            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
-            elif event.type == pygame.JOYBUTTONDOWN:
-                # Only process controller navigation if NOT in binding mode.
-                if changing_key is None:
-                    nav = settings.get("controller_menu_navigation", {})
-                    up_btn = nav.get("up")
-                    down_btn = nav.get("down")
-                    select_btn = nav.get("select")
-                    back_btn = nav.get("back")
-                    if up_btn is not None and event.button == up_btn:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif down_btn is not None and event.button == down_btn:
-                        selected_option = (selected_option + 1) % len(options)
-                    # Controller Back button exits the menu.
-                    elif back_btn is not None and event.button == back_btn:
-                        action = "back"
-                    # Controller Select triggers binding mode for bindable options.
-                    elif select_btn is not None and event.button == select_btn:
-                        current_key = options[selected_option][0]
-                        if current_key == "back":
-                            action = "back"
-                        else:
-                            # Trigger binding capture if this option is bindable.
-                            if current_key in settings['controls']:
-                                changing_key = current_key
-            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
-            elif event.type == pygame.JOYHATMOTION:
-                if changing_key is None:
-                    hx, hy = event.value
-                    if hy == 1:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif hy == -1:
-                        selected_option = (selected_option + 1) % len(options)
-            # ---------------------- KEYBOARD EVENTS (NAVIGATION & BINDING) ----------------------
-            elif event.type == pygame.KEYDOWN:
-                # ESC cancels binding capture or exits the menu.
-                if event.key == pygame.K_ESCAPE:
-                    if changing_key is not None:
-                        changing_key = None  # Cancel pending binding
-                    else:
-                        action = "back"
-                # If waiting for a new key, capture the key press (keyboard only).
-                elif changing_key is not None:
-                    settings['controls'][changing_key] = event.key
-                    changing_key = None
-                # Process selection with Enter (keyboard only).
-                elif event.key == pygame.K_RETURN and not enter_pressed:
-                    enter_pressed = True  # Mark Enter as pressed.
-                    current_key = options[selected_option][0]
-                    if current_key == 'back':
-                        action = "back"
-                    else:
-                        # Begin capturing a new binding for this option (keyboard only).
-                        changing_key = current_key
-                # Navigate using Up arrow.
-                elif event.key == pygame.K_UP:
-                    selected_option = (selected_option - 1) % len(options)
-                # Navigate using Down arrow.
-                elif event.key == pygame.K_DOWN:
-                    selected_option = (selected_option + 1) % len(options)
-            # ---------------------- KEYUP EVENT ----------------------
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_RETURN:
-                    enter_pressed = False  # Reset flag when Enter is released
-        return selected_option, changing_key, enter_pressed, action
-
-    # ---------------------- MAIN LOOP FOR KEYBOARD KEYBINDS MENU ----------------------
-    while True:
-        screen.fill(BLACK)
-        title_text = tetris_font_large.render("Keyboard Keybinds", True, WHITE)
-        scaled_title = pygame.transform.scale(
-            title_text,
-            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
-        )
-        screen.blit(
-            scaled_title,
-            (SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
-        )
-    
-        # Render each keybind option.
-        for i, (key, label) in enumerate(keybind_options):
-            # Decide the overall color for the label (red if selected, else white).
-            color = RED if i == selected_option else WHITE
-        
-            # Y-position for this line
-            y_coordinate = base_y + i * option_spacing
-            x_center = SCREEN_WIDTH // 2  # We'll center things horizontally
-
-            # If key is in our controls dict, we do two-part rendering: label + key
-            if key in settings['controls']:
-                # 1) Label portion
-                label_text = label + ": "
-                label_surface = tetris_font_medium.render(label_text, True, color)
-
-                # 2) Key portion - if we are capturing a binding (changing_key == key), show it in yellow
-                if changing_key == key:
-                    key_color = YELLOW
-                else:
-                    key_color = color
-
-                key_name = pygame.key.name(settings['controls'][key]).upper()
-                key_surface = tetris_font_medium.render(key_name, True, key_color)
-
-                # Now blit them side by side (still centered as a whole).
-                combined_width = label_surface.get_width() + key_surface.get_width()
-                x_start = x_center - combined_width // 2
-                screen.blit(label_surface, (x_start, y_coordinate))
-                screen.blit(key_surface, (x_start + label_surface.get_width(), y_coordinate))
-
-            else:
-                # If it's not actually in settings['controls'], just render a single label.
-                display_text = label
-                option_text = tetris_font_medium.render(display_text, True, color)
-                screen.blit(
-                    option_text,
-                    (x_center - option_text.get_width() // 2, y_coordinate)
-                )
-    
-        pygame.display.flip()
-
-        # Call the navigation sub-function to process events.
-        selected_option, changing_key, enter_pressed, action = process_kb_nav_events(
-            keybind_options, selected_option, changing_key, enter_pressed
-        )
-
-        # Process any action returned from the sub-function.
-        if action is not None:
-            if action == "back":
-                return
-
-# Options Controller Controls         
-def controller_keybinds_menu():
-    selected_option = 0
-    changing_button = None
-    enter_pressed = False  # Flag to track whether Enter is held down
-
-    # Ensure that a controller_controls dictionary exists in settings.
-    if 'controller_controls' not in settings:
-        settings['controller_controls'] = {
-            'left': None,
-            'right': None,
-            'down': None,
-            'rotate': None,
-            'hard_drop': None,
-            'hold': None,
-            'pause': None,
-            'skip_track': None
-        }
-
-    # Define your controller options.
-    controller_options = [
-        ('controller_menu_keybinds', 'Menu Nav Bindings'),
-        ('left', 'Move Left'),
-        ('right', 'Move Right'),
-        ('down', 'Soft Drop'),
-        ('rotate', 'Rotate'),
-        ('hard_drop', 'Hard Drop'),
-        ('hold', 'Hold Piece'),
-        ('pause', 'Pause'),
-        ('back', 'Back to Options')
-    ]
-    
-    # Define which options are bindable in controller_controls.
-    bindable_keys = {"left", "right", "down", "rotate", "hard_drop", "hold", "pause", "skip_track"}
-
-    option_spacing = 45
-    base_y = 150  # starting vertical position for options
-
-    # --- Sub-Function: process_ctrl_nav_events ---
-    def process_ctrl_nav_events(options, selected_option, changing_button, enter_pressed):
-        """
-        Processes both keyboard and controller (including D-pad) navigation events
-        for the controller keybinds menu. Returns updated values for selected_option,
-        changing_button, enter_pressed, and an action flag.
-        
-        NOTE:
-          - In this menu, controller keys CAN bind to controller_controls.
-          - Keyboard events are allowed for navigation and for triggering binding mode via Enter;
-            however, once binding mode is active (i.e. changing_button is not None), only
-            controller key inputs (JOYBUTTONDOWN) will update the binding.
-          - The action flag will be:
-              • "back" if the user wants to exit the menu,
-              • "menu_nav" if the user selects the "controller_menu_keybinds" option.
-          - If the "controller_menu_navigation" settings are not defined, then controller button
-            navigation via JOYBUTTONDOWN will not work—but D-pad (JOYHATMOTION) and keyboard navigation
-            will still be available.
-        """
-        action = None  # Will hold the action if one is triggered.
-        for event in pygame.event.get():
-            # ---------------------- QUIT EVENT ----------------------
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            # ---------------------- MUSIC END EVENT ----------------------
-            elif event.type == MUSIC_END_EVENT:
-                handle_music_end_event()
-            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
-            elif event.type == pygame.JOYBUTTONDOWN:
-                if changing_button is not None:
-                    # In binding mode: capture the controller button and update the binding.
-                    settings['controller_controls'][changing_button] = event.button
-                    changing_button = None
-                else:
-                    # Not in binding mode: process navigation via controller buttons.
-                    nav = settings.get("controller_menu_navigation", {})
-                    up_btn = nav.get("up")
-                    down_btn = nav.get("down")
-                    select_btn = nav.get("select")
-                    back_btn = nav.get("back")
-                    if up_btn is not None and event.button == up_btn:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif down_btn is not None and event.button == down_btn:
-                        selected_option = (selected_option + 1) % len(options)
-                    elif back_btn is not None and event.button == back_btn:
-                        action = "back"
-                    elif select_btn is not None and event.button == select_btn:
-                        current_option = options[selected_option][0]
-                        if current_option == 'back':
-                            action = "back"
-                        elif current_option == 'controller_menu_keybinds':
-                            # New: trigger the menu navigation submenu.
-                            action = "menu_nav"
-                        else:
-                            # Trigger binding capture for this option if it is bindable.
-                            if current_option in settings['controller_controls']:
-                                changing_button = current_option
-            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
-            elif event.type == pygame.JOYHATMOTION:
-                if changing_button is None:
-                    hx, hy = event.value
-                    if hy == 1:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif hy == -1:
-                        selected_option = (selected_option + 1) % len(options)
-            # ---------------------- KEYBOARD EVENTS (NAVIGATION) ----------------------
-            elif event.type == pygame.KEYDOWN:
-                # Keyboard navigation is allowed, but keyboard keys will not be used to bind.
-                if event.key == pygame.K_ESCAPE:
-                    if changing_button is not None:
-                        changing_button = None
-                    else:
-                        action = "back"
-                elif changing_button is None:
-                    if event.key == pygame.K_UP:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif event.key == pygame.K_DOWN:
-                        selected_option = (selected_option + 1) % len(options)
-                    # Use Enter to trigger binding capture (keyboard can trigger, but only controller keys will update).
-                    elif event.key == pygame.K_RETURN and not enter_pressed:
-                        enter_pressed = True
-                        current_option = options[selected_option][0]
-                        if current_option == 'back':
-                            action = "back"
-                        elif current_option == 'controller_menu_keybinds':
-                            # Trigger menu navigation submenu from keyboard as well.
-                            action = "menu_nav"
-                        else:
-                            if current_option in settings['controller_controls']:
-                                changing_button = current_option
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_RETURN:
-                    enter_pressed = False
-        return selected_option, changing_button, enter_pressed, action
-
-    # ---------------------- MAIN LOOP FOR CONTROLLER KEYBINDS MENU ----------------------
-    while True:
-        screen.fill(BLACK)
-        title_text = tetris_font_large.render("Controller Keybinds", True, WHITE)
-        scaled_title = pygame.transform.scale(
-            title_text,
-            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
-        )
-        screen.blit(
-            scaled_title,
-            (SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
-        )
-    
-        # Render each controller option.
-        for i, (key, label) in enumerate(controller_options):
-            # Overall color (red if selected, white otherwise).
-            color = RED if i == selected_option else WHITE
-        
-            # Determine position
-            y_coordinate = base_y + i * option_spacing
-            x_center = SCREEN_WIDTH // 2
-        
-            # If it's bindable, split into label + button binding
-            if key in bindable_keys:
-                # 1) label portion
-                label_text = label + ": "
-                label_surface = tetris_font_medium.render(label_text, True, color)
-
-                # 2) binding portion
-                current_binding = settings['controller_controls'].get(key)
-                if current_binding is not None:
-                    binding_str = f"Button {current_binding}"
-                else:
-                    binding_str = "(none)"
-            
-                # If currently capturing a new binding for this key => YELLOW
-                if changing_button == key:
-                    binding_color = YELLOW
-                else:
-                    binding_color = color
-
-                binding_surface = tetris_font_medium.render(binding_str, True, binding_color)
-            
-                # Position them side by side
-                combined_width = label_surface.get_width() + binding_surface.get_width()
-                x_start = x_center - (combined_width // 2)
-            
-                # Blit them
-                screen.blit(label_surface, (x_start, y_coordinate))
-                screen.blit(binding_surface, (x_start + label_surface.get_width(), y_coordinate))
-        
-            else:
-                # Non-bindable option => single string
-                display_text = label
-                option_text = tetris_font_medium.render(display_text, True, color)
-                x_pos = x_center - (option_text.get_width() // 2)
-                screen.blit(option_text, (x_pos, y_coordinate))
-    
-        pygame.display.flip()
-
-        # Process events and handle actions.
-        selected_option, changing_button, enter_pressed, action = process_ctrl_nav_events(
-            controller_options, selected_option, changing_button, enter_pressed
-        )
-        if action is not None:
-            if action == "back":
-                return
-            elif action == "menu_nav":
-                # Call the controller menu navigation bindings submenu.
-                controller_menu_nav_menu()
-
-# Options Controller Menu Keybinds
-def controller_menu_nav_menu():
-    selected_option = 0
-    changing_button = None
-    enter_pressed = False  # Flag to track whether Enter is held down
-
-    # Ensure the "controller_menu_navigation" settings exist.
-    if "controller_menu_navigation" not in settings:
-        settings["controller_menu_navigation"] = {
-            "up": None,
-            "down": None,
-            "left": None,
-            "right": None,
-            "select": None,
-            "back": None
-        }
-
-    # Define menu navigation options.
-    # The first four options are bindable; the final option ("exit") is non-bindable.
-    menu_nav_options = [
-        ("up", "Menu Up"),
-        ("down", "Menu Down"),
-        ("select", "Menu Select"),
-        ("back", "Menu Back"),
-        ("exit", "Back to Controller Keybinds")
-    ]
-    
-    # Define which options are bindable.
-    bindable_keys = {"up", "down", "select", "back"}
-
-    option_spacing = 45
-    base_y = 150  # Starting vertical position for the options
-
-    # --- Sub-Function: process_menu_nav_events ---
-    def process_menu_nav_events(options, selected_option, changing_button, enter_pressed):
-        """
-        Processes both keyboard and controller (including D-pad) navigation events
-        for the controller menu navigation bindings menu. Returns updated values for 
-        selected_option, changing_button, enter_pressed, and an action flag.
-        
-        NOTE:
-          - In this menu, binding capture is triggered by Enter (keyboard) or the controller
-            select button. However, once binding mode is active (i.e. changing_button is not None),
-            only controller key inputs (JOYBUTTONDOWN) will update the binding in settings["controller_menu_navigation"].
-          - Keyboard events are allowed for navigation but are not used to update the binding.
-          - The action flag will be "exit" (or "back") if the user selects that option.
-        """
-        action = None  # Will hold the action if one is triggered.
-        # ---------------------- Process Each Event ----------------------
-        for event in pygame.event.get():
-            # ---------------------- QUIT EVENT ----------------------
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            # ---------------------- MUSIC END EVENT ----------------------
-            elif event.type == MUSIC_END_EVENT:
-                handle_music_end_event()
-            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
-            elif event.type == pygame.JOYBUTTONDOWN:
-                if changing_button is not None:
-                    # In binding mode: capture the controller button and update the binding.
-                    settings["controller_menu_navigation"][changing_button] = event.button
-                    changing_button = None
-                else:
-                    # Not in binding mode: process navigation via controller buttons.
-                    # Lookup our controller navigation keys from settings.
-                    nav = settings.get("controller_menu_navigation", {})
-                    up_btn = nav.get("up")
-                    down_btn = nav.get("down")
-                    select_btn = nav.get("select")
-                    back_btn = nav.get("back")
-                    if up_btn is not None and event.button == up_btn:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif down_btn is not None and event.button == down_btn:
-                        selected_option = (selected_option + 1) % len(options)
-                    elif back_btn is not None and event.button == back_btn:
-                        action = "back"
-                    elif select_btn is not None and event.button == select_btn:
-                        current_option = options[selected_option][0]
-                        if current_option == "exit":
-                            action = "exit"
-                        else:
-                            # Trigger binding capture for this option if it is bindable.
-                            if current_option in bindable_keys:
-                                changing_button = current_option
-            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
-            elif event.type == pygame.JOYHATMOTION:
-                if changing_button is None:
-                    hx, hy = event.value
-                    if hy == 1:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif hy == -1:
-                        selected_option = (selected_option + 1) % len(options)
-            # ---------------------- KEYBOARD EVENTS (NAVIGATION) ----------------------
-            elif event.type == pygame.KEYDOWN:
-                # Keyboard navigation is allowed, but keyboard keys will not update the binding.
-                if event.key == pygame.K_ESCAPE:
-                    if changing_button is not None:
-                        changing_button = None  # Cancel pending binding.
-                    else:
-                        action = "back"
-                elif changing_button is None:
-                    if event.key == pygame.K_UP:
-                        selected_option = (selected_option - 1) % len(options)
-                    elif event.key == pygame.K_DOWN:
-                        selected_option = (selected_option + 1) % len(options)
-                    # Use Enter to trigger binding capture (keyboard can trigger, but binding update is done via controller).
-                    elif event.key == pygame.K_RETURN and not enter_pressed:
-                        enter_pressed = True
-                        current_option = options[selected_option][0]
-                        if current_option == "exit":
-                            action = "exit"
-                        else:
-                            if current_option in bindable_keys:
-                                changing_button = current_option
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_RETURN:
-                    enter_pressed = False
-        return selected_option, changing_button, enter_pressed, action
-
-    # ---------------------- MAIN LOOP FOR CONTROLLER MENU NAV KEYBINDS ----------------------
-    while True:
-        screen.fill(BLACK)
-        title_text = tetris_font_large.render("Menu Nav Bindings", True, WHITE)
-        scaled_title = pygame.transform.scale(
-            title_text,
-            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
-        )
-        screen.blit(
-            scaled_title,
-            (SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
-        )
-    
-        # Render each menu navigation option.
-        for i, (key, label) in enumerate(menu_nav_options):
-            # Decide the overall color (red if selected, else white).
-            color = RED if i == selected_option else WHITE
-        
-            y_coordinate = base_y + i * option_spacing
-            x_center = SCREEN_WIDTH // 2
-        
-            if key in bindable_keys:
-                # 1) Render the label part
-                label_text = label + ": "
-                label_surface = tetris_font_medium.render(label_text, True, color)
-            
-                # 2) Decide on the actual button text
-                current_binding = settings["controller_menu_navigation"].get(key)
-                if current_binding is not None:
-                    binding_str = f"Button {current_binding}"
-                else:
-                    binding_str = "(none)"
-
-                # If we're currently capturing this key's binding, make it yellow
-                if changing_button == key:
-                    binding_color = YELLOW
-                else:
-                    binding_color = color
-
-                binding_surface = tetris_font_medium.render(binding_str, True, binding_color)
-
-                # Combine side by side, still center as a whole
-                combined_width = label_surface.get_width() + binding_surface.get_width()
-                x_start = x_center - (combined_width // 2)
-            
-                # Blit
-                screen.blit(label_surface, (x_start, y_coordinate))
-                screen.blit(binding_surface, (x_start + label_surface.get_width(), y_coordinate))
-        
-            else:
-                # Non-bindable option (e.g. "exit"). Render as a single string.
-                display_text = label
-                option_text = tetris_font_medium.render(display_text, True, color)
-            
-                # If this is the "exit" option, scale it as before.
-                if key == "exit":
-                    option_text = pygame.transform.scale(
-                        option_text,
-                        (int(option_text.get_width() * 0.85), int(option_text.get_height() * 0.85))
-                    )
-            
-                screen.blit(
-                    option_text,
-                    (x_center - option_text.get_width() // 2, y_coordinate)
-                )
-
-        pygame.display.flip()
-
-        # Process events and handle actions.
-        selected_option, changing_button, enter_pressed, action = process_menu_nav_events(
-            menu_nav_options, selected_option, changing_button, enter_pressed
-        )
-        if action is not None:
-            if action == "exit" or action == "back":
-                return
-
-def pause_game():
-    global settings
-    pause_text = tetris_font_large.render("PAUSED", True, WHITE)
-    paused = True
-    pygame.event.clear(pygame.KEYDOWN)
-    
-    # Pause the music as soon as the game is paused
-    pygame.mixer.music.pause()
-    
-    while paused:
-        screen.fill(BLACK)
-        screen.blit(pause_text, (SCREEN_WIDTH // 2 - pause_text.get_width() // 2, SCREEN_HEIGHT // 2))
-        pygame.display.flip()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                save_settings(settings)
-                pygame.quit()
-                sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                # Unpause if the pause key (or Escape) is pressed on the keyboard.
-                if event.key == settings['controls']['pause'] or event.key == pygame.K_ESCAPE:
-                    paused = False
-            elif event.type == pygame.JOYBUTTONDOWN:
-                # Unpause if the controller's pause/back button is pressed.
-                if settings.get('controller_controls', {}).get('pause') is not None and event.button == settings['controller_controls']['pause']:
-                    paused = False
-
-    # Unpause the music when the game is resumed.
-    pygame.mixer.music.unpause()
-
-def display_game_over(score):
-    global high_score, high_score_name
-
-    # ---------------- Helper Functions for Duplicate Logic ----------------
-    def restart_game():
-        if settings.get('music_enabled', True):
-            if settings.get('use_custom_music', False):
-                play_custom_music(settings)
-            else:
-                try:
-                    pygame.mixer.music.load(BACKGROUND_MUSIC_PATH)
-                    pygame.mixer.music.play(-1)
-                except Exception as e:
-                    print(f"Error loading default background music: {e}")
-        else:
-            stop_music()
-        run_game()
-
-    def go_to_main_menu():
-        main_menu()
-
-    # ---------------- NEW HIGH SCORE BRANCH ----------------
-    if score > high_score:
-        initials = ""
-        input_active = True
-        while input_active:
-            screen.fill(BLACK)
-            game_over_text = tetris_font_large.render("NEW HIGH SCORE!", True, RED)
-            score_text = tetris_font_medium.render(f"Score: {score}", True, WHITE)
-            initials_text = tetris_font_medium.render(f"Enter Initials: {initials}", True, WHITE)
-            menu_text = tetris_font_small.render("Press M for Menu or ENTER to Save", True, WHITE)
-            screen.blit(game_over_text, (SCREEN_WIDTH//2 - game_over_text.get_width()//2, 50))
-            screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, 150))
-            screen.blit(initials_text, (SCREEN_WIDTH//2 - initials_text.get_width()//2, 250))
-            screen.blit(menu_text, (SCREEN_WIDTH//2 - menu_text.get_width()//2, 350))
-            pygame.display.flip()
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    save_settings(settings)
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN and initials:
-                        high_score = score
-                        high_score_name = initials
-                        save_high_score(high_score, high_score_name)
-                        input_active = False
-                    elif event.key == pygame.K_BACKSPACE:
-                        initials = initials[:-1]
-                    elif len(initials) < 3 and event.unicode.isalnum():
-                        initials += event.unicode.upper()
-                    elif event.key == pygame.K_m:
-                        go_to_main_menu()
-                        return
-                elif event.type == pygame.JOYBUTTONDOWN:
-                    if settings.get("controller_menu_navigation"):
-                        # Controller select acts like ENTER.
-                        if event.button == settings["controller_menu_navigation"].get("select"):
-                            if initials:
-                                high_score = score
-                                high_score_name = initials
-                                save_high_score(high_score, high_score_name)
-                                input_active = False
-                        # Controller back acts like M (menu).
-                        elif event.button == settings["controller_menu_navigation"].get("back"):
-                            go_to_main_menu()
-                            return
-        # After saving the high score, restart the game.
-        restart_game()
-        return
-
-    # ---------------- NORMAL GAME OVER BRANCH ----------------
-    else:
-        screen.fill(BLACK)
-        game_over_text = tetris_font_large.render("GAME OVER", True, RED)
-        score_text = tetris_font_medium.render(f"Score: {score}", True, WHITE)
-        restart_text = tetris_font_small.render("Press R to Restart", True, WHITE)
-        menu_text = tetris_font_small.render("Press M for Menu", True, WHITE)
-        screen.blit(game_over_text, (SCREEN_WIDTH//2 - game_over_text.get_width()//2, 50))
-        screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, 150))
-        screen.blit(restart_text, (SCREEN_WIDTH//2 - restart_text.get_width()//2, SCREEN_HEIGHT-130))
-        screen.blit(menu_text, (SCREEN_WIDTH//2 - menu_text.get_width()//2, SCREEN_HEIGHT-100))
-        pygame.display.flip()
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    save_settings(settings)
-                    pygame.quit()
-                    sys.exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_r:
-                        restart_game()
-                        return
-                    elif event.key == pygame.K_m:
-                        go_to_main_menu()
-                        return
-                elif event.type == pygame.JOYBUTTONDOWN:
-                    if settings.get("controller_menu_navigation"):
-                        # Controller select acts as R (restart).
-                        if event.button == settings["controller_menu_navigation"].get("select"):
-                            restart_game()
-                            return
-                        # Controller back acts as M (menu).
-                        elif event.button == settings["controller_menu_navigation"].get("back"):
-                            go_to_main_menu()
-                            return
-
-def place_tetromino(tetromino, offset, grid, color_index):
-    for cy, row in enumerate(tetromino):
-        for cx, cell in enumerate(row):
-            if cell:
-                x = offset[0] + cx
-                y = offset[1] + cy
-                if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
-                    grid[y][x] = color_index
-
 # -------------------------- Game Loop --------------------------
 def run_game():
+    """
+    Game scene. Yields the pause screen while paused and returns the game-over screen,
+    a fresh game (restart) or None (back to the menu) when it ends.
+    """
     global high_score, high_score_name, subwindow_visible, last_click_time, settings, heartbeat_playing, game_command
     global restart_button_rect, menu_button_rect, skip_button_rect, sound_bar_rect, current_track_index, custom_music_playlist
-    global hold_piece, hold_used  # Hold piece globals
 
     # Initialize joystick if available.
     joy = None
@@ -1969,287 +1763,155 @@ def run_game():
         joy = pygame.joystick.Joystick(0)
         joy.init()
 
-    # Reset hold state on game start.
-    hold_piece = None
-    hold_used = False
     game_command = None
-
-    # Retrieve our key mapping settings.
-    controls = settings['controls']              # Keyboard controls
-    cc = settings.get('controller_controls', {})   # Controller controls mapping
+    pause_requested = False
 
     # Retrieve other settings.
-    difficulty = settings['difficulty']
-    flame_trails_enabled = settings['flame_trails']
-    grid_color = tuple(settings['grid_color'])
-    grid_opacity = settings.get('grid_opacity', 255)
-    grid_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-    draw_3d_grid(grid_surface, grid_color, grid_opacity)
-
-    # Set up difficulty/fall speeds.
-    difficulty_speeds = {
-        'easy': 1500,
-        'normal': 1000,
-        'hard': 600,
-        'very hard': 400
-    }
-    base_fall_speed = difficulty_speeds.get(difficulty, 1000)
-    fall_speed = base_fall_speed
-
-    # Initialize game variables.
-    level = 1
-    lines_cleared_total = 0
-    pieces_dropped = 0
+    difficulty = settings.difficulty
+    flame_trails_enabled = settings.flame_trails
+    high_score, high_score_name = leaderboard.best(difficulty)
+
+    # Recorded with the leaderboard entry; replays the same piece sequence.
+    game_seed = random.randrange(1 << 32)
+    game_id = f"{int(time.time())}-{game_seed}"
+
+    # Per-piece input counts for the statistics recorder, reset at every spawn.
+    piece_moves = 0
+    piece_rotations = 0
+    piece_held = False
+    piece_spawn_time = 0
+    piece_soft_drops = 0
+    piece_optimal = None  # Shortest inputs for the piece being locked, set by judge_finesse().
+    finesse_analyzer = FinesseAnalyzer()
+    finesse_faults = finesse_judged = 0
+    last_finesse = (0, None)  # (extra inputs, shortest inputs) of the last locked piece.
+
+    # The rules state (grid, pieces, hold, score, level, gravity) lives in the Board;
+    # the rest of this scene is effects, sound and drawing.
+    # Horizontal auto-repeat is timed from input timestamps, not sampled per frame.
+    board_width, board_height = BOARD_SIZES[settings.board_size]
+    board = Board(FALL_SPEEDS.get(difficulty, FALL_SPEEDS['normal']), game_seed, pygame.time.get_ticks(),
+                  settings.das, settings.arr, len(COLORS), board_width, board_height)
+    view = BoardView(board)  # Block size, scrolling and the cached stack layer.
+    block_size = view.block_size
+    finesse_table(board.width)  # Built now rather than on the first lock.
     trail_particles = []
     explosion_particles = []
     dust_particles = []
     screen_shake = 0
-    grid = create_grid()
-    tetromino_bag = TetrominoBag(SHAPES)
-    tetromino = tetromino_bag.get_next_tetromino()
-    next_tetromino = tetromino_bag.get_next_tetromino()
-    shape_index = get_shape_index(tetromino)
-    if shape_index is None:
-        shape_index = 0
-    color_index = (shape_index + level - 1) % len(COLORS) + 1
-    offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-    score = 0
-    fast_fall = False
-    last_fall_time = pygame.time.get_ticks()
-    game_over = False
-    left_pressed = False
-    right_pressed = False
-    last_horizontal_move = pygame.time.get_ticks()
-    move_interval = 150
-    fast_move_interval = 50
     is_tetris = False
     tetris_flash_time = 2000
     tetris_last_flash = 0
 
-    in_level_transition = False
-    transition_start_time = 0
-    TRANSITION_DURATION = 2000
-    FLASH_INTERVAL = 100
-    last_flash_time = pygame.time.get_ticks()
-    flash_count = 0
+    level_transition = None  # LevelTransition while the level-up effect plays.
 
-    pygame.key.set_repeat(300, 100)
+    # OS key repeat would add extra shifts on top of DAS/ARR, so it stays off in game.
+    pygame.key.set_repeat()
     last_joy_move = pygame.time.get_ticks()
     joy_delay = 150  # milliseconds delay for analog stick movement
 
-    # =========================================================================
-    # tetromino Logic (hold, hard drop, line clearing, etc.)
-    # =========================================================================
-    def lock_and_update_tetromino(current_time):
-        nonlocal tetromino, offset, score, game_over, grid, lines_cleared_total
-        global hold_used  # 'hold_used' is global
-        nonlocal pieces_dropped, screen_shake, is_tetris, tetris_last_flash, level
-        nonlocal fall_speed, transition_start_time, last_flash_time, flash_count
-        nonlocal next_tetromino, shape_index, color_index, tetromino_bag
-        # Use current_time to help with timing-dependent effects.
-
-        # Calculate how far the tetromino can fall (for a hard drop).
-        hard_drop_rows = 0
-        temp_offset = offset.copy()
-        while valid_position(tetromino, [temp_offset[0], temp_offset[1] + 1], grid):
-            temp_offset[1] += 1
-            hard_drop_rows += 1
-        offset[1] = temp_offset[1]
-
-        # Update score based on drop distance.
-        score += hard_drop_rows * 2
-
-        # Generate dust particles for visual effect.
-        for _ in range(20 + hard_drop_rows * 5):
+    # -------------------------- Lock Effect Emitters --------------------------
+    lock_pipeline = board.lock_pipeline
+    lock_pipeline.subscribe(play_line_clear_sound)
+
+    @lock_pipeline.subscribe
+    def start_level_transition(result):
+        nonlocal level_transition
+        if result.level_up:
+            level_transition = LevelTransition(board.level, result.time)
+
+    @lock_pipeline.subscribe
+    def emit_dust(result):
+        # Dust cloud under the piece on every hard drop.
+        if not result.hard_drop:
+            return
+        piece_width = len(result.tetromino[0])
+        left, top = view.origin
+        dust_y = top + (result.offset[1] + len(result.tetromino)) * block_size
+        for _ in range(int((20 + result.hard_drop_rows * 5) * quality_governor.emission)):
             dust_particles.append(DustParticle(
-                (offset[0] + random.uniform(-1, len(tetromino[0]) + 1)) * BLOCK_SIZE,
-                (offset[1] + len(tetromino)) * BLOCK_SIZE
+                left + (result.offset[0] + random.uniform(-1, piece_width + 1)) * block_size,
+                dust_y
             ))
-
-        # Check if dropping results in game over.
-        if check_game_over(grid):
-            game_over = True
+        if len(dust_particles) > quality_governor.particle_cap:
+            del dust_particles[:len(dust_particles) - quality_governor.particle_cap]
+
+    @lock_pipeline.subscribe
+    def emit_line_clear_effects(result):
+        # Screen shake and the Tetris flash; the explosions are emitted by line_clear_explosions().
+        nonlocal screen_shake, is_tetris, tetris_last_flash
+        if not result.lines_cleared:
             return
-
-        # Lock tetromino: record its position and update grid.
-        original_grid = [row[:] for row in grid]
-        place_tetromino(tetromino, offset, grid, color_index)
-        hold_used = False
-        grid, lines_cleared = clear_lines(grid)
-        lines_cleared_total += lines_cleared
-        score = update_score(score, lines_cleared)
-        pieces_dropped += 1
-
-        # Trigger screen shake and explosion effects if lines were cleared.
-        if lines_cleared > 0:
-            screen_shake = 8 + lines_cleared * 3
-            full_lines = [y for y in range(GRID_HEIGHT) if all(original_grid[y])]
-            for y in full_lines:
-                for x in range(GRID_WIDTH):
-                    if original_grid[y][x] != 0:
-                        explosion_particles.append(Explosion(
-                            x * BLOCK_SIZE + BLOCK_SIZE // 2,
-                            y * BLOCK_SIZE + BLOCK_SIZE // 2,
-                            COLORS[original_grid[y][x] - 1],
-                            particle_count=45,
-                            max_speed=15,
-                            duration=75
-                        ))
-
-        # Check for a Tetris (clearing 4 lines at once).
-        if lines_cleared == 4:
+        screen_shake = 8 + result.lines_cleared * 3
+        if result.lines_cleared == 4:
             is_tetris = True
-            tetris_last_flash = current_time
-
-        # Level up if enough lines have been cleared.
-        new_level = lines_cleared_total // 10 + 1
-        if new_level > level:
-            level = new_level
-            fall_speed = max(50, int(base_fall_speed * (0.85 ** (level - 1))))
-            in_level_transition = True
-            transition_start_time = current_time
-            last_flash_time = current_time
-            flash_count = 0
-
-        # Update tetromino for the next piece.
-        tetromino = next_tetromino
-        shape_index = get_shape_index(tetromino) or 0
-        color_index = (shape_index + level - 1) % len(COLORS) + 1
-        next_tetromino = tetromino_bag.get_next_tetromino()
-        offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
+            tetris_last_flash = result.time
 
-    # =========================================================================
-    # Helper function: Process keyboard events using settings['controls']
-    # =========================================================================
-    def process_keyboard_events(events, current_time):
-        nonlocal left_pressed, right_pressed, fast_fall, offset, tetromino, last_horizontal_move
-        nonlocal shape_index, color_index, score, level, next_tetromino, tetromino_bag
-        global game_command, hold_used, hold_piece
-        for event in events:
-            if event.type == pygame.KEYDOWN:
-                # ------------------ Keyboard: Movement ------------------
-                if event.key == controls['left']:
-                    left_pressed = True
-                    new_x = offset[0] - 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                elif event.key == controls['right']:
-                    right_pressed = True
-                    new_x = offset[0] + 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                elif event.key == controls['down']:
-                    fast_fall = True
-                # ------------------ Keyboard: Rotation, Hard Drop, and Hold ------------------
-                elif event.key == controls['rotate']:
-                    rotated, new_offset = rotate_tetromino_with_kick(tetromino, offset, grid)
-                    tetromino, offset = rotated, new_offset
-                elif event.key == controls.get('hold', pygame.K_c):
-                    if not hold_used:
-                        hold_used = True
-                        if hold_piece is None:
-                            hold_piece = copy.deepcopy(tetromino)
-                            tetromino = tetromino_bag.get_next_tetromino()
-                            shape_index = get_shape_index(tetromino) or 0
-                            color_index = (shape_index + level - 1) % len(COLORS) + 1
-                            offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-                        else:
-                            tetromino, hold_piece = copy.deepcopy(hold_piece), copy.deepcopy(tetromino)
-                            shape_index = get_shape_index(tetromino) or 0
-                            color_index = (shape_index + level - 1) % len(COLORS) + 1
-                            offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-                elif event.key == controls['pause']:
-                    pause_game()
-                elif event.key == controls['hard_drop']:
-                    lock_and_update_tetromino(current_time)
-                # ------------------ Keyboard: Skip Track (Music Control) ------------------
-                elif controls.get('skip_track') and event.key == controls['skip_track']:
-                    game_command = "skip"
-            elif event.type == pygame.KEYUP:
-                if event.key == controls['left']:
-                    left_pressed = False
-                elif event.key == controls['right']:
-                    right_pressed = False
-                elif event.key == controls['down']:
-                    fast_fall = False
+    lock_pipeline.subscribe(line_clear_explosions(board, block_size, explosion_particles))
+
+    @lock_pipeline.watch
+    def judge_finesse(grid, tetromino, offset, grid_hash):
+        # Sees the grid before the piece is placed. A table lookup unless the piece was tucked or spun in.
+        nonlocal piece_optimal
+        piece_optimal = finesse_analyzer.optimal_inputs(grid, tetromino, offset, grid_hash, board.spawn_rotation)
+
+    @lock_pipeline.subscribe
+    def count_finesse_faults(result):
+        nonlocal finesse_faults, finesse_judged, last_finesse
+        if piece_optimal is None:
+            last_finesse = (0, None)
+            return
+        extra = max(0, piece_moves + piece_rotations + piece_soft_drops - len(piece_optimal))
+        finesse_judged += 1
+        finesse_faults += extra > 0
+        last_finesse = (extra, piece_optimal)
+
+    @lock_pipeline.subscribe
+    def record_piece_stats(result):
+        # One telemetry event per locked piece; stats_report.py turns these into PPS, finesse etc.
+        nonlocal piece_moves, piece_rotations, piece_held, piece_spawn_time, piece_soft_drops
+        if settings.record_stats:
+            key = tuple(map(tuple, result.tetromino))
+            shape = SHAPE_LOOKUP.get(key, 0)
+            columns = [cx for row in result.tetromino for cx, cell in enumerate(row) if cell]
+            stats_recorder.record((
+                game_id, board.pieces, shape, ROTATION_LOOKUP.get(key, 0),
+                result.offset[0], result.offset[1],
+                result.offset[0] + min(columns), result.offset[0] + max(columns),
+                board.width // 2 - len(SHAPES[shape][0]) // 2, board.width,
+                result.hard_drop, result.hard_drop_rows,
+                int(result.time - piece_spawn_time), int(result.time - game_start_time),
+                result.lines_cleared, board.level, piece_moves, piece_rotations, piece_held, board.height,
+                piece_soft_drops, None if piece_optimal is None else len(piece_optimal)
+            ))
+        piece_moves = piece_rotations = piece_soft_drops = 0
+        piece_held = False
+        piece_spawn_time = result.time
 
     # =========================================================================
-    # Helper function: Process controller events using settings['controller_controls']
+    # Helper function: Apply one abstract action (keyboard, gamepad, bot or replay)
     # =========================================================================
-    def process_controller_events(events, current_time):
-        nonlocal left_pressed, right_pressed, offset, tetromino, last_horizontal_move
-        nonlocal shape_index, color_index, next_tetromino, tetromino_bag, fast_fall
-        global game_command, hold_used, hold_piece
-        for event in events:
-            if event.type == pygame.JOYBUTTONDOWN:
-                # ------------------ Controller: Digital Button Controls ------------------
-                if cc.get('left') is not None and event.button == cc.get('left'):
-                    left_pressed = True
-                    new_x = offset[0] - 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                elif cc.get('right') is not None and event.button == cc.get('right'):
-                    right_pressed = True
-                    new_x = offset[0] + 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                elif cc.get('down') is not None and event.button == cc.get('down'):
-                    fast_fall = True  # Set fast fall when button is pressed
-                elif cc.get('rotate') is not None and event.button == cc.get('rotate'):
-                    rotated, new_offset = rotate_tetromino_with_kick(tetromino, offset, grid)
-                    tetromino, offset = rotated, new_offset
-                elif cc.get('hard_drop') is not None and event.button == cc.get('hard_drop'):
-                    lock_and_update_tetromino(current_time)
-                elif cc.get('hold') is not None and event.button == cc.get('hold'):
-                    if not hold_used:
-                        hold_used = True
-                        if hold_piece is None:
-                            hold_piece = copy.deepcopy(tetromino)
-                            tetromino = tetromino_bag.get_next_tetromino()
-                            shape_index = get_shape_index(tetromino) or 0
-                            color_index = (shape_index + level - 1) % len(COLORS) + 1
-                            offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-                        else:
-                            tetromino, hold_piece = copy.deepcopy(hold_piece), copy.deepcopy(tetromino)
-                            shape_index = get_shape_index(tetromino) or 0
-                            color_index = (shape_index + level - 1) % len(COLORS) + 1
-                            offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-                elif cc.get('pause') is not None and event.button == cc.get('pause'):
-                    pause_game()
-                elif cc.get('skip_track') is not None and event.button == cc.get('skip_track'):
-                    game_command = "skip"
-            elif event.type == pygame.JOYBUTTONUP:
-                # ------------------ Controller: Button Release (reset flags) ------------------
-                if cc.get('left') is not None and event.button == cc.get('left'):
-                    left_pressed = False
-                elif cc.get('right') is not None and event.button == cc.get('right'):
-                    right_pressed = False
-                elif cc.get('down') is not None and event.button == cc.get('down'):
-                    fast_fall = False
-            elif event.type == pygame.JOYHATMOTION:
-                # ------------------ Controller: D-Pad Fallback for Movement ------------------
-                hx, hy = event.value
-                if hx < 0:
-                    left_pressed = True
-                    new_x = offset[0] - 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                elif hx > 0:
-                    right_pressed = True
-                    new_x = offset[0] + 1
-                    if valid_position(tetromino, [new_x, offset[1]], grid):
-                        offset[0] = new_x
-                    last_horizontal_move = current_time
-                # D-Pad vertical for fast fall:
-                if hy < 0:
-                    fast_fall = True
-                elif hy >= 0:
-                    fast_fall = False
+    def handle_action(action):
+        nonlocal piece_moves, piece_rotations, piece_soft_drops, piece_held, pause_requested
+        global game_command
+        name = action.name
+        input_clock.mark_input(action.time)
+        if action.pressed:
+            if name == 'left' or name == 'right':
+                piece_moves += 1
+            elif name == 'rotate':
+                piece_rotations += 1
+            elif name == 'down':
+                piece_soft_drops += 1
+            elif name == 'hold' and not board.hold_used:
+                # The piece coming out of hold starts its own input count.
+                piece_moves = piece_rotations = piece_soft_drops = 0
+                piece_held = True
+            elif name == 'pause':
+                pause_requested = True  # The game loop yields the pause scene after this batch.
+            elif name == 'skip_track':
+                game_command = "skip"
+        board.apply(name, action.pressed, action.time)
 
     # =========================================================================
     # Helper function: Process mouse events for UI elements (sound bar, buttons, etc.)
@@ -2258,15 +1920,17 @@ def run_game():
         global game_command
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
+                pos = window_to_logical(event.pos)
                 # Only process events on the subwindow side
-                if event.pos[0] >= SCREEN_WIDTH:
-                    rel_x = event.pos[0] - SCREEN_WIDTH
-                    rel_y = event.pos[1]
+                if pos[0] >= SCREEN_WIDTH:
+                    rel_x = pos[0] - SCREEN_WIDTH
+                    rel_y = pos[1]
 
                     # 1) Volume Bar
                     if sound_bar_rect and sound_bar_rect.collidepoint(rel_x, rel_y):
                         new_volume = (rel_x - sound_bar_rect.x) / sound_bar_rect.width
-                        pygame.mixer.music.set_volume(new_volume)
+                        if pygame.mixer.get_init():
+                            pygame.mixer.music.set_volume(new_volume)
 
                     # 2) Restart Button
                     if restart_button_rect and restart_button_rect.collidepoint(rel_x, rel_y):
@@ -2274,7 +1938,7 @@ def run_game():
                         return  # can exit early if you like
 
                     # 3) Skip Button (only if custom music is on AND skip_button_rect is set)
-                    if settings.get('use_custom_music', False) and skip_button_rect:
+                    if settings.use_custom_music and skip_button_rect:
                         if skip_button_rect.collidepoint(rel_x, rel_y):
                             game_command = "skip"
 
@@ -2285,57 +1949,58 @@ def run_game():
             # Handle dragging volume bar, etc.
             elif event.type == pygame.MOUSEMOTION:
                 if event.buttons[0]:
-                    if event.pos[0] >= SCREEN_WIDTH:
-                        rel_x = event.pos[0] - SCREEN_WIDTH
-                        rel_y = event.pos[1]
+                    pos = window_to_logical(event.pos)
+                    if pos[0] >= SCREEN_WIDTH:
+                        rel_x = pos[0] - SCREEN_WIDTH
+                        rel_y = pos[1]
                         if sound_bar_rect and sound_bar_rect.collidepoint(rel_x, rel_y):
                             new_volume = (rel_x - sound_bar_rect.x) / sound_bar_rect.width
-                            pygame.mixer.music.set_volume(new_volume)
+                            if pygame.mixer.get_init():
+                                pygame.mixer.music.set_volume(new_volume)
 
     # =========================================================================
     # Main Game Loop
     # =========================================================================
+    sim_time = pygame.time.get_ticks()   # Simulation clock, advanced in fixed steps.
+    game_start_time = sim_time
+    piece_spawn_time = sim_time
+    last_frame_time = sim_time
+    accumulator = 0.0
+    effect_phase = 0.0
+    target_fps = settings.target_fps
+    # Optional render thread; otherwise the same command lists are drawn inline.
+    # The GPU backend must draw on the thread that owns its renderer, so it never uses the worker.
+    render_worker = RenderWorker(screen.get_size(), present_display) if settings.threaded_render and gpu_renderer is None else None
+
     while True:
+        frame_start = time.perf_counter()
         current_time = pygame.time.get_ticks()
-
-        # ------------------------------ Screen Shake Effect ------------------------------
-        shake_intensity = screen_shake * 2
-        shake_x = random.randint(-shake_intensity, shake_intensity) if screen_shake > 0 else 0
-        shake_y = random.randint(-shake_intensity, shake_intensity) if screen_shake > 0 else 0
+        elapsed = current_time - last_frame_time
+        last_frame_time = current_time
+        if elapsed > MAX_FRAME_TIME:
+            # Skip time lost to a stall beyond one clamped frame (the pause screen is handled below).
+            sim_time += elapsed - MAX_FRAME_TIME
+            elapsed = MAX_FRAME_TIME
+        accumulator += elapsed
 
         # ------------------------------ Game Over Check ------------------------------
-        if game_over:
-            if heartbeat_playing and heartbeat_sound:
-                heartbeat_sound.stop()
-            if game_over_sound:
-                game_over_sound.play()
-            if settings.get('use_custom_music', False):
+        if board.game_over:
+            if heartbeat_playing:
+                sound_bank.stop("heartbeat")
+                heartbeat_playing = False
+            sound_bank.play("game_over")
+            if settings.use_custom_music:
                 last_track_index = current_track_index
-            pygame.mixer.music.stop()
-            display_game_over(score)
-            return
-
-        # ------------------------------ Level Transition Handling ------------------------------
-        if in_level_transition:
-            if current_time - transition_start_time > TRANSITION_DURATION:
-                in_level_transition = False
-                grid_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                draw_3d_grid(grid_surface, grid_color, grid_opacity)
-                for y in range(GRID_HEIGHT):
-                    for x in range(GRID_WIDTH):
-                        if grid[y][x] != 0:
-                            grid[y][x] = random.randint(1, len(COLORS))
-            else:
-                if current_time - last_flash_time > FLASH_INTERVAL:
-                    for y in range(GRID_HEIGHT):
-                        for x in range(GRID_WIDTH):
-                            if grid[y][x] != 0:
-                                grid[y][x] = random.randint(1, len(COLORS))
-                    last_flash_time = current_time
-                    flash_count += 1
+            stop_music()
+            if render_worker:
+                render_worker.stop()
+            stats_recorder.request_flush()
+            return screen_scene(display_game_over, board.score, {
+                "difficulty": difficulty, "lines": board.lines, "level": board.level,
+                "pieces": board.pieces, "duration": int(sim_time - game_start_time), "seed": game_seed})
 
         # ------------------------------ Process All Events (Keyboard, Controller, Mouse) ------------------------------
-        events = pygame.event.get()  # Grab all events once per frame.
+        events = input_clock.get()  # All events since last frame, each with its timestamp.
         for event in events:
             if event.type == pygame.QUIT:
                 save_settings(settings)
@@ -2343,187 +2008,420 @@ def run_game():
                 sys.exit()
             elif event.type == MUSIC_END_EVENT:
                 handle_music_end_event()
-        process_keyboard_events(events, current_time)
-        process_controller_events(events, current_time)
+        for action in input_mapper.translate(events, current_time):
+            handle_action(action)
         process_mouse_events(events)
+        if pause_requested:
+            pause_requested = False
+            if render_worker:
+                render_worker.flush()  # The pause screen draws text on this thread.
+            yield screen_scene(pause_game)
+            # Releases that happened while paused were consumed by the pause screen.
+            board.release_all()
+            # Resume where the game stopped: the paused time is skipped outright rather than
+            # caught up in fixed steps, and gravity's timer is moved past it.
+            current_time = pygame.time.get_ticks()
+            skipped = current_time - last_frame_time + accumulator
+            sim_time += skipped
+            board.last_fall_time += skipped
+            piece_spawn_time += skipped
+            last_frame_time = current_time
+            accumulator = 0.0
 
         # Check for special commands (restart, return to menu, or skip track).
         if game_command == "restart" or game_command == "menu":
-            return  # Exit run_game() to restart or return to the main menu.
+            if render_worker:
+                render_worker.stop()
+            return run_game() if game_command == "restart" else None
         elif game_command == "skip":
             skip_current_track()   # Change the track.
             game_command = None      # Reset the command.
 
-        # ------------------------------ Process Continuous Movement (Held Buttons) ------------------------------
-        if left_pressed or right_pressed:
-            time_since_last_move = current_time - last_horizontal_move
-            required_delay = fast_move_interval if time_since_last_move > move_interval else move_interval
-            if time_since_last_move >= required_delay:
-                direction = -1 if left_pressed else 1
-                new_x = offset[0] + direction
-                if valid_position(tetromino, [new_x, offset[1]], grid):
-                    offset[0] = new_x
-                last_horizontal_move = current_time
-
-        # ------------------------------ Tetromino Falling ------------------------------
-        current_fall_speed = 50 if fast_fall else fall_speed
-        if current_time - last_fall_time > current_fall_speed:
-            if valid_position(tetromino, [offset[0], offset[1] + 1], grid):
-                offset[1] += 1
-            else:
-                if check_game_over(grid):
-                    game_over = True
-                else:
-                    original_grid = [row[:] for row in grid]
-                    place_tetromino(tetromino, offset, grid, color_index)
-                    hold_used = False
-                    grid, lines_cleared = clear_lines(grid)
-                    lines_cleared_total += lines_cleared
-                    score = update_score(score, lines_cleared)
-                    pieces_dropped += 1
-                    if lines_cleared > 0:
-                        screen_shake = 8 + lines_cleared * 3
-                        full_lines = [y for y in range(GRID_HEIGHT) if all(original_grid[y])]
-                        for y in full_lines:
-                            for x in range(GRID_WIDTH):
-                                if original_grid[y][x] != 0:
-                                    explosion_particles.append(Explosion(
-                                        x * BLOCK_SIZE + BLOCK_SIZE // 2,
-                                        y * BLOCK_SIZE + BLOCK_SIZE // 2,
-                                        COLORS[original_grid[y][x] - 1],
-                                        particle_count=45,
-                                        max_speed=15,
-                                        duration=75
-                                    ))
-                    if lines_cleared == 4:
-                        is_tetris = True
-                        tetris_last_flash = current_time
-                    new_level = lines_cleared_total // 10 + 1
-                    if new_level > level:
-                        level = new_level
-                        fall_speed = max(50, int(base_fall_speed * (0.85 ** (level - 1))))
-                        in_level_transition = True
-                        transition_start_time = current_time
-                        last_flash_time = current_time
-                        flash_count = 0
-                    tetromino = next_tetromino
-                    shape_index = get_shape_index(tetromino) or 0
-                    color_index = (shape_index + level - 1) % len(COLORS) + 1
-                    next_tetromino = tetromino_bag.get_next_tetromino()
-                    offset = [GRID_WIDTH // 2 - len(tetromino[0]) // 2, 0]
-            last_fall_time = current_time
-
-        # ------------------------------ Spawn Flame Trail Particles (Visual Effects) ------------------------------
-        if flame_trails_enabled and (left_pressed or right_pressed or fast_fall):
-            num_particles = random.randint(3, 5)
-            spawn_offset = 15
-            for _ in range(num_particles):
-                if left_pressed:
-                    direction = "left"
-                    spawn_x = (offset[0] - 1) * BLOCK_SIZE + random.randint(-spawn_offset, 0)
-                    spawn_y = (offset[1] + random.uniform(0.2, 0.8) * len(tetromino)) * BLOCK_SIZE
-                elif right_pressed:
-                    direction = "right"
-                    spawn_x = (offset[0] + len(tetromino[0])) * BLOCK_SIZE + random.randint(0, spawn_offset)
-                    spawn_y = (offset[1] + random.uniform(0.2, 0.8) * len(tetromino)) * BLOCK_SIZE
-                else:  # fast falling vertical movement
-                    direction = "down"
-                    spawn_x = (offset[0] + random.uniform(0.2, 0.8) * len(tetromino[0])) * BLOCK_SIZE
-                    spawn_y = (offset[1] + len(tetromino)) * BLOCK_SIZE - spawn_offset
-                trail_particles.append(TrailParticle(spawn_x, spawn_y, direction))
-
-        # ------------------------------ Update Particles (Trails, Dust, Explosions) ------------------------------
-        wind_force = ((-4.0 if left_pressed else 4.0 if right_pressed else 0),
-                      (5.0 if fast_fall else 0))
-        for particle in trail_particles[:]:
-            particle.update(wind_force, screen)
-            if particle.age >= particle.max_age:
-                trail_particles.remove(particle)
-        for particle in dust_particles[:]:
-            particle.update()
-            if particle.age >= particle.max_age:
-                dust_particles.remove(particle)
-        for explosion in explosion_particles[:]:
-            explosion.update()
-            if explosion.lifetime <= 0:
-                explosion_particles.remove(explosion)
+        # ------------------------------ Fixed-Timestep Simulation ------------------------------
+        while accumulator >= SIMULATION_STEP and not board.game_over:
+            accumulator -= SIMULATION_STEP
+            sim_time += SIMULATION_STEP
+
+            # ---------------------- Level Transition Handling ----------------------
+            if level_transition and not level_transition.update(sim_time):
+                level_transition = None
+
+            # ---------------------- Held Movement and Falling ----------------------
+            # Applies exactly the DAS/ARR shifts that fell due by this tick, then gravity.
+            board.step(sim_time)
+            view.follow()
+            left_pressed = board.auto_shift.direction == 'left'
+            right_pressed = board.auto_shift.direction == 'right'
+            fast_fall = board.fast_fall
+            tetromino, offset = board.tetromino, board.offset
+
+            # ---------------------- Spawn Flame Trail Particles (Visual Effects) ----------------------
+            # Spawning is tuned per 60 Hz effect frame, so it runs when a frame boundary passes.
+            effect_phase += EFFECT_DT
+            while effect_phase >= 1.0:
+                effect_phase -= 1.0
+                if flame_trails_enabled and (left_pressed or right_pressed or fast_fall):
+                    # Scaled by the quality tier; rounding is randomized so low rates still emit.
+                    num_particles = int(random.randint(3, 5) * quality_governor.emission + random.random())
+                    num_particles = min(num_particles, quality_governor.particle_cap - len(trail_particles))
+                    spawn_offset = 15
+                    left, top = view.origin
+                    for _ in range(num_particles):
+                        if left_pressed:
+                            direction = "left"
+                            spawn_x = (offset[0] - 1) * block_size + random.randint(-spawn_offset, 0)
+                            spawn_y = (offset[1] + random.uniform(0.2, 0.8) * len(tetromino)) * block_size
+                        elif right_pressed:
+                            direction = "right"
+                            spawn_x = (offset[0] + len(tetromino[0])) * block_size + random.randint(0, spawn_offset)
+                            spawn_y = (offset[1] + random.uniform(0.2, 0.8) * len(tetromino)) * block_size
+                        else:  # fast falling vertical movement
+                            direction = "down"
+                            spawn_x = (offset[0] + random.uniform(0.2, 0.8) * len(tetromino[0])) * block_size
+                            spawn_y = (offset[1] + len(tetromino)) * block_size - spawn_offset
+                        trail_particles.append(TrailParticle(left + spawn_x, top + spawn_y, direction))
+
+            # ---------------------- Update Particles (Trails, Dust, Explosions) ----------------------
+            wind_force = ((-4.0 if left_pressed else 4.0 if right_pressed else 0),
+                          (5.0 if fast_fall else 0))
+            for particle in trail_particles[:]:
+                particle.update(wind_force, screen, EFFECT_DT)
+                if particle.age >= particle.max_age:
+                    trail_particles.remove(particle)
+            for particle in dust_particles[:]:
+                particle.update(EFFECT_DT)
+                if particle.age >= particle.max_age:
+                    dust_particles.remove(particle)
+            for explosion in explosion_particles[:]:
+                explosion.update(EFFECT_DT)
+                if explosion.lifetime <= 0:
+                    explosion_particles.remove(explosion)
+
+            # ---------------------- Update Screen Shake ----------------------
+            screen_shake = max(0, screen_shake - EFFECT_DT)
+
+        # Fraction of a tick between the last simulated state and now, used to interpolate particles.
+        interpolation = accumulator / SIMULATION_STEP
 
-        # ------------------------------ Update Screen Shake ------------------------------
-        screen_shake = max(0, screen_shake - 1)
+        # ------------------------------ Screen Shake Effect ------------------------------
+        shake_intensity = int(screen_shake * 2)
+        shake_x = random.randint(-shake_intensity, shake_intensity) if screen_shake > 0 else 0
+        shake_y = random.randint(-shake_intensity, shake_intensity) if screen_shake > 0 else 0
 
         # ------------------------------ Danger Zone: Heartbeat Sound if Grid Almost Full ------------------------------
-        if is_danger_zone_active(grid):
-            if not heartbeat_playing and heartbeat_sound:
-                heartbeat_sound.play(-1)
-                heartbeat_playing = True
+        if is_danger_zone_active(board.grid):
+            if not heartbeat_playing:
+                # May be refused by this frame's voice cap; it is retried next frame.
+                heartbeat_playing = sound_bank.play("heartbeat", -1) is not None
         else:
-            if heartbeat_playing and heartbeat_sound:
-                heartbeat_sound.stop()
+            if heartbeat_playing:
+                sound_bank.stop("heartbeat")
                 heartbeat_playing = False
 
-        # ------------------------------ Draw Everything on the Screen ------------------------------
-        # Clear the screen.
-        screen.fill(BLACK)
-        if not in_level_transition:
-            # Draw all placed blocks from the grid.
-            for y in range(GRID_HEIGHT):
-                for x in range(GRID_WIDTH):
-                    if grid[y][x]:
-                        draw_3d_block(screen, COLORS[grid[y][x] - 1],
-                                      x * BLOCK_SIZE + shake_x,
-                                      y * BLOCK_SIZE + shake_y,
-                                      BLOCK_SIZE)
+        # ------------------------------ Describe the Frame as Render Commands ------------------------------
+        grid, tetromino, offset, color_index = board.grid, board.tetromino, board.offset, board.color_index
+        commands = [(paint_fill, BLACK)]
+        # Draw all placed blocks from the cached stack layer, through the flashing palette during a level transition.
+        palette = level_transition.palette if level_transition else COLORS
+        commands.append(view.stack_command(palette, shake_x, shake_y))
+        origin = view.origin
+        if not level_transition:
             # Draw the current falling tetromino.
             for cy, row in enumerate(tetromino):
                 for cx, cell in enumerate(row):
                     if cell:
-                        draw_3d_block(screen, COLORS[color_index - 1],
-                                      (offset[0] + cx) * BLOCK_SIZE + shake_x,
-                                      (offset[1] + cy) * BLOCK_SIZE + shake_y,
-                                      BLOCK_SIZE)
+                        commands.append((paint_surface, block_sprite(COLORS[color_index - 1], block_size),
+                                         (origin[0] + (offset[0] + cx) * block_size + shake_x,
+                                          origin[1] + (offset[1] + cy) * block_size + shake_y)))
             # Overlay the grid lines.
-            screen.blit(grid_surface, (shake_x, shake_y))
+            commands.append(view.grid_command(shake_x, shake_y))
             # Draw the ghost piece.
-            if settings.get('ghost_piece', True):
-                draw_ghost_piece(tetromino, offset, grid, COLORS[color_index - 1])
+            if settings.ghost_piece:
+                ghost_cells, shadow_cells = ghost_piece_cells(tetromino, offset, grid, block_size, origin)
+                if quality_governor.composited_ghost:
+                    commands.append((paint_ghost_piece, ghost_cells, shadow_cells, COLORS[color_index - 1],
+                                     block_size))
+                else:
+                    commands.append((paint_ghost_outline, ghost_cells, COLORS[color_index - 1], block_size))
             # Draw explosion effects and particles.
             for explosion in explosion_particles:
-                explosion.draw(screen, (shake_x, shake_y))
+                commands.append(explosion.render_command((origin[0] + shake_x, origin[1] + shake_y), interpolation))
+            screen_bounds = screen.get_size()
             for particle in trail_particles:
-                particle.draw(screen)
+                command = particle.render_command(interpolation, screen_bounds)
+                if command:
+                    commands.append(command)
             for particle in dust_particles:
-                particle.draw(screen)
+                command = particle.render_command(interpolation)
+                if command:
+                    commands.append(command)
         else:
-            # During level transitions, draw the grid blocks with an overlay.
-            for y in range(GRID_HEIGHT):
-                for x in range(GRID_WIDTH):
-                    if grid[y][x]:
-                        draw_3d_block(screen, COLORS[grid[y][x] - 1],
-                                      x * BLOCK_SIZE + shake_x,
-                                      y * BLOCK_SIZE + shake_y,
-                                      BLOCK_SIZE)
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            overlay.set_alpha(128)
-            overlay.fill(BLACK)
-            screen.blit(overlay, (0, 0))
-            level_text = tetris_font_large.render(f"LEVEL {level}", True, random.choice(COLORS))
-            level_shake_x = random.randint(-10, 10)
-            level_shake_y = random.randint(-10, 10)
-            screen.blit(level_text, (SCREEN_WIDTH // 2 - level_text.get_width() // 2 + level_shake_x,
-                                     SCREEN_HEIGHT // 2 - level_text.get_height() // 2 + level_shake_y))
+            # During level transitions, dim the grid blocks and show the new level.
+            commands.extend(level_transition.render_commands())
         # Draw the subwindow with game info.
-        draw_subwindow(score, next_tetromino, level, pieces_dropped, lines_cleared_total,
-                       is_tetris, tetris_last_flash, tetris_flash_time)
-        pygame.display.flip()
+        panel = subwindow_surface(board.score, board.next_tetromino, board.level, board.pieces, board.lines,
+                                  board.hold_piece, is_tetris, tetris_last_flash, tetris_flash_time,
+                                  (finesse_faults, finesse_judged) + last_finesse)
+        commands.append((paint_stack_layer, panel, (SCREEN_WIDTH, 0), None, "subwindow"))
+
+        # ------------------------------ Draw and Present ------------------------------
+        input_clock.poll()  # Stamps input that arrived during the simulation before drawing starts.
+        # Frame work excludes flip and the frame-rate wait, so vsync and FPS caps do not look like load.
+        if render_worker:
+            render_worker.submit(commands)
+            quality_governor.frame(max((time.perf_counter() - frame_start) * 1000, render_worker.render_ms))
+            if render_worker.present(screen):
+                input_clock.mark_present()
+        elif gpu_renderer:
+            gpu_renderer.render(commands)
+            quality_governor.frame((time.perf_counter() - frame_start) * 1000)
+            gpu_renderer.present()
+            input_clock.mark_present()
+        else:
+            execute_render_commands(screen, commands)
+            quality_governor.frame((time.perf_counter() - frame_start) * 1000)
+            present_display()
+            input_clock.mark_present()
 
-        clock.tick(60)
+        sound_bank.end_frame()
+        input_clock.tick(target_fps)
         
+# -------------------------- Spectator Wall --------------------------
+WALL_BOARD_CHOICES = (4, 8, 12, 16)
+WALL_BOT_INTERVAL = 90       # ms between bot inputs
+WALL_RESTART_DELAY = 3000    # ms a finished board stays up before it starts over
+WALL_MARGIN = 6
+WALL_LABEL_HEIGHT = 18
+
+def wall_layout(count, size=LOGICAL_SIZE, board_size=(GRID_WIDTH, GRID_HEIGHT)):
+    """
+    Splits 'size' into 'count' viewports for boards of 'board_size' cells with the largest
+    block size. Returns (block size, [Rect, ...]).
+    """
+    board_width, board_height = board_size
+    best = None
+    for columns in range(1, count + 1):
+        rows = -(-count // columns)
+        cell_width, cell_height = size[0] // columns, size[1] // rows
+        block_size = max(1, min((cell_width - 2 * WALL_MARGIN) // board_width,
+                                (cell_height - 2 * WALL_MARGIN - WALL_LABEL_HEIGHT) // board_height))
+        if best is None or block_size > best[0]:
+            best = (block_size, columns, cell_width, cell_height)
+    block_size, columns, cell_width, cell_height = best
+    width, height = board_width * block_size, board_height * block_size
+    viewports = []
+    for i in range(count):
+        x = (i % columns) * cell_width + (cell_width - width) // 2
+        y = (i // columns) * cell_height + WALL_LABEL_HEIGHT + (cell_height - WALL_LABEL_HEIGHT - height) // 2
+        viewports.append(pygame.Rect(x, y, width, height))
+    return block_size, viewports
+
+class BoardSession:
+    """
+    One board on the spectator wall: a Board, the Bot playing it (None for the local player),
+    its BoardView, line-clear sparks and cached label. Block sprites, fonts and the frame
+    background are shared by every board, so an extra board costs little more than its own state.
+    """
+    def __init__(self, name, viewport, block_size, particle_budget, now, bot=True, plans=None,
+                 board_size=(GRID_WIDTH, GRID_HEIGHT)):
+        self.name = name
+        self.viewport = viewport
+        self.board_size = board_size
+        self.block_size = block_size
+        self.particle_budget = particle_budget  # This board's share of the tier's particle cap.
+        self.bot = bot
+        self.plans = plans  # Bot transposition table, shared by the whole wall.
+        self.explosions = []
+        self.label = None
+        self.label_score = None
+        self.restart(now)
+
+    def restart(self, now):
+        self.board = Board(FALL_SPEEDS.get(settings.difficulty, FALL_SPEEDS['normal']), random.randrange(1 << 32),
+                           now, settings.das, settings.arr, len(COLORS), *self.board_size)
+        self.view = BoardView(self.board, self.viewport.size)
+        self.board.lock_pipeline.subscribe(self.emit_sparks)
+        planner = features.plan_placement if features else None
+        self.player = Bot(self.board, WALL_BOT_INTERVAL, planner=planner, plans=self.plans) if self.bot else None
+        self.finished_time = None
+
+    def emit_sparks(self, result):
+        # Lock emitter: a smaller version of the game's line-clear explosion.
+        if not result.lines_cleared:
+            return
+        block_size = self.block_size
+        scale = block_size / BLOCK_SIZE
+        explosion = Explosion(max_speed=15 * scale, duration=45, scale=scale)
+        burst = min(quality_governor.explosion_particles,
+                    self.particle_budget // (result.lines_cleared * self.board.width))
+        for y, row in result.cleared:
+            for x, cell in enumerate(row):
+                if cell:
+                    explosion.add_burst((x + 0.5) * block_size, (y + 0.5) * block_size, COLORS[cell - 1], burst)
+        self.explosions.append(explosion)
+
+    def update(self, now):
+        """Advances one simulation tick; a finished board starts over after WALL_RESTART_DELAY."""
+        board = self.board
+        if board.game_over:
+            if self.finished_time is None:
+                self.finished_time = now
+            elif now - self.finished_time > WALL_RESTART_DELAY:
+                self.restart(now)
+        else:
+            if self.player:
+                self.player.update(now)
+            board.step(now)
+        for explosion in self.explosions[:]:
+            explosion.update(EFFECT_DT)
+            if explosion.lifetime <= 0:
+                self.explosions.remove(explosion)
+
+    def render_commands(self, commands, interpolation, dim, game_over_text):
+        board = self.board
+        block_size = self.block_size
+        left, top = self.viewport.topleft
+        commands.append(self.view.stack_command(COLORS, left, top))
+        if board.game_over:
+            commands.append((paint_surface, dim, self.viewport.topleft))
+            commands.append((paint_surface, game_over_text, (self.viewport.centerx - game_over_text.get_width() // 2,
+                                                             self.viewport.centery - game_over_text.get_height() // 2)))
+        else:
+            sprite = block_sprite(COLORS[board.color_index - 1], block_size)
+            for cy, row in enumerate(board.tetromino):
+                for cx, cell in enumerate(row):
+                    if cell:
+                        commands.append((paint_surface, sprite, (left + (board.offset[0] + cx) * block_size,
+                                                                 top + (board.offset[1] + cy) * block_size)))
+        for explosion in self.explosions:
+            commands.append(explosion.render_command((left, top), interpolation))
+        if board.score != self.label_score:
+            # Re-rendered only when the score changes.
+            self.label_score = board.score
+            self.label = tetris_font_tiny.render(f"{self.name}  {board.score}", True, WHITE)
+        commands.append((paint_surface, self.label, (left, top - WALL_LABEL_HEIGHT)))
+
+def spectator_wall(count=None, humans=None):
+    """
+    Runs 'count' boards at once, each drawn into its own viewport of the window. All boards
+    step on one fixed-timestep clock. The keyboard and each connected joystick drive a board
+    of their own, in that order, and bots play the rest; 'humans' caps the number of local
+    players. Escape or the pause action returns to the menu.
+    """
+    count = count or settings.wall_boards
+    open_joysticks()
+    mappers = player_input_mappers(settings)[:count]
+    if humans is not None:
+        mappers = mappers[:humans]
+    humans = len(mappers)
+    board_size = BOARD_SIZES[settings.board_size]
+    block_size, viewports = wall_layout(count, board_size=board_size)
+    now = pygame.time.get_ticks()
+    particle_budget = quality_governor.particle_cap // count
+    plans = {}
+    sessions = [BoardSession(f"P{i + 1}" if i < humans else f"CPU {i + 1 - humans}",
+                             viewport, block_size, particle_budget, now, bot=i >= humans, plans=plans,
+                             board_size=board_size)
+                for i, viewport in enumerate(viewports)]
+
+    # Drawn once and shared by every board.
+    background = pygame.Surface(LOGICAL_SIZE)
+    background.fill(BLACK)
+    for viewport in viewports:
+        pygame.draw.rect(background, (60, 60, 60), viewport.inflate(4, 4), 2)
+    dim = pygame.Surface(viewports[0].size, pygame.SRCALPHA)
+    dim.fill((0, 0, 0, 160))
+    game_over_text = tetris_font_tiny.render("GAME OVER", True, WHITE)
+    if pygame.display.get_surface() is not None:
+        background = background.convert()
+
+    pygame.key.set_repeat()
+    sim_time = last_frame_time = now
+    accumulator = 0.0
+    while True:
+        frame_start = time.perf_counter()
+        current_time = pygame.time.get_ticks()
+        elapsed = current_time - last_frame_time
+        last_frame_time = current_time
+        if elapsed > MAX_FRAME_TIME:
+            sim_time += elapsed - MAX_FRAME_TIME
+            elapsed = MAX_FRAME_TIME
+        accumulator += elapsed
+
+        events = input_clock.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            elif event.type == MUSIC_END_EVENT:
+                handle_music_end_event()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                return
+        for mapper, session in zip(mappers, sessions):
+            for action in mapper.translate(events, current_time):
+                if action.name == 'pause':
+                    return
+                input_clock.mark_input(action.time)
+                session.board.apply(action.name, action.pressed, action.time)
+
+        while accumulator >= SIMULATION_STEP:
+            accumulator -= SIMULATION_STEP
+            sim_time += SIMULATION_STEP
+            for session in sessions:
+                session.update(sim_time)
+
+        interpolation = accumulator / SIMULATION_STEP
+        commands = [(paint_surface, background, (0, 0))]
+        for session in sessions:
+            session.render_commands(commands, interpolation, dim, game_over_text)
+
+        if gpu_renderer:
+            gpu_renderer.render(commands)
+            quality_governor.frame((time.perf_counter() - frame_start) * 1000)
+            gpu_renderer.present()
+        else:
+            execute_render_commands(screen, commands)
+            quality_governor.frame((time.perf_counter() - frame_start) * 1000)
+            present_display()
+        input_clock.mark_present()
+        sound_bank.end_frame()
+        input_clock.tick(settings.target_fps)
+
 # -------------------------- Main --------------------------
+def init_runtime():
+    """
+    Starts pygame, the mixer, the sound bank, fonts, the window and the joystick. Importing
+    this module does none of that, so tools can use its helpers without a display; anything
+    that runs the screens calls this first.
+    """
+    pygame.init()
+    pygame.mixer.set_num_channels(32)
+    pygame.mixer.init()
+    sound_bank.reload()
+    load_fonts()
+    apply_display_mode()
+    pygame.display.set_caption(GAME_CAPTION)
+    open_joysticks()
+
 def main():
-    global settings, game_command, hold_piece, hold_used
+    global settings
+    init_runtime()
     settings = load_settings()
-    if settings.get('music_enabled', True):
-        if settings.get('use_custom_music', False):
+    input_mapper.rebuild(settings)
+    settings.subscribe(("controls", "controller_controls", "controller_menu_navigation"), input_mapper.rebuild)
+    settings.subscribe(("grid_color", "grid_opacity", "grid_lines"), invalidate_grid_overlay)
+    settings.subscribe(("audio_profile", "audio_buffer"), apply_mixer_profile)
+    settings.subscribe(("quality_tier",), quality_governor.lock)
+    quality_governor.lock(settings)
+    apply_mixer_profile()
+    if settings.render_backend == "gpu":
+        open_gpu_renderer(settings)
+    settings.subscribe(("display_scaling",), apply_display_mode)
+    if settings.vsync or settings.display_scaling != display_scaling:
+        apply_display_mode(settings)
+    if settings.music_enabled:
+        if settings.use_custom_music:
             play_custom_music(settings)
         else:
             try:
@@ -2532,14 +2430,7 @@ def main():
             except Exception as e:
                 print(f"Error loading default background music: {e}")
 
-    while True:
-        main_menu()
-        hold_piece = None
-        hold_used = False
-        while True:
-            run_game()
-            if game_command == "menu":
-                break  # Return to main menu when requested
+    SceneManager(main_menu()).run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""
+Times one piece lock, the work done between a hard drop and the next spawn, and counts what it
+allocates.
+
+    python benchmark_lock.py                       # every scenario, 500 locks each
+    python benchmark_lock.py --repeat 2000
+
+Each scenario drops a vertical I piece into column 0 of a fresh grid whose bottom rows are full
+except for that column, so it clears 0, 1 or 4 lines. Three paths lock it:
+
+    legacy   the lock the game used before the Board: a full copy of the grid, a rescan of every
+             row for full lines, an uncapped 45-particle Explosion per cleared cell and a
+             search of every shape rotation to color the next piece
+    engine   Board.lock() with no emitters subscribed
+    effects  Board.lock() with the game's line_clear_explosions() at the high quality tier
+
+Latency is the median and 95th percentile of single locks. 'blocks' and 'KiB' are what
+tracemalloc still sees allocated after the lock (the new grid rows, the lock result and the
+explosion particles); 'peak KiB' includes temporaries freed before the lock returned. A second
+table puts 'legacy' (before) next to 'effects' (after), the two paths that draw explosions.
+"""
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+import TetraFusion as game
+from tetrafusion_core.engine import (GRID_HEIGHT, GRID_WIDTH, SHAPES, Board, GridHash, RowMasks, check_game_over, place_tetromino,
+                                     rotate_matrix, update_score)
+
+SCENARIOS = {'no clear': 0, 'single': 1, 'tetris': 4}
+PATHS = ("legacy", "engine", "effects")
+VERTICAL_I = rotate_matrix(SHAPES[4])
+
+def fixture_grid(width, height, lines, rng):
+    """Empty grid whose bottom 'lines' rows are filled with random colors except column 0."""
+    grid = [[0] * width for _ in range(height)]
+    for y in range(height - lines, height):
+        grid[y] = [0] + [rng.randint(1, len(game.COLORS)) for _ in range(width - 1)]
+    return grid
+
+# -------------------------- Legacy Lock --------------------------
+def legacy_valid_position(tetromino, offset, grid):
+    for cy, row in enumerate(tetromino):
+        for cx, cell in enumerate(row):
+            if cell:
+                x = offset[0] + cx
+                y = offset[1] + cy
+                if x < 0 or x >= len(grid[0]) or y >= len(grid) or (y >= 0 and grid[y][x]):
+                    return False
+    return True
+
+def legacy_clear_lines(grid):
+    """Rescans every row and deletes the full ones one at a time."""
+    full_lines = [y for y in range(len(grid)) if all(grid[y])]
+    for y in full_lines:
+        del grid[y]
+        grid.insert(0, [0 for _ in range(len(grid[0]))])
+    return grid, len(full_lines)
+
+def legacy_shape_index(tetromino):
+    """Matches the piece against every rotation of every shape."""
+    for index, shape in enumerate(SHAPES):
+        candidate = tetromino
+        for _ in range(4):
+            if candidate == shape:
+                return index
+            candidate = rotate_matrix(candidate)
+    return None
+
+class LegacyLock:
+    """
+    The state lock_and_update_tetromino() worked on and the lock itself. The grid copy is taken
+    after the piece is placed; the old code took it before, so its full-line check never found a
+    row and the explosions it was written to draw never fired.
+    """
+    def __init__(self, rng):
+        self.rng = rng
+        self.explosions = []
+        self.score = self.lines_cleared_total = self.pieces_dropped = 0
+        self.level = 1
+
+    def lock(self):
+        grid, tetromino, offset = self.grid, self.tetromino, self.offset
+        hard_drop_rows = 0
+        temp_offset = offset.copy()
+        while legacy_valid_position(tetromino, [temp_offset[0], temp_offset[1] + 1], grid):
+            temp_offset[1] += 1
+            hard_drop_rows += 1
+        offset[1] = temp_offset[1]
+        self.score += hard_drop_rows * 2
+        if check_game_over(grid):
+            return
+        place_tetromino(tetromino, offset, grid, self.color_index)
+        original_grid = [row[:] for row in grid]
+        grid, lines_cleared = legacy_clear_lines(grid)
+        self.lines_cleared_total += lines_cleared
+        self.score = update_score(self.score, lines_cleared)
+        self.pieces_dropped += 1
+        if lines_cleared > 0:
+            block_size = game.BLOCK_SIZE
+            full_lines = [y for y in range(len(original_grid)) if all(original_grid[y])]
+            for y in full_lines:
+                for x in range(len(original_grid[y])):
+                    if original_grid[y][x] != 0:
+                        self.explosions.append(game.Explosion(
+                            x * block_size + block_size // 2,
+                            y * block_size + block_size // 2,
+                            game.COLORS[original_grid[y][x] - 1],
+                            particle_count=45,
+                            max_speed=15,
+                            duration=75
+                        ))
+        self.level = self.lines_cleared_total // 10 + 1
+        self.tetromino = self.next_tetromino
+        shape_index = legacy_shape_index(self.tetromino) or 0
+        self.color_index = (shape_index + self.level - 1) % len(game.COLORS) + 1
+        self.next_tetromino = self.pick_next()
+        self.offset = [len(grid[0]) // 2 - len(self.tetromino[0]) // 2, 0]
+
+    def pick_next(self):
+        shape = SHAPES[self.rng.randrange(len(SHAPES))]
+        for _ in range(self.rng.randrange(4)):
+            shape = rotate_matrix(shape)
+        return shape
+
+    def prepare(self, grid):
+        self.grid = [row[:] for row in grid]
+        self.tetromino = [row[:] for row in VERTICAL_I]
+        self.offset = [0, 0]
+        self.color_index = 5
+        self.next_tetromino = self.pick_next()
+
+# -------------------------- Board Lock --------------------------
+class BoardLock:
+    """Board.lock() on a fresh board, with the game's explosion emitter when 'effects' is set."""
+    def __init__(self, seed, effects):
+        self.board = Board(seed=seed)
+        self.explosions = []
+        if effects:
+            self.board.lock_pipeline.subscribe(game.line_clear_explosions(self.board, game.BLOCK_SIZE, self.explosions))
+
+    def lock(self):
+        self.board.lock(0)
+
+    def prepare(self, grid):
+        prepare(self.board, grid)
+
+def prepare(board, grid):
+    """Puts a copy of 'grid' under a vertical I piece in column 0, as if it had just spawned there."""
+    board.grid = [row[:] for row in grid]
+    board.grid_hash = GridHash(board.grid)
+    board.masks = RowMasks(board.grid)
+    board.spawn([row[:] for row in VERTICAL_I])
+    board.offset = [0, 0]
+
+def time_locks(path, grid, repeat):
+    samples = []
+    for _ in range(repeat):
+        path.prepare(grid)
+        start = time.perf_counter()
+        path.lock()
+        samples.append((time.perf_counter() - start) * 1e6)
+        path.explosions.clear()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+def count_allocations(path, grid, repeat):
+    """Average retained blocks, retained KiB and peak KiB of one lock under tracemalloc."""
+    blocks = size = peak = 0
+    tracemalloc.start()
+    for _ in range(repeat):
+        path.prepare(grid)
+        before = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        path.lock()
+        peak += tracemalloc.get_traced_memory()[1] - current
+        stats = tracemalloc.take_snapshot().compare_to(before, 'filename')
+        blocks += sum(stat.count_diff for stat in stats)
+        size += sum(stat.size_diff for stat in stats)
+        path.explosions.clear()
+    tracemalloc.stop()
+    return blocks / repeat, size / repeat / 1024, peak / repeat / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the lock pipeline and count its allocations.")
+    parser.add_argument("--repeat", type=int, default=500, help="timed locks per scenario (default 500)")
+    parser.add_argument("--traced", type=int, default=50, help="locks traced for allocations (default 50)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    game.quality_governor.set_tier(game.QUALITY_TIER_NAMES.index("high"))
+    results = {}
+    print(f"{'scenario':<10}{'path':>8}{'median us':>11}{'p95 us':>9}{'blocks':>9}{'KiB':>8}{'peak KiB':>10}")
+    for name, lines in SCENARIOS.items():
+        grid = fixture_grid(GRID_WIDTH, GRID_HEIGHT, lines, rng)  # The same stack for every path.
+        for path_name in PATHS:
+            if path_name == "legacy":
+                path = LegacyLock(random.Random(args.seed))
+            else:
+                path = BoardLock(args.seed, path_name == "effects")
+            median, p95 = time_locks(path, grid, args.repeat)
+            blocks, size, peak = count_allocations(path, grid, args.traced)
+            results[name, path_name] = (median, peak)
+            print(f"{name:<10}{path_name:>8}{median:>11.1f}{p95:>9.1f}{blocks:>9.0f}{size:>8.1f}{peak:>10.1f}")
+
+    print()
+    print(f"{'scenario':<10}{'before us':>11}{'after us':>10}{'speedup':>9}{'before KiB':>12}{'after KiB':>11}")
+    for name in SCENARIOS:
+        before_us, before_kib = results[name, "legacy"]
+        after_us, after_kib = results[name, "effects"]
+        print(f"{name:<10}{before_us:>11.1f}{after_us:>10.1f}{before_us / after_us:>8.1f}x"
+              f"{before_kib:>12.1f}{after_kib:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Times the two stack renderers on this machine, so 'Stack Renderer' in the Options menu
+(settings.stack_renderer) can be set to whichever is faster here.
+
+    python benchmark_stack.py                      # every board size, half-full stacks
+    python benchmark_stack.py --fill 0.9 --repeat 200
+
+Each run composites a random stack for every board size in BOARD_SIZES onto a new surface,
+as the game does after a line clear, through a new random palette each time, as during the
+level-up flash. 'blits' hands one sprite per filled cell to Surface.blits(); 'tilemap'
+gathers pre-rendered tiles with NumPy and copies them into the surface's pixels at once. A hidden
+window is opened so sprites get the display's pixel format; on a machine without a display,
+set SDL_VIDEODRIVER=dummy.
+"""
+import argparse
+import random
+import time
+
+import pygame
+import TetraFusion as game
+from tetrafusion_core.engine import BOARD_SIZES, Board
+
+def random_grid(width, height, fill, rng):
+    """The bottom 'fill' of the rows are 80% filled with random colors, the rest is empty."""
+    first_row = height - int(height * fill)
+    return [[rng.randint(1, len(game.COLORS)) if y >= first_row and rng.random() < 0.8 else 0
+             for _ in range(width)] for y in range(height)]
+
+def time_renderer(draw, grid, block_size, palettes, first_row):
+    size = (len(grid[0]) * block_size, len(grid) * block_size)
+    start = time.perf_counter()
+    for palette in palettes:
+        draw(pygame.Surface(size), grid, palette, block_size, first_row)
+    return (time.perf_counter() - start) * 1000 / len(palettes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the blits and tile-map stack renderers.")
+    parser.add_argument("--fill", type=float, default=0.5, help="share of rows holding blocks (default 0.5)")
+    parser.add_argument("--repeat", type=int, default=50, help="composites per renderer and size (default 50)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if game.numpy is None:
+        print("NumPy is not installed, so only the blits renderer is available.")
+        return
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    rng = random.Random(args.seed)
+    print(f"{'board':<18}{'block':>6}{'blits ms':>10}{'tilemap ms':>12}{'tiles ms':>10}  faster")
+    for name, (width, height) in BOARD_SIZES.items():
+        block_size = game.BoardView(Board(width=width, height=height)).block_size
+        grid = random_grid(width, height, args.fill, rng)
+        first_row = height - int(height * args.fill)
+        palettes = [[rng.choice(game.COLORS) for _ in game.COLORS] for _ in range(args.repeat)]
+        start = time.perf_counter()
+        game.stack_tiles(block_size, pygame.Surface((1, 1)))  # Built once per block size; not part of a composite.
+        tiles_ms = (time.perf_counter() - start) * 1000
+        blits_ms = time_renderer(game.draw_stack_blits, grid, block_size, palettes, first_row)
+        tilemap_ms = time_renderer(game.draw_stack_tilemap, grid, block_size, palettes, first_row)
+        faster = "tilemap" if tilemap_ms < blits_ms else "blits"
+        print(f"{f'{name} {width}x{height}':<18}{block_size:>6}{blits_ms:>10.3f}{tilemap_ms:>12.3f}{tiles_ms:>10.1f}  {faster}")
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
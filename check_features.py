@@ -0,0 +1,107 @@
+"""
+Checks tetrafusion_core.features on every board size in BOARD_SIZES. Random stacks are fed in
+as grid lists, as an array and as bitboards, and every feature is compared with a plain Python
+count of the same grid. Bitboards that do not fit the board, or that come without a size, must
+be refused.
+
+    python check_features.py                   # 200 boards per size
+    python check_features.py --boards 2000 --seed 7
+
+Prints one line per size and exits with status 1 if any check failed. Needs NumPy.
+"""
+import argparse
+import random
+import sys
+
+import numpy as np
+
+from tetrafusion_core.engine import BOARD_SIZES
+from tetrafusion_core.features import FEATURE_NAMES, array_to_bitboards, as_board_array, board_features
+
+def random_grid(width, height, rng):
+    """A stack of random height with random holes, some full rows and an empty top row."""
+    grid = [[0] * width for _ in range(height)]
+    for y in range(height - rng.randint(0, height - 1), height):
+        fill = rng.random()
+        grid[y] = [rng.randint(1, 7) if rng.random() < fill else 0 for _ in range(width)]
+        if rng.random() < 0.1:
+            grid[y] = [rng.randint(1, 7) for _ in range(width)]
+    return grid
+
+def reference_features(grid):
+    """The scalar features and column heights, counted cell by cell."""
+    height, width = len(grid), len(grid[0])
+    heights, holes = [], 0
+    for x in range(width):
+        column = [grid[y][x] for y in range(height)]
+        top = next((y for y, cell in enumerate(column) if cell), height)
+        heights.append(height - top)
+        holes += sum(1 for cell in column[top:] if not cell)
+    walled = [height] + heights + [height]
+    well_depths = [max(0, min(walled[x], walled[x + 2]) - heights[x]) for x in range(width)]
+    row_transitions = 0
+    for row in grid:
+        cells = [1] + [1 if cell else 0 for cell in row] + [1]
+        row_transitions += sum(a != b for a, b in zip(cells, cells[1:]))
+    return {
+        "heights": heights,
+        "aggregate_height": sum(heights),
+        "max_height": max(heights),
+        "holes": holes,
+        "bumpiness": sum(abs(a - b) for a, b in zip(heights, heights[1:])),
+        "row_transitions": row_transitions,
+        "well_depth": sum(well_depths),
+        "completed_rows": sum(1 for row in grid if all(row)),
+    }
+
+def refused(boards, width=None, height=None):
+    try:
+        as_board_array(boards, width, height)
+    except ValueError:
+        return True
+    return False
+
+def check_size(width, height, count, rng):
+    """Returns the failed checks for one board size."""
+    failures = []
+    grids = [random_grid(width, height, rng) for _ in range(count)]
+    cells = np.asarray(grids) != 0
+    bitboards = array_to_bitboards(cells)
+    inputs = {"grids": (grids, None, None), "array": (cells, None, None), "bitboards": (bitboards, width, height)}
+    for name, (boards, board_width, board_height) in inputs.items():
+        if not np.array_equal(as_board_array(boards, board_width, board_height), cells):
+            failures.append(f"{name} do not convert to the same cells")
+        features = board_features(boards, board_width, board_height)
+        for i, grid in enumerate(grids):
+            expected = reference_features(grid)
+            wrong = [key for key in ("heights",) + FEATURE_NAMES if np.any(features[key][i] != expected[key])]
+            if wrong:
+                failures.append(f"{name}: board {i} has wrong {', '.join(wrong)}")
+                break
+    if not refused(bitboards):
+        failures.append("bitboards without a size were accepted")
+    if not refused([1 << (width * height)], width, height):
+        failures.append("a bitboard with a bit past the last cell was accepted")
+    if not refused([-1], width, height):
+        failures.append("a negative bitboard was accepted")
+    if width > 1 and not refused(bitboards[:1] + [1 << (width * height - 1)], width - 1, height):
+        failures.append("a bitboard for a wider board was accepted")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check batch board features on every board size.")
+    parser.add_argument("--boards", type=int, default=200, help="random boards per size (default 200)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    failed = False
+    for name, (width, height) in BOARD_SIZES.items():
+        failures = check_size(width, height, args.boards, rng)
+        print(f"{f'{name} {width}x{height}':<18}{'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f"    {failure}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Exports training positions from the per-piece statistics in stats/*.jsonl.gz into .npz shards.
+
+    python export_positions.py                          # every file in ./stats -> ./positions
+    python export_positions.py --out data --shard-size 500000 a.jsonl.gz ...
+    python export_positions.py --keep-duplicates        # do not drop repeated positions
+
+Each game is replayed from its seed: the bag gives the same pieces, holds are repeated where
+the statistics say one was used, and every recorded placement is locked in with the engine.
+One record is written per placement, and a shard only holds boards of one size:
+
+    boards      (N, rows, columns) bool  the grid before the piece locked
+    pieces      (N,) int8   shape index of the placed piece (SHAPES order)
+    next_pieces (N,) int8   shape index of the next piece
+    hold_pieces (N,) int8   shape index in hold, -1 if empty
+    rotations   (N,) int8   clockwise turns from the spawn orientation
+    xs, ys      (N,) int16  final offset of the piece
+    lines       (N,) int8   rows the placement cleared (the outcome)
+    features    (N, F) float32  features.feature_matrix() of the board before the lock
+    hashes      (N,) uint64 Board.position_hash() with the piece at its final offset
+
+The hash covers the board, hold, next piece, bag and the placement, so a placement already
+exported from the same position is written only once and openings that many games share do
+not dominate the data. Games whose replay stops matching the recorded pieces (e.g. events
+dropped by a full statistics buffer) are cut off at that point. Needs NumPy.
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from stats_report import read_events
+from tetrafusion_core.engine import GRID_HEIGHT, SHAPES, Board, get_shape_index, rotate_matrix, valid_position
+from tetrafusion_core import features
+
+# -------------------------- Replay --------------------------
+def game_seed(game):
+    """Games are named '<start time>-<seed>'."""
+    try:
+        return int(str(game).rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def replay_game(seed, events):
+    """
+    Yields (grid, next shape, hold shape, position hash, event) as they were just before each
+    recorded placement locked, for as long as the replay matches the recording.
+    """
+    # Statistics from before board sizes were configurable have no board_height field.
+    board = Board(seed=seed, width=events[0]["board_width"], height=events[0].get("board_height", GRID_HEIGHT))
+    for event in events:
+        if event["held"]:
+            board.hold()
+        if board.shape_index != event["shape"] or board.game_over:
+            return
+        piece = SHAPES[event["shape"]]
+        for _ in range(event["rotation"]):
+            piece = rotate_matrix(piece)
+        offset = [event["x"], event["y"]]
+        if not valid_position(piece, offset, board.grid):
+            return
+        board.tetromino, board.offset = piece, offset
+        position = ([row[:] for row in board.grid], get_shape_index(board.next_tetromino),
+                    -1 if board.hold_piece is None else get_shape_index(board.hold_piece),
+                    board.position_hash(), event)
+        result = board.lock(event["t"], hard_drop=False)
+        if result is None or result.lines_cleared != event["lines"]:
+            return
+        yield position
+
+def games(events):
+    """Groups consecutive events by game; the game ends where the next one starts."""
+    game, batch = None, []
+    for event in events:
+        if event["game"] != game:
+            if batch:
+                yield game, batch
+            game, batch = event["game"], []
+        batch.append(event)
+    if batch:
+        yield game, batch
+
+# -------------------------- Shards --------------------------
+class ShardWriter:
+    def __init__(self, directory, shard_size):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.shards = 0
+        self.total = 0
+        self.reset()
+
+    def reset(self):
+        self.records = {name: [] for name in ("boards", "pieces", "next_pieces", "hold_pieces",
+                                              "rotations", "xs", "ys", "lines", "hashes")}
+
+    def add(self, grid, next_piece, hold_piece, position_hash, event):
+        records = self.records
+        if records["boards"] and (len(grid), len(grid[0])) != (len(records["boards"][0]), len(records["boards"][0][0])):
+            self.flush()  # A shard holds boards of one size.
+            records = self.records
+        records["boards"].append(grid)
+        records["pieces"].append(event["shape"])
+        records["next_pieces"].append(next_piece)
+        records["hold_pieces"].append(hold_piece)
+        records["rotations"].append(event["rotation"])
+        records["xs"].append(event["x"])
+        records["ys"].append(event["y"])
+        records["lines"].append(event["lines"])
+        records["hashes"].append(position_hash)
+        if len(records["boards"]) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        records = self.records
+        if not records["boards"]:
+            return
+        boards = np.asarray(records["boards"]) != 0
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"positions-{self.shards:05d}.npz")
+        np.savez_compressed(
+            path, boards=boards,
+            pieces=np.asarray(records["pieces"], np.int8),
+            next_pieces=np.asarray(records["next_pieces"], np.int8),
+            hold_pieces=np.asarray(records["hold_pieces"], np.int8),
+            rotations=np.asarray(records["rotations"], np.int8),
+            xs=np.asarray(records["xs"], np.int16),
+            ys=np.asarray(records["ys"], np.int16),
+            lines=np.asarray(records["lines"], np.int8),
+            hashes=np.asarray(records["hashes"], np.uint64),
+            features=features.feature_matrix(features.board_features(boards)))
+        self.shards += 1
+        self.total += len(boards)
+        print(f"Wrote {path} ({len(boards)} positions)")
+        self.reset()
+
+def export(paths, directory, shard_size, keep_duplicates=False):
+    writer = ShardWriter(directory, shard_size)
+    replayed = skipped = duplicates = 0
+    seen = set()
+    for game, events in games(read_events(paths)):
+        seed = game_seed(game)
+        if seed is None:
+            skipped += 1
+            continue
+        count = 0
+        for position in replay_game(seed, events):
+            count += 1
+            if not keep_duplicates:
+                if position[3] in seen:
+                    duplicates += 1
+                    continue
+                seen.add(position[3])
+            writer.add(*position)
+        replayed += count == len(events)
+        skipped += count != len(events)
+    writer.flush()
+    print(f"{writer.total} positions from {replayed} games ({skipped} cut short or skipped, "
+          f"{duplicates} duplicates dropped)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export TetraFusion placements as .npz training shards.")
+    parser.add_argument("paths", nargs="*", help="stats files (default: stats/*.jsonl.gz)")
+    parser.add_argument("--out", default="positions", help="output directory (default: positions)")
+    parser.add_argument("--shard-size", type=int, default=100000, help="positions per shard (default 100000)")
+    parser.add_argument("--keep-duplicates", action="store_true", help="write repeated positions again")
+    args = parser.parse_args()
+    paths = args.paths or sorted(glob.glob(os.path.join("stats", "*.jsonl.gz")))
+    if not paths:
+        print("No statistics files found.")
+        return
+    export(paths, args.out, args.shard_size, args.keep_duplicates)
+
+if __name__ == "__main__":
+    main()
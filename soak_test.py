@@ -0,0 +1,308 @@
+"""
+Long-running soak test for TetraFusion. Plays the game headless with random input
+through game over, restarts, the pause screen, the menu and the options screen, and
+samples memory and frame times as it goes.
+
+    python soak_test.py                          # one hour, a sample every minute
+    python soak_test.py --duration 28800 --interval 300 --report soak.jsonl
+
+Run it from the game directory (it loads the assets from there). It uses the dummy SDL
+video and audio drivers. Settings are not saved, and leaderboard and statistics files go
+to a temporary directory. Every sample is appended to the report as one JSON line:
+RSS, tracemalloc total and top allocators, live object counts and frame-time
+percentiles. At the end, growth since the first sample after the warm-up is checked
+against the thresholds, and the exit status is 1 if any of them is exceeded.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import TetraFusion as game
+
+# Object types whose live counts are tracked; Surfaces are found through their referrers
+# because pygame does not register them with the garbage collector.
+TRACKED_TYPES = ("Explosion", "TrailParticle", "DustParticle", "Surface")
+GAME_KEYS = ("left", "right", "down", "rotate", "hold", "hard_drop")
+
+class SoakFinished(Exception):
+    pass
+
+# -------------------------- Sampling --------------------------
+def rss_kb():
+    """Resident set size in KiB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def find_surfaces(container, surfaces):
+    for referent in gc.get_referents(container):
+        if type(referent) is pygame.Surface:
+            surfaces.add(id(referent))
+        elif type(referent) in (dict, list, tuple) and not gc.is_tracked(referent):
+            # The collector skips containers that hold only untracked objects (e.g. a dict
+            # of color tuples to Surfaces), so look inside them too. They cannot form cycles.
+            find_surfaces(referent, surfaces)
+
+def live_objects():
+    counts = dict.fromkeys(TRACKED_TYPES, 0)
+    surfaces = set()
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+        find_surfaces(obj, surfaces)
+    counts["Surface"] = len(surfaces)
+    return counts
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+# -------------------------- Driving the Game --------------------------
+def scene_name(scene):
+    if scene.gi_code.co_name == "screen_scene" and scene.gi_frame is not None:
+        return scene.gi_frame.f_locals["screen_function"].__name__
+    return scene.gi_code.co_name
+
+def key_event(key, unicode=""):
+    return pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode=unicode)
+
+def logical_to_window(pos):
+    """Inverse of TetraFusion.window_to_logical, for synthetic mouse clicks."""
+    if game.scale_target is None:
+        return pos
+    offset_x, offset_y = game.scale_target.get_abs_offset()
+    width, height = game.scale_target.get_size()
+    return (offset_x + (pos[0] * width + width - 1) // game.LOGICAL_SIZE[0],
+            offset_y + (pos[1] * height + height - 1) // game.LOGICAL_SIZE[1])
+
+def click_subwindow_button(rect):
+    pos = logical_to_window((game.SCREEN_WIDTH + rect.centerx, rect.centery))
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+
+class SoakDriver:
+    """
+    Posts input for whichever scene is on top of the stack each time a frame is presented.
+    Static screens only present after input, so they always get an event; the game gets
+    one roughly every input_ms.
+    """
+    def __init__(self, manager, rng, input_ms):
+        self.manager = manager
+        self.rng = rng
+        self.input_ms = input_ms
+        self.next_input = 0
+        self.held = []
+        self.games = 0
+
+    def post_input(self):
+        name = scene_name(self.manager.stack[-1])
+        controls = game.settings.controls
+        rng = self.rng
+        if name == "main_menu":
+            pygame.event.post(key_event(pygame.K_o if rng.random() < 0.2 else pygame.K_RETURN))
+        elif name == "options_menu":
+            self.change_setting()
+            pygame.event.post(key_event(pygame.K_ESCAPE))
+        elif name == "pause_game":
+            pygame.event.post(key_event(controls["pause"]))
+        elif name == "display_game_over":
+            self.games += 1
+            choice = rng.random()
+            if choice < 0.5:
+                pygame.event.post(key_event(pygame.K_a, "a"))
+                pygame.event.post(key_event(pygame.K_RETURN))
+                pygame.event.post(key_event(pygame.K_r, "r"))  # Normal game-over screen: restart.
+            else:
+                pygame.event.post(key_event(pygame.K_m))
+        elif name == "run_game":
+            now = pygame.time.get_ticks()
+            if now < self.next_input:
+                return
+            self.next_input = now + self.input_ms
+            while self.held and rng.random() < 0.5:
+                pygame.event.post(pygame.event.Event(pygame.KEYUP, key=self.held.pop(), mod=0))
+            choice = rng.random()
+            if choice < 0.002 and game.restart_button_rect:
+                click_subwindow_button(game.restart_button_rect)
+            elif choice < 0.004 and game.menu_button_rect:
+                click_subwindow_button(game.menu_button_rect)
+            elif choice < 0.01:
+                pygame.event.post(key_event(controls["pause"]))
+            else:
+                key = controls[rng.choice(GAME_KEYS)]
+                pygame.event.post(key_event(key))
+                self.held.append(key)
+
+    def change_setting(self):
+        """Flips a setting that has live listeners, as the options screen would."""
+        settings = game.settings
+        choice = self.rng.randrange(5)
+        if choice == 0:
+            settings.flame_trails = not settings.flame_trails
+        elif choice == 1:
+            settings.grid_opacity = self.rng.choice((0, 64, 128, 192, 255))
+        elif choice == 2:
+            settings.quality_tier = self.rng.choice(("auto",) + game.QUALITY_TIER_NAMES)
+        elif choice == 3:
+            settings.display_scaling = "integer" if settings.display_scaling == "smooth" else "smooth"
+        else:
+            settings.ghost_piece = not settings.ghost_piece
+
+# -------------------------- Soak Run --------------------------
+class Soak:
+    def __init__(self, args, report):
+        self.args = args
+        self.report = report
+        self.start = time.monotonic()
+        self.next_sample = self.start
+        self.frame_times = []
+        self.last_present = None
+        self.frames = 0
+        self.samples = []
+        self.manager = game.SceneManager(game.main_menu())
+        self.driver = SoakDriver(self.manager, random.Random(args.seed), args.input_ms)
+        self.present_display = game.present_display
+
+    def present(self):
+        """Replaces TetraFusion.present_display: times game frames, samples, then feeds input."""
+        self.present_display()
+        now = time.monotonic()
+        if scene_name(self.manager.stack[-1]) == "run_game":
+            if self.last_present is not None:
+                self.frame_times.append((now - self.last_present) * 1000)
+            self.last_present = now
+        else:
+            self.last_present = None
+        self.frames += 1
+        if now >= self.next_sample:
+            self.sample(now)
+            self.next_sample = now + self.args.interval
+            if now - self.start >= self.args.duration:
+                raise SoakFinished
+        self.driver.post_input()
+
+    def sample(self, now):
+        gc.collect()
+        frame_times = sorted(self.frame_times)
+        self.frame_times = []
+        sample = {
+            "t": round(now - self.start, 1),
+            "frames": self.frames,
+            "games": self.driver.games,
+            "rss_kb": rss_kb(),
+            "objects": live_objects(),
+            "frame_ms": {"p50": round(percentile(frame_times, 0.5), 2),
+                         "p95": round(percentile(frame_times, 0.95), 2),
+                         "p99": round(percentile(frame_times, 0.99), 2),
+                         "max": round(frame_times[-1], 2) if frame_times else 0.0},
+        }
+        if tracemalloc.is_tracing():
+            sample["traced_kb"] = tracemalloc.get_traced_memory()[0] // 1024
+            stats = tracemalloc.take_snapshot().filter_traces(
+                (tracemalloc.Filter(False, tracemalloc.__file__),)).statistics("lineno")
+            sample["top"] = [[f"{s.traceback[0].filename}:{s.traceback[0].lineno}", s.size // 1024]
+                             for s in stats[:self.args.top]]
+        self.samples.append(sample)
+        self.report.write(json.dumps(sample) + "\n")
+        self.report.flush()
+        print(f"[{sample['t']:>8.0f}s] games {sample['games']:>6} rss {sample['rss_kb'] // 1024} MiB "
+              f"p99 {sample['frame_ms']['p99']} ms objects {sample['objects']}")
+
+    def run(self):
+        game.present_display = self.present
+        try:
+            self.manager.run()
+        except SoakFinished:
+            pass
+        finally:
+            game.present_display = self.present_display
+
+    def failures(self):
+        """Growth from the first post-warm-up sample to the last one, checked against the limits."""
+        baseline = next((s for s in self.samples if s["t"] >= self.args.warmup), None)
+        last = self.samples[-1] if self.samples else None
+        if baseline is None or baseline is last:
+            return ["not enough samples after the warm-up to measure growth"]
+        failures = []
+        rss_growth = (last["rss_kb"] - baseline["rss_kb"]) / 1024
+        if rss_growth > self.args.max_rss_growth:
+            failures.append(f"RSS grew {rss_growth:.1f} MiB (limit {self.args.max_rss_growth})")
+        if "traced_kb" in last:
+            traced_growth = (last["traced_kb"] - baseline["traced_kb"]) / 1024
+            if traced_growth > self.args.max_traced_growth:
+                failures.append(f"Python heap grew {traced_growth:.1f} MiB (limit {self.args.max_traced_growth})")
+        for name in TRACKED_TYPES:
+            growth = last["objects"][name] - baseline["objects"][name]
+            if growth > self.args.max_object_growth:
+                failures.append(f"{name} count grew by {growth} (limit {self.args.max_object_growth})")
+        return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test TetraFusion for leaks and frame-time regressions.")
+    parser.add_argument("--duration", type=float, default=3600, help="seconds to run (default 3600)")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between samples (default 60)")
+    parser.add_argument("--warmup", type=float, default=None,
+                        help="seconds before the baseline sample (default: one interval)")
+    parser.add_argument("--report", default="soak_report.jsonl", help="time-series output (JSON lines)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--input-ms", type=int, default=30, help="ms between random inputs in game")
+    parser.add_argument("--fps", type=int, default=0, help="game frame cap (default uncapped)")
+    parser.add_argument("--top", type=int, default=10, help="allocators listed per sample")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip heap tracing (runs faster)")
+    parser.add_argument("--max-rss-growth", type=float, default=64, help="MiB (default 64)")
+    parser.add_argument("--max-traced-growth", type=float, default=16, help="MiB (default 16)")
+    parser.add_argument("--max-object-growth", type=int, default=500, help="per tracked type (default 500)")
+    args = parser.parse_args()
+    if args.warmup is None:
+        args.warmup = args.interval
+
+    scratch = tempfile.mkdtemp(prefix="tetrafusion-soak-")
+    game.init_runtime()
+    game.save_settings = lambda settings, filename=None: None  # game.settings keeps its defaults.
+    game.settings.target_fps = args.fps
+    game.input_mapper.rebuild(game.settings)
+    for names, callback in ((("grid_color", "grid_opacity", "grid_lines"), game.invalidate_grid_overlay),
+                            (("quality_tier",), game.quality_governor.lock),
+                            (("display_scaling",), game.apply_display_mode)):
+        game.settings.subscribe(names, callback)
+    game.leaderboard = game.Leaderboard(os.path.join(scratch, "leaderboard.db"),
+                                        os.path.join(scratch, "leaderboard.jsonl"),
+                                        os.path.join(scratch, "high_score.txt"))
+    game.stats_recorder = game.StatsRecorder(os.path.join(scratch, "stats"))
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+
+    with open(args.report, "w") as report:
+        soak = Soak(args, report)
+        soak.run()
+    game.leaderboard.flush()
+    game.stats_recorder.flush()
+    shutil.rmtree(scratch, ignore_errors=True)
+    failures = soak.failures()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: {soak.driver.games} games, {soak.frames} frames, report in {args.report}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Offline aggregation for the per-piece statistics TetraFusion records in stats/*.jsonl.gz.
+
+    python stats_report.py                 # every file in ./stats
+    python stats_report.py --games         # plus one line per game
+    python stats_report.py a.jsonl.gz ...  # specific files
+
+Files are streamed one batch at a time, so thousands of sessions aggregate in constant memory
+per game. Besides the standard library this script only needs the pygame-free rules engine
+(tetrafusion_core.engine); it does not import the game.
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+
+from tetrafusion_core.engine import finesse_table
+
+# -------------------------- Reading --------------------------
+def read_events(paths):
+    """Yields one dict per recorded piece from the given gzip JSON-lines files."""
+    for path in paths:
+        try:
+            with gzip.open(path, "rt") as file:
+                for line in file:
+                    try:
+                        batch = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A batch cut short by a crash.
+                    fields = batch["fields"]
+                    for row in batch["rows"]:
+                        yield dict(zip(fields, row))
+        except (OSError, EOFError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+
+# -------------------------- Finesse --------------------------
+def minimum_inputs(event):
+    """
+    Fewest inputs (taps, DAS to a wall, rotations, soft drops) that reach the placement.
+    The game measures this on the real board as it is played (min_inputs); files from before
+    that are looked up in the spawn-height table, which assumes the piece dropped straight
+    and, for pieces taken from hold, spawned unrotated. Returns None if unknown.
+    """
+    recorded = event.get("min_inputs")
+    if recorded is not None:
+        return recorded
+    inputs = finesse_table(event["board_width"]).get((event["shape"], 0, event["rotation"], event["x"]))
+    return None if inputs is None else len(inputs)
+
+def finesse_errors(event):
+    """Inputs beyond the minimum. The game has a single clockwise rotate key."""
+    minimum = minimum_inputs(event)
+    if minimum is None:
+        return 0
+    return max(0, event["moves"] + event["rotations"] + event.get("soft_drops", 0) - minimum)
+
+# -------------------------- Aggregation --------------------------
+class GameStats:
+    def __init__(self, game):
+        self.game = game
+        self.pieces = 0
+        self.duration = 0
+        self.lines = 0
+        self.tetris_lines = 0
+        self.finesse_errors = 0
+        self.finesse_faults = 0  # Pieces with at least one input too many.
+        self.holds = 0
+        self.hard_drops = 0
+        self.level = 1
+
+    def add(self, event):
+        self.pieces += 1
+        self.duration = max(self.duration, event["t"])
+        self.lines += event["lines"]
+        if event["lines"] == 4:
+            self.tetris_lines += 4
+        errors = finesse_errors(event)
+        self.finesse_errors += errors
+        self.finesse_faults += errors > 0
+        self.holds += bool(event["held"])
+        self.hard_drops += bool(event["hard_drop"])
+        self.level = max(self.level, event["level"])
+
+def aggregate(events):
+    games = {}
+    for event in events:
+        stats = games.get(event["game"])
+        if stats is None:
+            stats = games[event["game"]] = GameStats(event["game"])
+        stats.add(event)
+    return games
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+def print_report(games, per_game=False):
+    if per_game:
+        print(f"{'game':<24}{'pieces':>8}{'pps':>7}{'lines':>7}{'tetris%':>9}{'fin/pc':>8}{'hold%':>7}{'lvl':>5}")
+        for stats in games.values():
+            print(f"{stats.game:<24}{stats.pieces:>8}{ratio(stats.pieces, stats.duration / 1000):>7.2f}"
+                  f"{stats.lines:>7}{100 * ratio(stats.tetris_lines, stats.lines):>8.1f}%"
+                  f"{ratio(stats.finesse_errors, stats.pieces):>8.2f}{100 * ratio(stats.holds, stats.pieces):>6.1f}%"
+                  f"{stats.level:>5}")
+        print()
+
+    pieces = sum(s.pieces for s in games.values())
+    seconds = sum(s.duration for s in games.values()) / 1000
+    lines = sum(s.lines for s in games.values())
+    print(f"Games:              {len(games)}")
+    print(f"Pieces:             {pieces}")
+    print(f"Pieces per second:  {ratio(pieces, seconds):.2f}")
+    print(f"Lines:              {lines}")
+    print(f"Tetris rate:        {100 * ratio(sum(s.tetris_lines for s in games.values()), lines):.1f}%")
+    print(f"Finesse errors:     {sum(s.finesse_errors for s in games.values())} "
+          f"({ratio(sum(s.finesse_errors for s in games.values()), pieces):.2f} per piece)")
+    print(f"Finesse faults:     {100 * ratio(sum(s.finesse_faults for s in games.values()), pieces):.1f}% of pieces")
+    print(f"Hold usage:         {100 * ratio(sum(s.holds for s in games.values()), pieces):.1f}%")
+    print(f"Hard drop usage:    {100 * ratio(sum(s.hard_drops for s in games.values()), pieces):.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate TetraFusion per-piece statistics.")
+    parser.add_argument("paths", nargs="*", help="stats files (default: stats/*.jsonl.gz)")
+    parser.add_argument("--games", action="store_true", help="print one line per game")
+    args = parser.parse_args()
+    paths = args.paths or sorted(glob.glob(os.path.join("stats", "*.jsonl.gz")))
+    if not paths:
+        print("No statistics files found.")
+        return
+    print_report(aggregate(read_events(paths)), args.games)
+
+if __name__ == "__main__":
+    main()
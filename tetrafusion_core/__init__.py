@@ -0,0 +1,15 @@
+"""
+Importable parts of TetraFusion. The engine module holds the rules and has no pygame
+dependency. The render module (render commands, the render thread and the GPU backend),
+the audio module (sound bank, music files and mixer profiles), the input module (joysticks,
+input mapping and timing) and the ui module (menus and scenes) need pygame and are not
+imported here; TetraFusion.py adds the game loop and the game's state on top of them.
+"""
+from .engine import (
+    GRID_WIDTH, GRID_HEIGHT, MAX_GRID_WIDTH, MAX_GRID_HEIGHT, BOARD_SIZES, FALL_SPEEDS,
+    SHAPES, SHAPE_LOOKUP, ROTATION_LOOKUP, rotate_matrix, get_shape_index,
+    TetrominoBag, AutoShift, create_grid, is_danger_zone_active, valid_position,
+    rotate_tetromino_with_kick, place_tetromino, find_full_rows, clear_lines, update_score,
+    check_game_over, RowMasks, GridHash, LockResult, LockPipeline, Board, reachable_placements, plan_placement, Bot,
+    input_paths, finesse_table, FinesseAnalyzer,
+)
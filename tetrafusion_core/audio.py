@@ -0,0 +1,301 @@
+"""
+Audio for TetraFusion: finding playable music files, the sound bank that plays effects on
+reserved channels, and the mixer latency profiles with a jitter-based buffer suggestion.
+Which track plays and when the mixer is reopened stays with the game, which owns the
+settings and the playlist. Needs pygame, and mutagen to scan music folders; nothing here
+opens the mixer at import.
+"""
+import os
+import tempfile
+import time
+
+import pygame
+try:
+    from pygame._sdl2 import audio as sdl2_audio  # Only used by the buffer jitter test.
+except ImportError:
+    sdl2_audio = None
+
+# -------------------------- Sound and Music Files --------------------------
+# List of common audio file extensions
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".flac", ".ogg", ".aac", ".m4a", ".wma"}
+
+def load_sound(file_path):
+    """Attempt to load a sound file; if missing, print a warning and return None."""
+    if os.path.exists(file_path):
+        try:
+            return pygame.mixer.Sound(file_path)
+        except Exception as e:
+            print(f"Error loading sound {file_path}: {e}")
+            return None
+    else:
+        print(f"Sound file not found: {file_path}")
+        return None
+
+def get_music_files(directory):
+    """
+    Recursively search the given directory for valid audio files.
+    Uses both file extension checking and Mutagen to ensure the file is playable.
+    The search order is as follows:
+      1. Process files in the current directory first. Within the directory, files are sorted so that
+         filenames starting with digits (0-9) come first, then those starting with English letters (A-Z),
+         then all other files.
+      2. Then process each subdirectory (in sorted order using the same criteria), appending their files.
+    Returns a list of valid file paths in the order they are found.
+    """
+    from mutagen import File  # Reads audio metadata safely; imported only when a folder is scanned.
+
+    music_files = []
+    unsupported_files = []
+    
+    try:
+        items = os.listdir(directory)
+    except Exception as e:
+        print(f"Error reading directory {directory}: {e}")
+        return []
+
+    # Separate items into files and subdirectories, ignoring hidden items.
+    files = []
+    subdirs = []
+    for item in items:
+        if item.startswith('.'):
+            continue  # Skip hidden files/directories.
+        full_path = os.path.join(directory, item)
+        if os.path.isfile(full_path):
+            files.append(item)
+        elif os.path.isdir(full_path):
+            subdirs.append(item)
+    
+    # Define a key function for sorting:
+    # Category 0: Files starting with a digit (0-9)
+    # Category 1: Files starting with an English letter (A-Z)
+    # Category 2: All others (e.g., non-English characters, symbols)
+    def sort_key(name):
+        first_char = name[0]
+        if first_char.isdigit():
+            cat = 0
+        elif "A" <= first_char.upper() <= "Z":
+            cat = 1
+        else:
+            cat = 2
+        return (cat, name.upper())
+    
+    # Sort the files and subdirectories using the key.
+    files.sort(key=sort_key)
+    subdirs.sort(key=sort_key)
+    
+    # Process files in the current directory.
+    for file in files:
+        full_path = os.path.join(directory, file)
+        ext = os.path.splitext(full_path)[1].lower()
+        # Check if file extension is a known audio format.
+        if ext in AUDIO_EXTENSIONS:
+            try:
+                # Verify the file with Mutagen (checks actual audio header)
+                if File(full_path) is not None:
+                    music_files.append(full_path)
+                else:
+                    unsupported_files.append(file)
+            except Exception as e:
+                print(f"Skipping {file}: Error reading file - {e}")
+                unsupported_files.append(file)
+        else:
+            unsupported_files.append(file)
+    
+    # Process each subdirectory recursively.
+    for sub in subdirs:
+        sub_path = os.path.join(directory, sub)
+        # Append files from the subdirectory after processing the current directory.
+        music_files.extend(get_music_files(sub_path))
+    
+    # Print unsupported files (if any) along with supported formats.
+    if unsupported_files:
+        print(f"Unsupported files detected in '{directory}':")
+        for file in unsupported_files:
+            print(f"  {file}")
+        print("Supported formats are:", ", ".join(sorted(AUDIO_EXTENSIONS)))
+    
+    return music_files
+
+# -------------------------- Sound Bank --------------------------
+# category: (reserved channels, rule when every channel in the category is busy)
+#   "oldest" stops the longest-playing voice and reuses its channel; "skip" drops the new sound.
+SOUND_CATEGORIES = {
+    "clear": (3, "oldest"),
+    "jingle": (1, "oldest"),
+    "ambient": (1, "skip"),
+}
+SOUND_VOICES_PER_FRAME = 2  # New voices started per frame across all categories.
+SOUND_CACHE_DIRECTORY = os.path.join("cache", "sounds")  # None disables the converted PCM cache.
+
+class SoundBank:
+    """
+    Sound effects loaded once in the mixer's own format, each played on channels reserved
+    for its category. At most SOUND_VOICES_PER_FRAME new voices (and each sound once) start
+    between end_frame() calls, so simultaneous events cannot stack voices on the audio thread.
+    Converted PCM is cached on disk keyed by mixer format, which skips decoding and
+    resampling on later launches.
+    """
+    def __init__(self, cache_directory=SOUND_CACHE_DIRECTORY):
+        self.cache_directory = cache_directory
+        self.registry = {}   # name -> (path, category)
+        self.sounds = {}     # name -> Sound, or None if it could not be loaded
+        self.channels = {}   # category -> [Channel]
+        self.voices = {}     # Channel -> (start time, name)
+        self.frame_voices = 0
+        self.frame_names = set()
+        self.reserve_channels()
+
+    def reserve_channels(self):
+        """Hands each category its own channels and keeps them out of automatic allocation."""
+        self.channels = {}
+        self.voices = {}
+        if not pygame.mixer.get_init():
+            return
+        index = 0
+        for category, (count, rule) in SOUND_CATEGORIES.items():
+            self.channels[category] = [pygame.mixer.Channel(i) for i in range(index, index + count)]
+            index += count
+        pygame.mixer.set_reserved(index)
+
+    def load(self, name, file_path, category):
+        self.registry[name] = (file_path, category)
+        self.sounds[name] = self._load(file_path)
+
+    def reload(self):
+        """Reloads every sound for the current mixer format, e.g. after the mixer was reinitialized."""
+        self.reserve_channels()
+        for name, (file_path, category) in self.registry.items():
+            self.sounds[name] = self._load(file_path)
+
+    def _cache_path(self, file_path):
+        frequency, size, channels = pygame.mixer.get_init()
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(self.cache_directory, f"{name}-{frequency}-{size}-{channels}.pcm")
+
+    def _load(self, file_path):
+        if not pygame.mixer.get_init():
+            return None
+        if not os.path.exists(file_path):
+            print(f"Sound file not found: {file_path}")
+            return None
+        cache_path = self._cache_path(file_path) if self.cache_directory else None
+        if cache_path and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+            try:
+                with open(cache_path, "rb") as file:
+                    return pygame.mixer.Sound(buffer=file.read())
+            except Exception as e:
+                print(f"Error loading cached sound {cache_path}: {e}")
+        sound = load_sound(file_path)
+        if sound is not None and sound.get_length() == 0:
+            # An empty chunk is refused by the mixer, and Channel.play() does not survive that.
+            print(f"Sound file decoded to no audio: {file_path}")
+            return None
+        if sound is not None and cache_path:
+            try:
+                os.makedirs(self.cache_directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=self.cache_directory, suffix=".tmp")
+                with os.fdopen(fd, "wb") as file:
+                    file.write(sound.get_raw())
+                os.replace(temp_path, cache_path)
+            except OSError as e:
+                print(f"Error caching sound {cache_path}: {e}")
+        return sound
+
+    def play(self, name, loops=0):
+        """Starts a sound on its category's channels. Returns the Channel, or None if it was not played."""
+        sound = self.sounds.get(name)
+        if sound is None or name in self.frame_names or self.frame_voices >= SOUND_VOICES_PER_FRAME:
+            return None
+        category = self.registry[name][1]
+        channels = self.channels.get(category)
+        if not channels:
+            channel = sound.play(loops)
+        else:
+            channel = next((c for c in channels if not c.get_busy()), None)
+            if channel is None:
+                if SOUND_CATEGORIES[category][1] == "skip":
+                    return None
+                channel = min(channels, key=lambda c: self.voices.get(c, (0, None))[0])
+                channel.stop()
+            channel.play(sound, loops)
+            self.voices[channel] = (time.monotonic(), name)
+        self.frame_voices += 1
+        self.frame_names.add(name)
+        return channel
+
+    def stop(self, name):
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+        for channel in self.channels.get(self.registry[name][1], ()):
+            if self.voices.get(channel, (0, None))[1] == name:
+                channel.stop()
+        if not self.channels:
+            sound.stop()
+
+    def end_frame(self):
+        self.frame_voices = 0
+        self.frame_names.clear()
+
+# -------------------------- Mixer Latency Profiles --------------------------
+# profile: (frequency, buffer size in samples). Small buffers play effects sooner but underrun
+# on slow machines; "calibrated" (shown as "Tuned") uses the buffer suggested by
+# recommend_buffer_by_jitter(). The name is kept so existing settings files still load.
+MIXER_PROFILES = {
+    "low_latency": (44100, 256),
+    "balanced": (44100, 512),
+    "power_saving": (44100, 2048),
+}
+MIXER_PROFILE_NAMES = ("low_latency", "balanced", "power_saving", "calibrated")
+CALIBRATION_BUFFERS = (128, 256, 512, 1024, 2048)
+CALIBRATION_SECONDS = 0.4  # Per buffer size.
+
+def mixer_profile_config(settings):
+    if settings.audio_profile == "calibrated":
+        return (44100, settings.audio_buffer)
+    return MIXER_PROFILES[settings.audio_profile]
+
+def measure_callback_jitter(device_name, buffer, frequency, seconds=CALIBRATION_SECONDS):
+    """
+    Plays silence through a second output device and timestamps its callbacks. Returns how far
+    (ms) the latest callback fell behind the schedule set by the earliest one.
+    """
+    stamps = []
+    def callback(device, memory):
+        stamps.append(time.perf_counter())
+        memory[:] = bytes(len(memory))
+    device = sdl2_audio.AudioDevice(device_name, False, frequency, sdl2_audio.AUDIO_S16, 2, buffer, 0, callback)
+    device.pause(0)
+    time.sleep(seconds)
+    device.pause(1)
+    device.close()
+    period = buffer / frequency
+    drift = [stamp - i * period for i, stamp in enumerate(stamps)][2:]  # Skip device start-up.
+    if len(drift) < 2:
+        return None
+    return (max(drift) - min(drift)) * 1000
+
+def recommend_buffer_by_jitter(frequency):
+    """
+    Measures callback jitter on a second output device for each size in CALIBRATION_BUFFERS,
+    at the game mixer's 'frequency', while that mixer keeps running. Returns (smallest buffer
+    whose jitter stays under half its period, {buffer: jitter ms}), or (None, {}) when the
+    driver cannot open a second device. This suggests a buffer that should not underrun; it
+    does not measure the game mixer's own play-to-output latency.
+    """
+    if sdl2_audio is None:
+        return None, {}
+    results = {}
+    try:
+        device_name = sdl2_audio.get_audio_device_names(False)[0]
+        for buffer in CALIBRATION_BUFFERS:
+            jitter = measure_callback_jitter(device_name, buffer, frequency)
+            if jitter is not None:
+                results[buffer] = jitter
+    except (IndexError, pygame.error, sdl2_audio.error) as e:
+        print(f"Buffer jitter test unavailable: {e}")
+        return None, {}
+    for buffer in CALIBRATION_BUFFERS:
+        if buffer in results and results[buffer] < buffer / frequency * 500:
+            return buffer, results
+    return (max(results) if results else None), results
@@ -0,0 +1,879 @@
+"""
+TetraFusion rules: shapes, rotation, the piece bag, auto-shift timing, the grid and the
+lock pipeline. Pure Python with no pygame and no import-time side effects, so tests,
+simulators and worker processes can import it without a display or audio device.
+"""
+import random
+from collections import deque
+
+# -------------------------- Board --------------------------
+GRID_WIDTH = 15    # Default board size; every Board can pick its own.
+GRID_HEIGHT = 31
+MIN_GRID_SIZE = 4  # Room for the I piece in either direction.
+MAX_GRID_WIDTH = 64   # A row mask fits in one 64-bit word.
+MAX_GRID_HEIGHT = 128
+BOARD_SIZES = {'standard': (10, 20), 'tetrafusion': (GRID_WIDTH, GRID_HEIGHT), 'wide': (20, 40), 'giant': (40, 100)}
+FALL_SPEEDS = {'easy': 1500, 'normal': 1000, 'hard': 600, 'very hard': 400}  # ms per row at level 1
+FAST_FALL_SPEED = 50  # ms per row while soft dropping, and the fastest gravity a level reaches
+
+# -------------------------- Tetromino Shapes --------------------------
+SHAPES = [
+    [[1, 1, 1], [0, 1, 0]],
+    [[1, 1], [1, 1]],
+    [[1, 1, 0], [0, 1, 1]],
+    [[0, 1, 1], [1, 1, 0]],
+    [[1, 1, 1, 1]],
+    [[1, 0, 0], [1, 1, 1]],
+    [[0, 0, 1], [1, 1, 1]]
+]
+
+# -------------------------- Helper for Rotations --------------------------
+def rotate_matrix(matrix):
+    """Rotates a matrix (list of lists) 90° clockwise."""
+    return [list(row) for row in zip(*matrix[::-1])]
+
+# -------------------------- Shape Lookups --------------------------
+def _build_shape_lookup():
+    """Maps every rotation of every shape (as a tuple of tuples) to its SHAPES index."""
+    lookup = {}
+    for index, shape in enumerate(SHAPES):
+        candidate = shape
+        for _ in range(4):
+            lookup.setdefault(tuple(map(tuple, candidate)), index)
+            candidate = rotate_matrix(candidate)
+    return lookup
+
+SHAPE_LOOKUP = _build_shape_lookup()
+
+def get_shape_index(tetromino):
+    """
+    Returns the index of the given tetromino shape in the SHAPES list.
+    All four rotations are precomputed in SHAPE_LOOKUP, so this is a single dict lookup.
+    If no match is found, prints an error and returns None.
+    """
+    index = SHAPE_LOOKUP.get(tuple(map(tuple, tetromino)))
+    if index is None:
+        print("Error: Tetromino shape not found in SHAPES list.")
+    return index
+
+def _build_rotation_lookup():
+    """Maps every rotation of every shape to the number of clockwise turns from its spawn orientation."""
+    lookup = {}
+    for shape in SHAPES:
+        candidate = shape
+        for turns in range(4):
+            lookup.setdefault(tuple(map(tuple, candidate)), turns)
+            candidate = rotate_matrix(candidate)
+    return lookup
+
+ROTATION_LOOKUP = _build_rotation_lookup()
+
+# -------------------------- Tetromino Bag --------------------------
+class TetrominoBag:
+    def __init__(self, shapes, seed=None):
+        self.shapes = shapes
+        self.rng = random.Random(seed)  # Own generator, so a seed reproduces the piece sequence.
+        self.bag = []
+        self.refill_bag()
+
+    def refill_bag(self):
+        self.bag = self.shapes[:]
+        self.rng.shuffle(self.bag)
+
+    def get_next_tetromino(self):
+        if not self.bag:
+            self.refill_bag()
+        return self.bag.pop()
+
+# -------------------------- Auto Shift --------------------------
+class AutoShift:
+    """
+    Delayed auto-shift (DAS) and auto-repeat rate (ARR) computed from input timestamps.
+    The most recently pressed direction wins; releasing it falls back to the other held
+    direction with a fresh DAS delay.
+    """
+    def __init__(self, das, arr):
+        self.das = das
+        self.arr = arr
+        self.held = []
+        self.next_shift = 0
+
+    @property
+    def direction(self):
+        return self.held[-1] if self.held else None
+
+    def press(self, direction, time):
+        if direction in self.held:
+            self.held.remove(direction)
+        self.held.append(direction)
+        self.next_shift = time + self.das
+
+    def reset(self):
+        self.held = []
+
+    def release(self, direction, time):
+        """Releases a direction; returns the shifts it was still owed up to 'time'."""
+        if direction not in self.held:
+            return 0
+        owed = self.shifts_due(time) if self.direction == direction else 0
+        self.held.remove(direction)
+        if self.held:
+            self.next_shift = time + self.das
+        return owed
+
+    def shifts_due(self, now):
+        """Returns how many auto-repeat shifts fell due since the last call."""
+        if not self.held or now < self.next_shift:
+            return 0
+        if self.arr <= 0:
+            return MAX_GRID_WIDTH  # Instant: slide to the wall.
+        count = int((now - self.next_shift) // self.arr) + 1
+        self.next_shift += count * self.arr
+        return count
+
+# -------------------------- Grid --------------------------
+# The grid functions take the board size from the grid itself (len(grid) rows of len(grid[0])).
+def create_grid(width=GRID_WIDTH, height=GRID_HEIGHT):
+    return [[0 for _ in range(width)] for _ in range(height)]
+
+def is_danger_zone_active(grid):
+    for y in range(4):
+        if any(grid[y]):
+            return True
+    return False
+
+def valid_position(tetromino, offset, grid):
+    width = len(grid[0])
+    height = len(grid)
+    for cy, row in enumerate(tetromino):
+        for cx, cell in enumerate(row):
+            if cell:
+                x = offset[0] + cx
+                y = offset[1] + cy
+                if x < 0 or x >= width or y >= height or (y >= 0 and grid[y][x]):
+                    return False
+    return True
+
+KICKS = ((0, 0), (-1, 0), (1, 0), (0, -1), (-2, 0), (2, 0))  # Offsets tried in order when rotating.
+
+def rotate_tetromino_with_kick(tetromino, offset, grid):
+    rotated = [list(row) for row in zip(*tetromino[::-1])]
+    for dx, dy in KICKS:
+        new_offset = [offset[0]+dx, offset[1]+dy]
+        if valid_position(rotated, new_offset, grid):
+            return rotated, new_offset
+    return tetromino, offset
+
+def place_tetromino(tetromino, offset, grid, color_index, grid_hash=None):
+    width = len(grid[0])
+    height = len(grid)
+    for cy, row in enumerate(tetromino):
+        for cx, cell in enumerate(row):
+            if cell:
+                x = offset[0] + cx
+                y = offset[1] + cy
+                if 0 <= x < width and 0 <= y < height:
+                    if grid_hash is not None and not grid[y][x]:
+                        grid_hash.toggle(x, y)
+                    grid[y][x] = color_index
+
+def find_full_rows(grid, rows=None):
+    """
+    Returns the indices of completed rows in ascending order.
+    Pass 'rows' (e.g. the rows a piece just locked into) to avoid scanning the whole grid.
+    """
+    height = len(grid)
+    if rows is None:
+        rows = range(height)
+    return [y for y in rows if 0 <= y < height and all(grid[y])]
+
+def clear_lines(grid, full_lines=None, grid_hash=None):
+    """
+    Removes the completed rows (ascending indices) from the grid in place.
+    Returns the grid and a list of (row index, row colors) for every cleared row;
+    the row lists are the removed rows themselves, so no copy of the grid is made.
+    The rows above the lowest cleared one are moved down in a single pass of row
+    references, however many rows were cleared; no cell is copied.
+    """
+    if full_lines is None:
+        full_lines = find_full_rows(grid)
+    if not full_lines:
+        return grid, []
+    cleared = [(y, grid[y]) for y in full_lines]
+    removed = set(full_lines)
+    lowest = full_lines[-1]
+    width = len(grid[0])
+    grid[:lowest + 1] = ([[0] * width for _ in full_lines]
+                         + [grid[y] for y in range(lowest + 1) if y not in removed])
+    if grid_hash is not None:
+        for y in full_lines:
+            grid_hash.remove_row(y)
+    return grid, cleared
+
+def update_score(score, lines_cleared):
+    return score + lines_cleared * 100
+
+def check_game_over(grid):
+    return any(cell != 0 for cell in grid[0])
+
+class RowMasks:
+    """
+    Occupancy of a grid as one integer per row (bit x set = column x filled) plus the height
+    of every column. A Board keeps it in step with its grid, so full rows, the stack top and
+    column heights are read without scanning cells, whatever the board size.
+    """
+    def __init__(self, grid):
+        self.width = len(grid[0])
+        self.height = len(grid)
+        self.full = (1 << self.width) - 1
+        self.rows = [sum(1 << x for x, cell in enumerate(row) if cell) for row in grid]
+        self.heights = [self.column_height(x) for x in range(self.width)]
+
+    def column_height(self, x, start=0):
+        bit = 1 << x
+        for y in range(start, self.height):
+            if self.rows[y] & bit:
+                return self.height - y
+        return 0
+
+    def fill(self, x, y):
+        self.rows[y] |= 1 << x
+        self.heights[x] = max(self.heights[x], self.height - y)
+
+    def remove_rows(self, full_rows):
+        """Mirrors clear_lines() for the same ascending row indices."""
+        if not full_rows:
+            return
+        removed = set(full_rows)
+        lowest = full_rows[-1]
+        rows = self.rows
+        rows[:lowest + 1] = [0] * len(full_rows) + [rows[y] for y in range(lowest + 1) if y not in removed]
+        # A full row crosses every column, so each column's top sits at or above the highest
+        # cleared row: it either drops by the number of cleared rows or, if it was itself
+        # cleared, is found again below that row's new position, since nothing above it moved
+        # lower than that.
+        first = self.height - full_rows[0]
+        for x in range(self.width):
+            if self.heights[x] > first:
+                self.heights[x] -= len(full_rows)
+            else:
+                self.heights[x] = self.column_height(x, full_rows[0] + len(full_rows))
+
+    def stack_height(self):
+        return max(self.heights)
+
+    def drop_distance(self, tetromino, offset):
+        """
+        Rows a piece at a valid 'offset' can fall before it lands; the hard-drop distance of the
+        valid_position() loop, tested with one AND per piece row and starting at the stack top.
+        """
+        x, top = offset
+        piece = [(cy, bits) for cy, bits in
+                 ((cy, sum(1 << (x + cx) for cx, cell in enumerate(row) if cell)) for cy, row in enumerate(tetromino))
+                 if bits]
+        bottom = top + piece[-1][0]
+        # Every row above the stack is empty, so the piece falls at least until it reaches it.
+        distance = max(0, self.height - self.stack_height() - 1 - bottom)
+        rows = self.rows
+        while bottom + distance + 1 < self.height:
+            below = top + distance + 1
+            if any(below + cy >= 0 and rows[below + cy] & bits for cy, bits in piece):
+                break
+            distance += 1
+        return distance
+
+# -------------------------- Zobrist Hashing --------------------------
+HASH_BITS = 64
+HASH_MASK = (1 << HASH_BITS) - 1
+_zobrist_random = random.Random(0x7E7AF051)  # Fixed, so hashes are stable across runs and processes.
+
+def _zobrist_keys(count):
+    return [_zobrist_random.getrandbits(HASH_BITS) for _ in range(count)]
+
+def rotate_key(key, count, bits=HASH_BITS):
+    """Rotates a key of 'bits' bits (64 by default) left by 'count'."""
+    count %= bits
+    return ((key << count) | (key >> (bits - count))) & ((1 << bits) - 1)
+
+# Cell (x, y) hashes as CELL_KEYS[x] rotated left by y bits, so boards up to 64 rows tall get
+# distinct keys; taller boards rotate wider keys and fold them to 64 bits (see GridHash).
+CELL_KEYS = _zobrist_keys(MAX_GRID_WIDTH)
+KEY_PADDING = 4  # Piece offsets may sit a few cells outside the grid.
+PIECE_KEYS = [_zobrist_keys(4) for _ in SHAPES]   # [shape][rotation]
+PIECE_X_KEYS = _zobrist_keys(MAX_GRID_WIDTH + 2 * KEY_PADDING)
+PIECE_Y_KEYS = _zobrist_keys(MAX_GRID_HEIGHT + 2 * KEY_PADDING)
+NEXT_KEYS = _zobrist_keys(len(SHAPES))
+HOLD_KEYS = _zobrist_keys(len(SHAPES))
+HOLD_USED_KEY = _zobrist_keys(1)[0]
+BAG_KEYS = _zobrist_keys(len(SHAPES))
+_wide_cell_keys = {HASH_BITS: CELL_KEYS}
+
+def wide_cell_keys(bits):
+    """Column keys of 'bits' bits for grids taller than 64 rows; seeded by width, so stable too."""
+    keys = _wide_cell_keys.get(bits)
+    if keys is None:
+        rng = random.Random(bits)
+        keys = _wide_cell_keys[bits] = [rng.getrandbits(bits) for _ in range(MAX_GRID_WIDTH)]
+    return keys
+
+class GridHash:
+    """
+    Zobrist hash of which grid cells are filled (colors are ignored, so they may cycle with
+    the level). 'rows' keeps each row's unrotated XOR of CELL_KEYS, so placing a piece costs
+    one update per cell and clearing a row one per row above it; the grid is never rescanned.
+    """
+    def __init__(self, grid=None):
+        if grid is None:
+            grid = create_grid()
+        # Keys are as wide as the grid is tall (in whole 64-bit words), so no two rows share one.
+        self.bits = HASH_BITS * max(1, -(-len(grid) // HASH_BITS))
+        self.keys = wide_cell_keys(self.bits)
+        self.rows = [0] * len(grid)
+        self.wide = 0
+        for y, row in enumerate(grid):
+            for x, cell in enumerate(row):
+                if cell:
+                    self.toggle(x, y)
+
+    @property
+    def value(self):
+        """The 64-bit hash; keys wider than 64 bits are folded down by XOR."""
+        if self.bits == HASH_BITS:
+            return self.wide
+        value, folded = self.wide, 0
+        while value:
+            folded ^= value & HASH_MASK
+            value >>= HASH_BITS
+        return folded
+
+    def toggle(self, x, y):
+        """Flips one cell between empty and filled."""
+        key = self.keys[x]
+        self.rows[y] ^= key
+        self.wide ^= rotate_key(key, y, self.bits)
+
+    def remove_row(self, y):
+        """Mirrors clear_lines(): row y is removed and every row above it moves down one."""
+        bits = self.bits
+        above = 0
+        for row_y, key in enumerate(self.rows[:y]):
+            if key:  # Empty rows above the stack contribute nothing.
+                above ^= rotate_key(key, row_y, bits)
+        # Rotation distributes over XOR, so moving all of 'above' down a row rotates it by one bit.
+        self.wide ^= above ^ rotate_key(above, 1, bits) ^ rotate_key(self.rows[y], y, bits)
+        self.rows.pop(y)
+        self.rows.insert(0, 0)
+
+# -------------------------- Lock Pipeline --------------------------
+class LockResult:
+    """Everything the lock stages produced for one piece, handed to the effect emitters."""
+    __slots__ = ("tetromino", "offset", "color_index", "hard_drop", "hard_drop_rows",
+                 "cleared", "lines_cleared", "level_up", "time")
+
+    def __init__(self, tetromino, offset, color_index, hard_drop, hard_drop_rows, cleared, level_up, time):
+        self.tetromino = tetromino
+        self.offset = offset
+        self.color_index = color_index
+        self.hard_drop = hard_drop
+        self.hard_drop_rows = hard_drop_rows
+        self.cleared = cleared  # [(row index, row colors), ...]
+        self.lines_cleared = len(cleared)
+        self.level_up = level_up
+        self.time = time
+
+class LockPipeline:
+    """
+    Runs the lock stages in order: place, detect rows, clear, score, level, spawn and
+    emit effects. The first five stages are pure grid work; effects are not hardcoded
+    here but subscribed as emitters that receive the LockResult. Watchers see the grid
+    and the piece just before it is placed, e.g. to judge how the piece got there.
+    """
+    def __init__(self):
+        self.emitters = []
+        self.watchers = []
+
+    def subscribe(self, emitter):
+        self.emitters.append(emitter)
+        return emitter
+
+    def watch(self, watcher):
+        """Calls watcher(grid, tetromino, offset, grid_hash) before every lock; usable as a decorator."""
+        self.watchers.append(watcher)
+        return watcher
+
+    def lock(self, grid, tetromino, offset, color_index, grid_hash=None):
+        """Stages 1-3: place the piece, detect completed rows among those it touched, clear them."""
+        for watcher in self.watchers:
+            watcher(grid, tetromino, offset, grid_hash)
+        place_tetromino(tetromino, offset, grid, color_index, grid_hash)
+        full_rows = find_full_rows(grid, range(offset[1], offset[1] + len(tetromino)))
+        if not full_rows:
+            return grid, []
+        return clear_lines(grid, full_rows, grid_hash)
+
+    def emit(self, result):
+        for emitter in self.emitters:
+            emitter(result)
+
+# -------------------------- Game State --------------------------
+class Board:
+    """
+    One game's rule state: grid, piece queue, hold, score, level and gravity. Input arrives as
+    action names through apply() and time through step(); every lock is passed to the emitters
+    subscribed to 'lock_pipeline'. Boards share nothing, so any number can run side by side.
+    """
+    def __init__(self, fall_speed=FALL_SPEEDS['normal'], seed=None, now=0, das=150, arr=50,
+                 color_count=len(SHAPES), width=GRID_WIDTH, height=GRID_HEIGHT):
+        if not (MIN_GRID_SIZE <= width <= MAX_GRID_WIDTH and MIN_GRID_SIZE <= height <= MAX_GRID_HEIGHT):
+            raise ValueError(f"Board size {width}x{height} is outside {MIN_GRID_SIZE}x{MIN_GRID_SIZE}"
+                             f" to {MAX_GRID_WIDTH}x{MAX_GRID_HEIGHT}")
+        self.width = width
+        self.height = height
+        self.base_fall_speed = fall_speed
+        self.fall_speed = fall_speed
+        self.color_count = color_count  # Colors the pieces cycle through as the level rises.
+        self.bag = TetrominoBag(SHAPES, seed)
+        self.auto_shift = AutoShift(das, arr)
+        self.lock_pipeline = LockPipeline()
+        self.grid = create_grid(width, height)
+        self.grid_hash = GridHash(self.grid)
+        self.masks = RowMasks(self.grid)
+        self.level = 1
+        self.score = 0
+        self.lines = 0
+        self.pieces = 0
+        self.spawns = 0  # Bumped for every new falling piece, including ones taken from hold.
+        self.hold_piece = None
+        self.hold_used = False  # Prevent repeated holds until the current piece locks in
+        self.fast_fall = False
+        self.game_over = False
+        self.last_fall_time = now
+        self.spawn(self.bag.get_next_tetromino())
+        self.next_tetromino = self.bag.get_next_tetromino()
+
+    def spawn(self, tetromino):
+        self.tetromino = tetromino
+        self.shape_index = get_shape_index(tetromino) or 0
+        self.spawn_rotation = ROTATION_LOOKUP.get(tuple(map(tuple, tetromino)), 0)  # Pieces leave hold as they went in.
+        self.color_index = (self.shape_index + self.level - 1) % self.color_count + 1
+        self.offset = [self.width // 2 - len(tetromino[0]) // 2, 0]
+        self.spawns += 1
+
+    def shift(self, direction, count=1):
+        """Moves up to 'count' columns, stopping at the first blocked one."""
+        step = -1 if direction == 'left' else 1
+        for _ in range(count):
+            new_x = self.offset[0] + step
+            if not valid_position(self.tetromino, [new_x, self.offset[1]], self.grid):
+                break
+            self.offset[0] = new_x
+
+    def rotate(self):
+        self.tetromino, self.offset = rotate_tetromino_with_kick(self.tetromino, self.offset, self.grid)
+
+    def hold(self):
+        if self.hold_used:
+            return
+        self.hold_used = True
+        held = [list(row) for row in self.tetromino]
+        if self.hold_piece is None:
+            self.spawn(self.bag.get_next_tetromino())
+        else:
+            self.spawn([list(row) for row in self.hold_piece])
+        self.hold_piece = held
+
+    def lock(self, now, hard_drop=True):
+        """Single lock path shared by hard drops and gravity locks. Returns the LockResult, or None at game over."""
+        # Calculate how far the tetromino can fall (for a hard drop).
+        hard_drop_rows = 0
+        if hard_drop:
+            hard_drop_rows = self.masks.drop_distance(self.tetromino, self.offset)
+            self.offset[1] += hard_drop_rows
+            self.score += hard_drop_rows * 2
+
+        # Check if locking here results in game over (anything in the top row).
+        if self.masks.rows[0]:
+            self.game_over = True
+            return None
+
+        # Place the piece, detect completed rows and clear them.
+        locked = (self.tetromino, self.offset, self.color_index)
+        self.grid, cleared = self.lock_pipeline.lock(self.grid, *locked, self.grid_hash)
+        for cy, row in enumerate(self.tetromino):
+            for cx, cell in enumerate(row):
+                if cell and 0 <= self.offset[1] + cy < self.height:
+                    self.masks.fill(self.offset[0] + cx, self.offset[1] + cy)
+        self.masks.remove_rows([y for y, _ in cleared])
+        self.hold_used = False
+        self.lines += len(cleared)
+        self.score = update_score(self.score, len(cleared))
+        self.pieces += 1
+
+        # Level up if enough lines have been cleared.
+        new_level = self.lines // 10 + 1
+        level_up = new_level > self.level
+        if level_up:
+            self.level = new_level
+            self.fall_speed = max(FAST_FALL_SPEED, int(self.base_fall_speed * (0.85 ** (self.level - 1))))
+
+        self.spawn(self.next_tetromino)
+        self.next_tetromino = self.bag.get_next_tetromino()
+
+        result = LockResult(*locked, hard_drop, hard_drop_rows, cleared, level_up, now)
+        self.lock_pipeline.emit(result)
+        return result
+
+    def piece_hash(self):
+        """Zobrist key of the falling piece: shape, rotation and position."""
+        rotation = ROTATION_LOOKUP.get(tuple(map(tuple, self.tetromino)), 0)
+        return (PIECE_KEYS[self.shape_index][rotation] ^ PIECE_X_KEYS[self.offset[0] + KEY_PADDING]
+                ^ PIECE_Y_KEYS[self.offset[1] + KEY_PADDING])
+
+    def position_hash(self):
+        """64-bit hash of everything that decides the game from here: grid, falling piece, next, hold and bag."""
+        value = self.grid_hash.value ^ self.piece_hash() ^ NEXT_KEYS[get_shape_index(self.next_tetromino)]
+        if self.hold_piece is not None:
+            value ^= HOLD_KEYS[get_shape_index(self.hold_piece)]
+        if self.hold_used:
+            value ^= HOLD_USED_KEY
+        for tetromino in self.bag.bag:
+            value ^= BAG_KEYS[get_shape_index(tetromino)]
+        return value
+
+    def apply(self, name, pressed, time):
+        """Applies one game action (keyboard, gamepad, bot or replay); unknown names are ignored."""
+        if not pressed:
+            if name == 'left' or name == 'right':
+                # Apply the repeats that fell due before the release, then let go.
+                owed = self.auto_shift.release(name, time)
+                if owed:
+                    self.shift(name, owed)
+            elif name == 'down':
+                self.fast_fall = False
+        elif name == 'left' or name == 'right':
+            self.shift(name)
+            self.auto_shift.press(name, time)
+        elif name == 'down':
+            self.fast_fall = True
+        elif name == 'rotate':
+            self.rotate()
+        elif name == 'hold':
+            self.hold()
+        elif name == 'hard_drop':
+            self.lock(time)
+
+    def release_all(self):
+        """Forgets held directions and soft drop, e.g. when their releases were missed while paused."""
+        self.auto_shift.reset()
+        self.fast_fall = False
+
+    def step(self, now):
+        """Advances one simulation tick: due DAS/ARR shifts, then gravity."""
+        if self.game_over:
+            return
+        shifts = self.auto_shift.shifts_due(now)
+        if shifts:
+            self.shift(self.auto_shift.direction, shifts)
+        fall_speed = FAST_FALL_SPEED if self.fast_fall else self.fall_speed
+        if now - self.last_fall_time > fall_speed:
+            if valid_position(self.tetromino, [self.offset[0], self.offset[1] + 1], self.grid):
+                self.offset[1] += 1
+            else:
+                self.lock(now, hard_drop=False)
+            self.last_fall_time = now
+
+# -------------------------- Bot --------------------------
+# Weights for plan_placement(): aggregate height, completed lines, holes, bumpiness.
+BOT_WEIGHTS = (-0.51, 0.76, -0.36, -0.18)
+PLAN_TABLE_SIZE = 4096  # Plans kept per transposition table before it is cleared.
+
+def _column_profile(grid, column, cells=()):
+    """Returns (height, holes) of one column, counting 'cells' as filled."""
+    height = len(grid)
+    top = None
+    holes = 0
+    for y in range(height):
+        if grid[y][column] or (column, y) in cells:
+            if top is None:
+                top = y
+        elif top is not None:
+            holes += 1
+    return (height - top if top is not None else 0), holes
+
+def reachable_placements(grid, tetromino, offset):
+    """
+    Yields (rotations, shift, piece, x, y) for every hard-drop placement reachable by rotating
+    first and then sliding sideways at the current height.
+    """
+    height = len(grid)
+    piece, start = tetromino, offset
+    seen = set()
+    for rotations in range(4):
+        if rotations:
+            piece, start = rotate_tetromino_with_kick(piece, start, grid)
+        key = (tuple(map(tuple, piece)), start[0])
+        if key in seen:
+            continue
+        seen.add(key)
+        if not valid_position(piece, start, grid):
+            continue
+        leftmost = rightmost = start[0]
+        while valid_position(piece, [leftmost - 1, start[1]], grid):
+            leftmost -= 1
+        while valid_position(piece, [rightmost + 1, start[1]], grid):
+            rightmost += 1
+        # Lowest cell of each piece column; the drop stops where the first of them lands.
+        # (Every tetromino column is contiguous, so only the lowest cell can collide.)
+        bottoms = [max(cy for cy, row in enumerate(piece) if row[cx]) for cx in range(len(piece[0]))]
+        for x in range(leftmost, rightmost + 1):
+            y = height
+            for cx, bottom in enumerate(bottoms):
+                column = x + cx
+                row = max(0, start[1] + bottom + 1)
+                while row < height and not grid[row][column]:
+                    row += 1
+                y = min(y, row - bottom - 1)
+            yield rotations, x - start[0], piece, x, y
+
+def plan_placement(grid, tetromino, offset, weights=BOT_WEIGHTS):
+    """
+    Picks the best placement from reachable_placements().
+    Returns (rotations, columns to shift), or None if no placement is reachable.
+    Only the columns a placement covers are rescanned, so a plan costs a few thousand cell checks.
+    """
+    width = len(grid[0])
+    base = [_column_profile(grid, x) for x in range(width)]
+    height_weight, lines_weight, holes_weight, bumpiness_weight = weights
+    best = None
+    best_score = None
+    for rotations, shift, piece, x, y in reachable_placements(grid, tetromino, offset):
+        cells = {(x + cx, y + cy) for cy, row in enumerate(piece) for cx, cell in enumerate(row) if cell}
+        lines = sum(1 for row_y in {cy for _, cy in cells}
+                    if row_y >= 0 and all(grid[row_y][cx] or (cx, row_y) in cells for cx in range(width)))
+        profile = list(base)
+        for cx in {cx for cx, _ in cells}:
+            profile[cx] = _column_profile(grid, cx, cells)
+        heights = [height for height, _ in profile]
+        score = (height_weight * sum(heights) + lines_weight * lines
+                 + holes_weight * sum(holes for _, holes in profile)
+                 + bumpiness_weight * sum(abs(a - b) for a, b in zip(heights, heights[1:])))
+        if best_score is None or score > best_score:
+            best_score = score
+            best = (rotations, shift)
+    return best
+
+class Bot:
+    """
+    Plays a Board through the same actions as a person: plans every new piece with
+    'planner' (plan_placement() by default) and taps one input every 'interval' ms from update().
+    """
+    def __init__(self, board, interval=100, weights=BOT_WEIGHTS, planner=None, plans=None):
+        self.board = board
+        self.interval = interval
+        self.weights = weights
+        self.planner = planner or plan_placement
+        # Transposition table: grid hash ^ piece hash -> plan. Pass one dict to share it between bots.
+        self.plans = {} if plans is None else plans
+        self.inputs = []
+        self.spawn = None
+        self.next_input = 0
+
+    def update(self, now):
+        board = self.board
+        if board.game_over:
+            return
+        if board.spawns != self.spawn:
+            self.spawn = board.spawns
+            key = board.grid_hash.value ^ board.piece_hash()
+            plan = self.plans.get(key, False)
+            if plan is False:
+                if len(self.plans) >= PLAN_TABLE_SIZE:
+                    self.plans.clear()
+                plan = self.plans[key] = self.planner(board.grid, board.tetromino, board.offset, self.weights)
+            rotations, shift = plan if plan else (0, 0)
+            self.inputs = ['rotate'] * rotations + [('left' if shift < 0 else 'right')] * abs(shift) + ['hard_drop']
+            self.inputs.reverse()  # Popped from the end.
+            self.next_input = max(self.next_input, now + self.interval)
+        while self.inputs and now >= self.next_input:
+            name = self.inputs.pop()
+            board.apply(name, True, now)
+            if name == 'left' or name == 'right':
+                board.apply(name, False, now)  # A tap: released before DAS starts.
+            self.next_input += self.interval
+            if board.spawns != self.spawn:
+                break  # Planned for a piece that has locked.
+
+# -------------------------- Finesse --------------------------
+# Inputs are counted as key presses: a tap moves one column, holding a direction (DAS) slides
+# the piece to the wall and holding soft drop lets it fall to the floor, one input each. The
+# hard drop that ends a piece is not counted.
+FINESSE_CACHE_SIZE = 4096  # Searches kept per FinesseAnalyzer before its cache is cleared.
+FINESSE_TABLES = {}  # Board width -> finesse_table(width), built on first use.
+
+def _row_bits(grid):
+    return [sum(1 << x for x, cell in enumerate(row) if cell) for row in grid]
+
+def input_paths(grid, tetromino, offset, soft_drop=True):
+    """
+    Breadth-first search of the placement graph: yields (piece, offset, inputs) for every
+    position the piece can reach from 'offset', fewest inputs first, each with one shortest
+    input sequence. Positions are told apart by piece matrix and offset. Collisions are
+    tested against row bitmasks (as in RowMasks), with the same rules as valid_position()
+    and the same kicks as rotate_tetromino_with_kick().
+    """
+    rows = _row_bits(grid)
+    width, height = len(grid[0]), len(grid)
+    pieces = {}  # Matrix -> (piece, row bits, piece width, clockwise rotation matrix)
+
+    def piece_info(matrix):
+        info = pieces.get(matrix)
+        if info is None:
+            piece = [list(row) for row in matrix]
+            info = pieces[matrix] = (piece, _row_bits(piece), len(piece[0]), tuple(map(tuple, rotate_matrix(piece))))
+        return info
+
+    def fits(bits, piece_width, x, y):
+        if x < 0 or x + piece_width > width or y + len(bits) > height:
+            return False
+        for cy, row_bits in enumerate(bits):
+            if y + cy >= 0 and rows[y + cy] & (row_bits << x):
+                return False
+        return True
+
+    top = next((y for y, row_bits in enumerate(rows) if row_bits), height)
+    ends = {}
+    def slide(matrix, bits, piece_width, x, y, dx, dy):
+        """Where holding an input stops; every position passed on the way shares that end."""
+        path = []
+        if dy and y + len(bits) < top:
+            path.append((x, y))
+            y = top - len(bits)  # Nothing to hit above the stack.
+        end = None
+        while end is None:
+            path.append((x, y))
+            if fits(bits, piece_width, x + dx, y + dy):
+                x += dx
+                y += dy
+                end = ends.get((matrix, x, y, dx, dy))
+            else:
+                end = (x, y)
+        for position in path:
+            ends[(matrix, *position, dx, dy)] = end
+        return end
+
+    start = tuple(map(tuple, tetromino))
+    piece, bits, piece_width, _ = piece_info(start)
+    if not fits(bits, piece_width, offset[0], offset[1]):
+        return
+    seen = {(start, offset[0], offset[1])}
+    queue = deque([(start, offset[0], offset[1], ())])
+    while queue:
+        matrix, x, y, inputs = queue.popleft()
+        piece, bits, piece_width, rotated = piece_info(matrix)
+        yield piece, [x, y], inputs
+        moves = []
+        _, rotated_bits, rotated_width, _ = piece_info(rotated)
+        for dx, dy in KICKS:
+            if fits(rotated_bits, rotated_width, x + dx, y + dy):
+                moves.append(('rotate', rotated, x + dx, y + dy))
+                break
+        for name, step in (('left', -1), ('right', 1)):
+            end = slide(matrix, bits, piece_width, x, y, step, 0)[0]
+            if end != x:
+                moves.append((name, matrix, x + step, y))
+                if end != x + step:
+                    moves.append(('das_' + name, matrix, end, y))
+        if soft_drop:
+            end = slide(matrix, bits, piece_width, x, y, 0, 1)[1]
+            if end != y:
+                moves.append(('soft_drop', matrix, x, end))
+        for name, moved, moved_x, moved_y in moves:
+            key = (moved, moved_x, moved_y)
+            if key not in seen:
+                seen.add(key)
+                queue.append((moved, moved_x, moved_y, inputs + (name,)))
+
+def spawn_piece(shape, rotation=0):
+    piece = SHAPES[shape]
+    for _ in range(rotation):
+        piece = rotate_matrix(piece)
+    return piece
+
+def finesse_table(width):
+    """
+    Shortest inputs on an empty board 'width' columns wide, keyed by (shape, spawn rotation,
+    rotation, column), moving at spawn height only. A piece spawns at column
+    width // 2 - len(piece[0]) // 2, normally in rotation 0 but as it was held when it comes
+    out of hold. Rotations are counted as in ROTATION_LOOKUP, so I, S and Z have two and O
+    has one. Built once per width.
+    """
+    table = FINESSE_TABLES.get(width)
+    if table is None:
+        grid = create_grid(width, 4)  # As tall as the tallest piece; nothing moves below.
+        table = {}
+        for shape in range(len(SHAPES)):
+            for spawn_rotation in sorted({ROTATION_LOOKUP[tuple(map(tuple, spawn_piece(shape, turns)))]
+                                          for turns in range(4)}):
+                tetromino = spawn_piece(shape, spawn_rotation)
+                spawn = [width // 2 - len(tetromino[0]) // 2, 0]
+                for piece, offset, inputs in input_paths(grid, tetromino, spawn, soft_drop=False):
+                    table.setdefault((shape, spawn_rotation, ROTATION_LOOKUP[tuple(map(tuple, piece))], offset[0]),
+                                     inputs)
+        FINESSE_TABLES[width] = table
+    return table
+
+def dropped_from_spawn_height(grid, tetromino, offset):
+    """True if the spawn rows are clear and the piece could fall straight down to 'offset'."""
+    if is_danger_zone_active(grid):
+        return False
+    x, y = offset
+    for cx in range(len(tetromino[0])):
+        bottom = max(cy for cy, row in enumerate(tetromino) if row[cx])
+        for row in range(4, y + bottom + 1):
+            if grid[row][x + cx]:
+                return False
+    return True
+
+class FinesseAnalyzer:
+    """
+    Finds the fewest inputs that take a piece from spawn to where it locked. Placements a
+    straight drop reaches are looked up in finesse_table(); tucks, spins and placements under
+    a crowded top are searched with input_paths() on the real grid, memoized by grid and
+    placement. Pass one cache dict to share the searches between analyzers.
+    """
+    def __init__(self, cache=None):
+        self.cache = {} if cache is None else cache
+
+    def optimal_inputs(self, grid, tetromino, offset, grid_hash=None, spawn_rotation=0):
+        """
+        Returns a shortest input tuple for locking 'tetromino' at 'offset' on 'grid' (the grid
+        before the lock), or None if the placement cannot be reached from spawn.
+        'spawn_rotation' is Board.spawn_rotation of the piece.
+        """
+        matrix = tuple(map(tuple, tetromino))
+        shape = SHAPE_LOOKUP.get(matrix)
+        if shape is None:
+            return None
+        width = len(grid[0])
+        if dropped_from_spawn_height(grid, tetromino, offset):
+            inputs = finesse_table(width).get((shape, spawn_rotation, ROTATION_LOOKUP[matrix], offset[0]))
+            if inputs is not None:
+                return inputs
+        key = (grid_hash.value if grid_hash is not None else tuple(map(tuple, grid)),
+               width, len(grid), spawn_rotation, matrix, offset[0], offset[1])
+        inputs = self.cache.get(key, False)
+        if inputs is False:
+            if len(self.cache) >= FINESSE_CACHE_SIZE:
+                self.cache.clear()
+            inputs = self.cache[key] = self._search(grid, spawn_piece(shape, spawn_rotation), tetromino, offset)
+        return inputs
+
+    def _search(self, grid, start, tetromino, offset):
+        x, y = offset
+        spawn = [len(grid[0]) // 2 - len(start[0]) // 2, 0]
+        for piece, position, inputs in input_paths(grid, start, spawn):
+            # Any position a drop takes to the target will do; the target itself rests on the stack.
+            if (position[0] == x and position[1] <= y and piece == tetromino
+                    and all(valid_position(piece, [x, row], grid) for row in range(position[1] + 1, y + 1))):
+                return inputs
+        return None
@@ -0,0 +1,139 @@
+"""
+Board features computed for a whole batch of boards at once with NumPy: column heights,
+holes, bumpiness, row transitions, well depths and completed rows. Boards can be grid
+lists, bitboards (with the board size given) or an existing array, of any size in
+BOARD_SIZES; every feature is a few array operations over the
+stacked (boards, rows, columns) array, with no Python loop per cell or per board.
+
+NumPy is only needed by this module (and the tools built on it, such as export_positions.py);
+the engine itself does not import it, and the game runs without it. requirements.txt
+installs it on Python 3.8 and later.
+"""
+import numpy as np
+
+from .engine import BOT_WEIGHTS, reachable_placements
+
+# Scalar features, in the column order of feature_matrix().
+FEATURE_NAMES = ("aggregate_height", "max_height", "holes", "bumpiness", "row_transitions",
+                 "well_depth", "completed_rows")
+
+# -------------------------- Board Conversion --------------------------
+def bitboards_to_array(bitboards, width, height):
+    """
+    Unpacks integer bitboards into a (N, height, width) bool array.
+    Bit y * width + x is the cell in row y (0 at the top) and column x. A bitboard is
+    only a number, so the board size must be given; raises ValueError if a bitboard is
+    negative or has bits set beyond width * height.
+    """
+    cell_count = width * height
+    bitboards = [int(bits) for bits in bitboards]
+    for bits in bitboards:
+        if bits < 0 or bits >> cell_count:
+            raise ValueError(f"Bitboard {bits:#x} does not fit a {width}x{height} board")
+    size = (cell_count + 7) // 8
+    packed = np.frombuffer(b"".join(bits.to_bytes(size, "little") for bits in bitboards), dtype=np.uint8)
+    cells = np.unpackbits(packed.reshape(-1, size), axis=1, bitorder="little")[:, :cell_count]
+    return cells.reshape(-1, height, width).astype(bool)
+
+def array_to_bitboards(boards):
+    """Packs a (N, height, width) array back into integer bitboards (see bitboards_to_array)."""
+    boards = np.asarray(boards, dtype=bool)
+    packed = np.packbits(boards.reshape(len(boards), -1), axis=1, bitorder="little")
+    return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+def as_board_array(boards, width=None, height=None):
+    """
+    Returns boards as a (N, height, width) bool array (True = filled). Accepts an array of
+    that shape (or one 2-D board), a sequence of grid lists, a single grid list, or a
+    sequence of integer bitboards. Arrays and grids carry their own size; bitboards need
+    'width' and 'height' (see bitboards_to_array).
+    """
+    if isinstance(boards, np.ndarray):
+        return (boards if boards.ndim == 3 else boards[None]) != 0
+    if isinstance(boards, int):
+        boards = [boards]
+    boards = list(boards)
+    if boards and isinstance(boards[0], int):
+        if width is None or height is None:
+            raise ValueError("Bitboards need the board width and height")
+        return bitboards_to_array(boards, width, height)
+    array = np.asarray(boards) != 0
+    return array if array.ndim == 3 else array[None]
+
+# -------------------------- Features --------------------------
+def board_features(boards, width=None, height=None):
+    """
+    Computes features for a batch of boards of one size; 'width' and 'height' are only
+    needed for bitboards (see as_board_array). Returns a dict of arrays:
+      heights         (N, W)  filled height of each column
+      column_holes    (N, W)  empty cells under each column's top filled cell
+      well_depths     (N, W)  how far each column sits below both neighbours (walls count as full)
+      aggregate_height, max_height, holes, bumpiness, row_transitions, well_depth,
+      completed_rows  (N,)
+    Row transitions count filled/empty changes along every row, with the walls counted as filled.
+    """
+    cells = as_board_array(boards, width, height)
+    count, height, width = cells.shape
+    occupied = cells.any(axis=1)
+    tops = np.where(occupied, cells.argmax(axis=1), height)
+    heights = height - tops
+    below_top = np.arange(height)[None, :, None] > tops[:, None, :]
+    column_holes = (below_top & ~cells).sum(axis=1)
+    walls = np.full((count, height, 1), True)
+    padded = np.concatenate((walls, cells, walls), axis=2)
+    row_transitions = (padded[:, :, 1:] != padded[:, :, :-1]).sum(axis=(1, 2))
+    wall_heights = np.full((count, 1), height)
+    left = np.concatenate((wall_heights, heights[:, :-1]), axis=1)
+    right = np.concatenate((heights[:, 1:], wall_heights), axis=1)
+    well_depths = np.clip(np.minimum(left, right) - heights, 0, None)
+    return {
+        "heights": heights,
+        "column_holes": column_holes,
+        "well_depths": well_depths,
+        "aggregate_height": heights.sum(axis=1),
+        "max_height": heights.max(axis=1),
+        "holes": column_holes.sum(axis=1),
+        "bumpiness": np.abs(np.diff(heights, axis=1)).sum(axis=1),
+        "row_transitions": row_transitions,
+        "well_depth": well_depths.sum(axis=1),
+        "completed_rows": cells.all(axis=2).sum(axis=1),
+    }
+
+def feature_matrix(features):
+    """Stacks the scalar features into an (N, len(FEATURE_NAMES)) float32 matrix for model input."""
+    return np.stack([features[name] for name in FEATURE_NAMES], axis=1).astype(np.float32)
+
+# -------------------------- Placement Planning --------------------------
+def placement_boards(grid, tetromino, offset):
+    """
+    Returns ([(rotations, shift, piece, x, y), ...], boards) for every reachable placement,
+    where boards[i] is the grid with placement i locked in but its rows not yet cleared.
+    """
+    placements = list(reachable_placements(grid, tetromino, offset))
+    base = as_board_array(grid)
+    boards = np.repeat(base, len(placements), axis=0)
+    index, rows, columns = [], [], []
+    for i, (rotations, shift, piece, x, y) in enumerate(placements):
+        for cy, row in enumerate(piece):
+            for cx, cell in enumerate(row):
+                if cell and y + cy >= 0:
+                    index.append(i)
+                    rows.append(y + cy)
+                    columns.append(x + cx)
+    boards[index, rows, columns] = True
+    return placements, boards
+
+def plan_placement(grid, tetromino, offset, weights=BOT_WEIGHTS):
+    """
+    Drop-in replacement for engine.plan_placement() that scores every candidate board in
+    one batch. Returns (rotations, columns to shift), or None if no placement is reachable.
+    """
+    placements, boards = placement_boards(grid, tetromino, offset)
+    if not placements:
+        return None
+    features = board_features(boards)
+    height_weight, lines_weight, holes_weight, bumpiness_weight = weights
+    scores = (height_weight * features["aggregate_height"] + lines_weight * features["completed_rows"]
+              + holes_weight * features["holes"] + bumpiness_weight * features["bumpiness"])
+    rotations, shift = placements[int(scores.argmax())][:2]
+    return rotations, shift
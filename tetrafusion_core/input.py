@@ -0,0 +1,205 @@
+"""
+Input for TetraFusion: opening joysticks, mapping keys, buttons and the D-pad to abstract
+actions through the bindings in the settings, and the frame limiter that timestamps events
+while it waits. The game keeps one InputMapper and one InputClock; the spectator wall adds a
+mapper per local player. Needs pygame; nothing here opens a device at import.
+"""
+import pygame
+
+# -------------------------- Joystick Initialization --------------------------
+joysticks = []  # Every connected joystick, opened in device order.
+
+def open_joysticks():
+    """Opens every connected joystick, including any plugged in since the last call."""
+    joysticks[:] = [pygame.joystick.Joystick(i) for i in range(pygame.joystick.get_count())]
+    for joystick in joysticks:
+        joystick.init()
+    return joysticks
+
+# -------------------------- Input Dispatch --------------------------
+# Gameplay actions in the order the old if/elif chains checked them; when two actions
+# share a key or button, the earlier one wins.
+GAME_ACTIONS = ("left", "right", "down", "rotate", "hold", "pause", "hard_drop", "skip_track")
+MENU_ACTIONS = ("up", "down", "select", "back")
+# Actions that stay active while held and therefore also report releases.
+HELD_ACTIONS = {"left", "right", "down"}
+
+class InputAction:
+    """An abstract input: action name, pressed/released, timestamp (ms) and source device."""
+    __slots__ = ("name", "pressed", "time", "device")
+
+    def __init__(self, name, pressed, time, device):
+        self.name = name
+        self.pressed = pressed
+        self.time = time
+        self.device = device
+
+class InputMapper:
+    """
+    Compiles settings.controls, 'controller_controls' and 'controller_menu_navigation'
+    into dict dispatch tables keyed by (device, code), and turns pygame events into
+    InputActions. Call rebuild() whenever a keybind menu changes a binding.
+    Bots and replays feed the same action stream through inject().
+
+    By default every keyboard and joystick event is translated. 'keyboard=False' ignores the
+    keyboard, and 'joysticks' limits joystick events to those instance ids, so each local
+    player on the spectator wall can have a mapper of their own.
+    """
+    def __init__(self, keyboard=True, joysticks=None):
+        self.keyboard = keyboard
+        self.joysticks = joysticks
+        self.game_table = {}
+        self.menu_table = {}
+        self.hat_x = 0
+        self.hat_y = 0
+        self.injected = []
+
+    def rebuild(self, settings):
+        game_table = {}
+        controls = settings.controls
+        controller_controls = settings.controller_controls
+        for name in GAME_ACTIONS:
+            if controls.get(name) is not None:
+                game_table.setdefault(("key", controls[name]), name)
+            if controller_controls.get(name) is not None:
+                game_table.setdefault(("button", controller_controls[name]), name)
+        menu_table = {}
+        nav = settings.controller_menu_navigation
+        for name in MENU_ACTIONS:
+            if nav.get(name) is not None:
+                menu_table.setdefault(("button", nav[name]), name)
+        self.game_table = game_table
+        self.menu_table = menu_table
+
+    def menu_action(self, event):
+        """Returns 'up', 'down', 'select', 'back' or None for a JOYBUTTONDOWN event."""
+        return self.menu_table.get(("button", event.button))
+
+    def inject(self, name, pressed=True, time=None):
+        """Queues an action from a non-device source (bot, replay)."""
+        if time is None:
+            time = pygame.time.get_ticks()
+        self.injected.append(InputAction(name, pressed, time, "inject"))
+
+    def translate(self, events, now):
+        """Maps this frame's events to gameplay InputActions, in event order."""
+        actions = []
+        if self.injected:
+            actions.extend(self.injected)
+            self.injected = []
+        game_table = self.game_table
+        keyboard, joysticks = self.keyboard, self.joysticks
+        for event in events:
+            etype = event.type
+            if etype in JOYSTICK_EVENTS and joysticks is not None and getattr(event, "instance_id", 0) not in joysticks:
+                continue
+            if etype == pygame.KEYDOWN or etype == pygame.KEYUP:
+                if not keyboard:
+                    continue
+                name = game_table.get(("key", event.key))
+                if name is not None and (etype == pygame.KEYDOWN or name in HELD_ACTIONS):
+                    actions.append(InputAction(name, etype == pygame.KEYDOWN,
+                                               getattr(event, "timestamp", now), "keyboard"))
+            elif etype == pygame.JOYBUTTONDOWN or etype == pygame.JOYBUTTONUP:
+                name = game_table.get(("button", event.button))
+                if name is not None and (etype == pygame.JOYBUTTONDOWN or name in HELD_ACTIONS):
+                    actions.append(InputAction(name, etype == pygame.JOYBUTTONDOWN,
+                                               getattr(event, "timestamp", now), "gamepad"))
+            elif etype == pygame.JOYHATMOTION:
+                # The D-pad reports positions, so emit the press/release transitions.
+                hx, hy = event.value
+                time = getattr(event, "timestamp", now)
+                if hx != self.hat_x:
+                    if self.hat_x:
+                        actions.append(InputAction("left" if self.hat_x < 0 else "right", False, time, "hat"))
+                    if hx:
+                        actions.append(InputAction("left" if hx < 0 else "right", True, time, "hat"))
+                    self.hat_x = hx
+                if (hy < 0) != (self.hat_y < 0):
+                    actions.append(InputAction("down", hy < 0, time, "hat"))
+                self.hat_y = hy
+        return actions
+
+JOYSTICK_EVENTS = {pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP, pygame.JOYHATMOTION}
+
+def player_input_mappers(settings):
+    """
+    One InputMapper per local player: the keyboard first, then each open joystick in
+    device order.
+    """
+    mappers = [InputMapper(joysticks=())]
+    mappers += [InputMapper(keyboard=False, joysticks={joystick.get_instance_id()}) for joystick in joysticks]
+    for mapper in mappers:
+        mapper.rebuild(settings)
+    return mappers
+
+# -------------------------- Input Timing --------------------------
+DAS_CHOICES = [50, 75, 100, 125, 150, 175, 200, 250, 300]  # ms before auto-repeat starts
+ARR_CHOICES = [0, 10, 16, 25, 33, 50, 75, 100]              # ms between repeats (0 = instant)
+
+class InputClock:
+    """
+    Frame limiter that keeps draining the event queue while it waits for the next frame,
+    stamping every event with the millisecond it was seen. Input timing is therefore not
+    quantized to the frame rate. Events that already carry a timestamp keep it. Also tracks
+    input-to-display latency.
+
+    With an uncapped frame rate there is no wait to poll in, so events are stamped when
+    the game loop calls poll() (before drawing) and when tick() returns: a fraction of a
+    frame rather than the exact millisecond.
+    """
+    LATENCY_SAMPLES = 120
+
+    def __init__(self):
+        self.pending = []
+        self.frame_start = pygame.time.get_ticks()
+        self.input_time = None  # Earliest input handled since the last present.
+        self.latency_samples = []
+
+    def poll(self):
+        now = pygame.time.get_ticks()
+        for event in pygame.event.get():
+            if not hasattr(event, "timestamp"):
+                event.timestamp = now
+            self.pending.append(event)
+
+    def get(self):
+        """Returns every event seen since the last call, oldest first."""
+        self.poll()
+        events, self.pending = self.pending, []
+        return events
+
+    def tick(self, fps):
+        """Waits for the next frame while polling input; returns the frame time in ms."""
+        frame_time = 1000.0 / fps if fps else 0
+        target = self.frame_start + frame_time
+        now = pygame.time.get_ticks()
+        while now < target:
+            self.poll()
+            pygame.time.wait(1)
+            now = pygame.time.get_ticks()
+        if not fps:
+            self.poll()  # Uncapped: stamp what arrived while the frame was drawn.
+        elapsed = now - self.frame_start
+        # Keep a steady cadence, but do not try to catch up after a long stall.
+        self.frame_start = target if now - target < frame_time else now
+        return elapsed
+
+    def mark_input(self, time):
+        if self.input_time is None or time < self.input_time:
+            self.input_time = time
+
+    def mark_present(self):
+        """Call right after pygame.display.flip() to record input-to-display latency."""
+        if self.input_time is None:
+            return
+        self.latency_samples.append(pygame.time.get_ticks() - self.input_time)
+        if len(self.latency_samples) > self.LATENCY_SAMPLES:
+            del self.latency_samples[0]
+        self.input_time = None
+
+    def latency(self):
+        """Returns (average, worst) input-to-display latency in ms over recent inputs."""
+        if not self.latency_samples:
+            return 0, 0
+        return sum(self.latency_samples) / len(self.latency_samples), max(self.latency_samples)
@@ -0,0 +1,334 @@
+"""
+Render commands and the backends that execute them. A frame is described as a list of
+immutable tuples (painter, *args). Painters only read their arguments, so a command list
+can be executed on another thread while the game loop keeps mutating its own state. Text,
+sprites and panels are built on the game thread, which owns the fonts, the sprite caches,
+the mixer and the button rects; the commands carry finished surfaces, and painters only
+blit and fill.
+
+A command list runs inline (execute_render_commands), on a RenderWorker thread, or through
+a GpuRenderer. Needs pygame, but importing this module opens no window.
+"""
+import threading
+import time
+
+import pygame
+try:
+    from pygame._sdl2 import video as sdl2_video  # Only used by the GPU render backend.
+except ImportError:
+    sdl2_video = None
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+
+# -------------------------- Painters --------------------------
+def paint_fill(surface, color):
+    surface.fill(color)
+
+def paint_surface(surface, source, position, area=None):
+    surface.blit(source, position, area)
+
+def paint_stack_layer(surface, source, position, area, owner):
+    """
+    Like paint_surface(), for a layer that is redrawn now and then: a BoardView's stack or the
+    info panel. 'source' is a new surface every time it changes; 'owner' (e.g. the view) lets
+    the GPU backend update one texture per layer in place.
+    """
+    surface.blit(source, position, area)
+
+def get_overlay(color, alpha, size):
+    """Returns a cached surface of 'size' in one color at the given alpha."""
+    key = (color, alpha, size)
+    overlay = overlays.get(key)
+    if overlay is None:
+        overlay = overlays[key] = pygame.Surface(size)
+        overlay.set_alpha(alpha)
+        overlay.fill(color)
+    return overlay
+
+overlays = {}
+
+def paint_overlay(surface, overlay, color, alpha):
+    """'overlay' is get_overlay(color, alpha, size), fetched on the game thread; the GPU backend fills instead."""
+    surface.blit(overlay, (0, 0))
+
+def paint_dust(screen, x, y, size, color, alpha):
+    surface = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
+    pygame.draw.circle(surface, (*color, alpha), (int(size), int(size)), int(size))
+    screen.blit(surface, (int(x - size), int(y - size)))
+
+def paint_trail(screen, x, y, radius, blended_color):
+    particle_surface = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
+    pygame.draw.circle(particle_surface, blended_color, (radius, radius), radius)
+    screen.blit(particle_surface, (int(x - radius), int(y - radius)))
+
+def paint_sparks(surface, sparks):
+    for color, center, size in sparks:
+        pygame.draw.circle(surface, color, center, size)
+
+def paint_ghost_piece(surface, ghost_cells, shadow_cells, color, block_size):
+    ghost_fill_alpha = int(255 * 0.2)   # 20% opacity fill
+    ghost_outline_alpha = int(255 * 0.4)  # 40% opacity outline
+    border_thickness = 2
+    for position in ghost_cells:
+        ghost_block = pygame.Surface((block_size, block_size), pygame.SRCALPHA)
+        ghost_block.fill((color[0], color[1], color[2], ghost_fill_alpha))
+        pygame.draw.rect(ghost_block, (color[0], color[1], color[2], ghost_outline_alpha),
+                         (0, 0, block_size, block_size), border_thickness)
+        surface.blit(ghost_block, position)
+
+    # -------------------------- Shadow Reflection --------------------------
+    # Overlay a very transparent dark shadow on supported cells.
+    shadow_alpha = 10  # Lower value = more transparent.
+    shadow_color = (30, 30, 30)  # Dark shadow color.
+    for position in shadow_cells:
+        shadow_block = pygame.Surface((block_size, block_size), pygame.SRCALPHA)
+        shadow_block.fill((shadow_color[0], shadow_color[1], shadow_color[2], shadow_alpha))
+        surface.blit(shadow_block, position)
+
+def paint_ghost_outline(surface, ghost_cells, color, block_size):
+    """Cheap ghost piece for low quality tiers: outlines drawn straight onto the target, no alpha."""
+    outline_color = (color[0] // 3, color[1] // 3, color[2] // 3)
+    for position in ghost_cells:
+        pygame.draw.rect(surface, outline_color, (position[0], position[1], block_size, block_size), 2)
+
+# -------------------------- Execution --------------------------
+def execute_render_commands(surface, commands):
+    for command in commands:
+        command[0](surface, *command[1:])
+
+class RenderWorker:
+    """
+    Optional render thread with a double-buffered back buffer.
+    The game loop submits command lists; the worker always executes the newest one
+    (older unrendered frames are dropped) and the main thread presents the most
+    recently completed buffer. Input handling therefore never waits on drawing.
+    'present' is called on the main thread after a new frame was blitted to the display.
+    """
+    def __init__(self, size, present):
+        self.present_display = present
+        self.buffers = [pygame.Surface(size).convert(), pygame.Surface(size).convert()]
+        self.completed = None
+        self.completed_id = 0
+        self.presented_id = 0
+        self.pending = None
+        self.busy = False
+        self.running = True
+        self.render_ms = 0.0  # Time the last frame took to draw, read by the quality governor.
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="TetraFusion render", daemon=True)
+        self.thread.start()
+
+    def submit(self, commands):
+        with self.condition:
+            self.pending = commands
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                commands, self.pending = self.pending, None
+                # Draw into whichever buffer is not the completed one the main thread presents.
+                target = self.buffers[1] if self.completed is self.buffers[0] else self.buffers[0]
+                self.busy = True
+            start = time.perf_counter()
+            try:
+                execute_render_commands(target, commands)
+            except Exception as e:
+                print(f"Render worker error: {e}")
+            self.render_ms = (time.perf_counter() - start) * 1000
+            with self.condition:
+                self.completed = target
+                self.completed_id += 1
+                self.busy = False
+                self.condition.notify_all()
+
+    def present(self, surface):
+        """Blits the newest completed frame and flips. Returns False if no new frame was ready."""
+        with self.condition:
+            if self.completed_id == self.presented_id:
+                return False
+            surface.blit(self.completed, (0, 0))
+            self.presented_id = self.completed_id
+        self.present_display()
+        return True
+
+    def flush(self):
+        """Waits until every submitted frame has been drawn (e.g. before another screen draws text)."""
+        with self.condition:
+            while self.running and (self.pending is not None or self.busy):
+                self.condition.wait()
+
+    def stop(self):
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+# -------------------------- GPU Render Backend --------------------------
+SDL_BLENDMODE_NONE = 0
+SDL_BLENDMODE_BLEND = 1
+
+class GpuRenderer:
+    """
+    Optional backend that draws render command lists through an SDL Renderer.
+    Commands with a texture painter become texture copies: block sprites, particle discs and
+    level text are uploaded once and afterwards only positioned and tinted. Any other command
+    (e.g. a painter the game defines itself) is drawn in software onto a transparent layer,
+    which is uploaded just before the next texture copy needs to cover it. Menus keep drawing
+    into the software backbuffer, which present_surface() uploads as one texture.
+    """
+    DISC_RADIUS = 32  # Particles share one white disc, scaled and tinted per copy.
+    TEXTURE_CACHE_SIZE = 256
+
+    def __init__(self, caption, window_size, logical_size, vsync=False):
+        self.window = sdl2_video.Window(caption, size=window_size, resizable=True)
+        try:
+            self.renderer = sdl2_video.Renderer(self.window, vsync=vsync)
+        except sdl2_video.error:
+            self.window.destroy()
+            raise
+        # SDL letterboxes the logical size into the window and maps mouse events back to it.
+        self.logical_size = logical_size
+        self.renderer.logical_size = logical_size
+        self.frame = sdl2_video.Texture(self.renderer, logical_size, streaming=True)
+        self.layer_surface = pygame.Surface(logical_size, pygame.SRCALPHA)
+        self.layer = sdl2_video.Texture(self.renderer, logical_size, streaming=True)
+        self.layer.blend_mode = SDL_BLENDMODE_BLEND
+        self.layer_dirty = False
+        disc = pygame.Surface((self.DISC_RADIUS * 2, self.DISC_RADIUS * 2), pygame.SRCALPHA)
+        pygame.draw.circle(disc, WHITE, (self.DISC_RADIUS, self.DISC_RADIUS), self.DISC_RADIUS)
+        self.disc = self._upload(disc)
+        self.textures = {}
+        self.stack_layers = {}  # BoardView -> (stack layer surface, texture holding it)
+        self.painters = {
+            paint_fill: self._fill,
+            paint_surface: self._surface,
+            paint_stack_layer: self._stack_layer,
+            paint_overlay: self._overlay,
+            paint_ghost_piece: self._ghost,
+            paint_ghost_outline: self._ghost_outline,
+            paint_dust: self._dust,
+            paint_trail: self._trail,
+            paint_sparks: self._sparks,
+        }
+
+    def _upload(self, surface):
+        texture = sdl2_video.Texture.from_surface(self.renderer, surface)
+        texture.blend_mode = SDL_BLENDMODE_BLEND
+        return texture
+
+    def _texture(self, key, make_surface):
+        texture = self.textures.get(key)
+        if texture is None:
+            if len(self.textures) >= self.TEXTURE_CACHE_SIZE:
+                self.textures.clear()  # Level text and replaced overlays would otherwise pile up.
+            texture = self.textures[key] = self._upload(make_surface())
+        return texture
+
+    def render(self, commands):
+        """Draws one frame of render commands into the renderer's back buffer."""
+        self.renderer.draw_color = pygame.Color(BLACK)
+        self.renderer.clear()
+        for command in commands:
+            painter = self.painters.get(command[0])
+            if painter is None:
+                command[0](self.layer_surface, *command[1:])
+                self.layer_dirty = True
+                continue
+            if self.layer_dirty:
+                self._flush_layer()
+            painter(*command[1:])
+        if self.layer_dirty:
+            self._flush_layer()
+
+    def present(self):
+        self.renderer.present()
+
+    def present_surface(self, surface):
+        """Uploads a software-drawn frame (menus, game over) and presents it."""
+        self.frame.update(surface)
+        self.renderer.draw_color = pygame.Color(BLACK)
+        self.renderer.clear()
+        self.frame.draw()
+        self.renderer.present()
+
+    def _flush_layer(self):
+        self.layer.update(self.layer_surface)
+        self.layer.draw()
+        self.layer_surface.fill((0, 0, 0, 0))
+        self.layer_dirty = False
+
+    def _fill_rects(self, color, rects, blend=True):
+        self.renderer.draw_blend_mode = SDL_BLENDMODE_BLEND if blend else SDL_BLENDMODE_NONE
+        self.renderer.draw_color = pygame.Color(color)
+        for rect in rects:
+            self.renderer.fill_rect(rect)
+
+    def _outline_rects(self, color, rects, blend=True):
+        """2 px outlines, matching pygame.draw.rect(..., 2)."""
+        self.renderer.draw_blend_mode = SDL_BLENDMODE_BLEND if blend else SDL_BLENDMODE_NONE
+        self.renderer.draw_color = pygame.Color(color)
+        for x, y, width, height in rects:
+            self.renderer.draw_rect((x, y, width, height))
+            self.renderer.draw_rect((x + 1, y + 1, width - 2, height - 2))
+
+    def _fill(self, color):
+        self._fill_rects(color, [(0, 0, *self.logical_size)], blend=False)
+
+    def _surface(self, source, position, area=None):
+        texture = self._texture(source, lambda: source)
+        if area is None:
+            texture.draw(dstrect=(position[0], position[1], texture.width, texture.height))
+        else:
+            texture.draw(srcrect=area, dstrect=(position[0], position[1], area[2], area[3]))
+
+    def _stack_layer(self, source, position, area, owner):
+        # One streaming texture per board, updated in place whenever its view hands over a new layer.
+        cached = self.stack_layers.get(owner)
+        if cached is None or cached[0] is not source:
+            if cached is None or (cached[1].width, cached[1].height) != source.get_size():
+                if len(self.stack_layers) >= self.TEXTURE_CACHE_SIZE // 4:
+                    self.stack_layers.clear()  # Views of finished games.
+                texture = sdl2_video.Texture(self.renderer, source.get_size(), streaming=True)
+                texture.blend_mode = SDL_BLENDMODE_BLEND
+            else:
+                texture = cached[1]
+            texture.update(source)
+            cached = self.stack_layers[owner] = (source, texture)
+        area = area or (0, 0, source.get_width(), source.get_height())
+        cached[1].draw(srcrect=area, dstrect=(position[0], position[1], area[2], area[3]))
+
+    def _overlay(self, overlay, color, alpha):
+        self._fill_rects((*color, alpha), [(0, 0, *overlay.get_size())])
+
+    def _ghost(self, ghost_cells, shadow_cells, color, block_size):
+        # Same pixels as paint_ghost_piece: a 20% fill inside a 40% outline, then faint shadows.
+        rects = [(x, y, block_size, block_size) for x, y in ghost_cells]
+        self._fill_rects((*color, int(255 * 0.2)), [(x + 2, y + 2, w - 4, h - 4) for x, y, w, h in rects])
+        self._outline_rects((*color, int(255 * 0.4)), rects)
+        self._fill_rects((30, 30, 30, 10), [(x, y, block_size, block_size) for x, y in shadow_cells])
+
+    def _ghost_outline(self, ghost_cells, color, block_size):
+        outline_color = (color[0] // 3, color[1] // 3, color[2] // 3)
+        self._outline_rects(outline_color, [(x, y, block_size, block_size) for x, y in ghost_cells], blend=False)
+
+    def _disc(self, x, y, radius, color, alpha):
+        self.disc.color = pygame.Color(color[:3])
+        self.disc.alpha = alpha
+        self.disc.draw(dstrect=(int(x - radius), int(y - radius), int(radius * 2), int(radius * 2)))
+
+    def _dust(self, x, y, size, color, alpha):
+        self._disc(x, y, size, color, alpha)
+
+    def _trail(self, x, y, radius, blended_color):
+        self._disc(x, y, radius, blended_color, blended_color[3])
+
+    def _sparks(self, sparks):
+        for color, center, size in sparks:
+            self._disc(center[0], center[1], size, color, color[3])
@@ -0,0 +1,1317 @@
+"""
+Menus and scenes for TetraFusion: the main menu, options and keybind screens, the pause and
+game-over screens, the scene stack that runs them and the pacing of menu-style loops. The
+screens draw with the game's window, fonts and settings, which TetraFusion.py creates and
+replaces at run time (init_runtime(), main(), tools such as soak_test.py). They are read
+through the 'game' module reference, bound by bind_game(), rather than imported by value.
+Needs pygame; importing this module opens nothing.
+"""
+import random
+import sys
+
+import pygame
+
+from .engine import BOARD_SIZES
+from .audio import MIXER_PROFILE_NAMES, mixer_profile_config, recommend_buffer_by_jitter
+from .render import WHITE, BLACK
+from .input import DAS_CHOICES, ARR_CHOICES
+
+game = None  # The TetraFusion module; see bind_game().
+
+def bind_game(module):
+    """Gives the screens the game module whose window, fonts, settings and scenes they use."""
+    global game
+    game = module
+
+# -------------------------- Music Folder Dialog --------------------------
+def select_music_directory():
+    """
+    Asks for a music folder: NSOpenPanel on macOS when PyObjC is installed, tkinter's folder
+    dialog everywhere else. Both are imported on first use, so importing the menus loads neither.
+    """
+    if sys.platform == "darwin":
+        try:
+            from AppKit import NSOpenPanel, NSApplication
+        except ImportError:
+            NSOpenPanel = None  # Fall back to tkinter if PyObjC is not installed.
+        if NSOpenPanel is not None:
+            panel = NSOpenPanel.openPanel()
+            panel.setCanChooseFiles_(False)
+            panel.setCanChooseDirectories_(True)
+            panel.setAllowsMultipleSelection_(False)
+            result = panel.runModal()
+            # Restore focus to the game window.
+            NSApplication.sharedApplication().activateIgnoringOtherApps_(True)
+            if result == 1:
+                # panel.URL() returns an NSURL; we need its path.
+                return panel.URL().path()
+            return ""
+    try:
+        import tkinter as tk
+        from tkinter import filedialog
+    except ImportError as e:
+        print(f"Folder dialog unavailable: {e}")
+        return ""
+    root = tk.Tk()
+    root.withdraw()
+    selected = filedialog.askdirectory()
+    root.destroy()
+    return selected
+
+# -------------------------- Idle Scheduling --------------------------
+ANIMATED_SCREEN_FPS = 30  # Frame cap for menu-style screens that animate.
+IDLE_WAKE_MS = 500        # Static screens re-check for events this often while blocked.
+
+class ScreenScheduler:
+    """
+    Paces a menu-style loop (draw, then handle events). A static screen blocks in
+    pygame.event.wait() until input, a timer or a window event arrives, so it only redraws
+    when something may have changed. An animated screen also wakes for its next frame.
+    """
+    def __init__(self, fps=0):
+        self.frame_ms = 1000 // fps if fps else 0
+        self.next_frame = 0
+
+    def wait(self):
+        """Sleeps until there are events (or the next animation frame is due) and returns them."""
+        while True:
+            if self.frame_ms:
+                timeout = self.next_frame - pygame.time.get_ticks()
+                if timeout <= 0:
+                    self.next_frame = pygame.time.get_ticks() + self.frame_ms
+                    return pygame.event.get()
+            else:
+                # A bounded wait keeps Ctrl+C and other signals responsive.
+                timeout = IDLE_WAKE_MS
+            event = pygame.event.wait(timeout)
+            if event.type != pygame.NOEVENT:
+                return [event] + pygame.event.get()
+
+# -------------------------- Menu System --------------------------
+def draw_main_menu(selected_index, menu_options):
+    """
+    Draws the main menu screen with a title and a list of selectable options.
+    The option at index 'selected_index' is highlighted.
+    """
+    game.screen.fill(BLACK)
+    title_text = game.tetris_font_large.render("TetraFusion", True, random.choice(game.COLORS))
+    # Draw title above the menu options.
+    game.screen.blit(title_text, (game.SCREEN_WIDTH//2 - title_text.get_width()//2, game.SCREEN_HEIGHT//3 - 100))
+    # Draw each menu option.
+    for i, option in enumerate(menu_options):
+        color = game.RED if i == selected_index else WHITE
+        option_text = game.tetris_font_medium.render(option, True, color)
+        x = game.SCREEN_WIDTH//2 - option_text.get_width()//2
+        y = game.SCREEN_HEIGHT//2 + i * 50
+        game.screen.blit(option_text, (x, y))
+    game.present_display()
+
+def start_menu_music():
+    """Starts the background music if it is enabled and not already playing."""
+    settings = game.settings
+    if settings.music_enabled and pygame.mixer.get_init():
+        if settings.use_custom_music:
+            # If custom music is enabled, start it if not already playing.
+            if not pygame.mixer.music.get_busy():
+                game.play_custom_music(settings)
+        else:
+            # Otherwise, load and loop the default background music.
+            if not pygame.mixer.music.get_busy():
+                try:
+                    pygame.mixer.music.load(game.BACKGROUND_MUSIC_PATH)
+                    pygame.mixer.music.set_volume(1.0)  # Set volume to 100%
+                    pygame.mixer.music.play(-1)  # Loop indefinitely
+                except Exception as e:
+                    print(f"Error loading default background music: {e}")
+
+def main_menu():
+    """Main menu scene: pushes the game or the options screen and resumes when they finish."""
+    settings = game.settings
+    start_menu_music()
+
+    # Define the menu options.
+    menu_options = ["Start", "Spectate", "Options", "Quit"]
+    selected_index = 0
+    joy_delay = 150  # milliseconds delay for joystick hat input
+    last_move = pygame.time.get_ticks()
+    
+    # Optional: a flag to prevent repeated fallback triggers
+    fallback_triggered = False
+    # The title flickers, so the menu redraws at a low frame cap instead of only on input.
+    scheduler = ScreenScheduler(ANIMATED_SCREEN_FPS)
+
+    while True:
+        draw_main_menu(selected_index, menu_options)
+        for event in scheduler.wait():
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            elif event.type == game.MUSIC_END_EVENT:
+                game.handle_music_end_event()
+            # --- Keyboard Input ---
+            elif event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_DOWN, pygame.K_s):
+                    selected_index = (selected_index + 1) % len(menu_options)
+                elif event.key in (pygame.K_UP, pygame.K_w):
+                    selected_index = (selected_index - 1) % len(menu_options)
+                elif event.key == pygame.K_RETURN:
+                    if menu_options[selected_index] == "Start":
+                        yield game.run_game()
+                        start_menu_music()  # The game-over screen stops the music.
+                        break  # The rest of this event batch predates the game.
+                    elif menu_options[selected_index] == "Spectate":
+                        yield screen_scene(game.spectator_wall)
+                        break
+                    elif menu_options[selected_index] == "Options":
+                        yield screen_scene(options_menu)
+                    elif menu_options[selected_index] == "Quit":
+                        game.save_settings(settings)
+                        pygame.quit()
+                        sys.exit()
+                elif event.key == pygame.K_o:
+                    yield screen_scene(options_menu)
+                elif event.key == pygame.K_ESCAPE:
+                    game.save_settings(settings)
+                    pygame.quit()
+                    sys.exit()
+            # --- Controller Navigation using controller_menu_navigation settings ---
+            elif event.type == pygame.JOYBUTTONDOWN:
+                # Look the button up in the compiled menu navigation table.
+                nav_action = game.input_mapper.menu_action(event)
+                if nav_action == "up":
+                    selected_index = (selected_index - 1) % len(menu_options)
+                elif nav_action == "down":
+                    selected_index = (selected_index + 1) % len(menu_options)
+                elif nav_action == "select":
+                    if menu_options[selected_index] == "Start":
+                        yield game.run_game()
+                        start_menu_music()  # The game-over screen stops the music.
+                        break  # The rest of this event batch predates the game.
+                    elif menu_options[selected_index] == "Spectate":
+                        yield screen_scene(game.spectator_wall)
+                        break
+                    elif menu_options[selected_index] == "Options":
+                        yield screen_scene(options_menu)
+                    elif menu_options[selected_index] == "Quit":
+                        game.save_settings(settings)
+                        pygame.quit()
+                        sys.exit()
+            # --- Optional: D-Pad (Hat) Navigation ---
+            elif event.type == pygame.JOYHATMOTION:
+                hx, hy = event.value
+                if hy == 1:
+                    selected_index = (selected_index - 1) % len(menu_options)
+                elif hy == -1:
+                    selected_index = (selected_index + 1) % len(menu_options)
+        
+        # Fallback for Custom Music Looping:
+        if settings.use_custom_music and pygame.mixer.get_init():
+            if not pygame.mixer.music.get_busy() and not fallback_triggered:
+                fallback_triggered = True  # Mark that fallback has been triggered.
+                game.load_next_track(update_last_index=False)
+            elif pygame.mixer.music.get_busy():
+                # Reset the flag when music is playing normally.
+                fallback_triggered = False
+
+        # Additionally, handle the skip command:
+        if game.game_command == "skip":
+            game.skip_current_track()
+            game.game_command = None
+
+# Audio buffer jitter test
+def calibrate_audio_screen():
+    """
+    Runs recommend_buffer_by_jitter() and offers to switch to the suggested buffer. The test
+    times a second output device's callbacks, not sound played through the game mixer, so
+    the screen calls it a jitter suggestion rather than a latency measurement.
+    """
+    settings = game.settings
+    game.screen.fill(BLACK)
+    title_text = game.tetris_font_large.render("TESTING", True, WHITE)
+    game.screen.blit(title_text, (game.SCREEN_WIDTH // 2 - title_text.get_width() // 2, 100))
+    game.present_display()
+    recommended, results = recommend_buffer_by_jitter(game.mixer_config[0])
+
+    lines = [f"{buffer} samples: {jitter:.1f} ms jitter" for buffer, jitter in sorted(results.items())]
+    if recommended is None:
+        lines += ["", "Jitter test unavailable", "on this audio driver."]
+    else:
+        lines += ["", f"Suggested by jitter: {recommended}", "Latency is not measured.", "ENTER to use, ESC to keep"]
+    game.screen.fill(BLACK)
+    title_text = game.tetris_font_large.render("AUDIO", True, WHITE)
+    game.screen.blit(title_text, (game.SCREEN_WIDTH // 2 - title_text.get_width() // 2, 100))
+    for i, line in enumerate(lines):
+        line_text = game.tetris_font_small.render(line, True, WHITE)
+        game.screen.blit(line_text, (game.SCREEN_WIDTH // 2 - line_text.get_width() // 2, 220 + i * 35))
+
+    scheduler = ScreenScheduler()
+    while True:
+        game.present_display()
+        for event in scheduler.wait():
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            action = None
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_RETURN:
+                    action = "select"
+                elif event.key == pygame.K_ESCAPE:
+                    action = "back"
+            elif event.type == pygame.JOYBUTTONDOWN:
+                action = game.input_mapper.menu_action(event)
+            if action == "select" and recommended is not None:
+                # Assigning notifies apply_mixer_profile, which reopens the mixer.
+                settings.audio_buffer = recommended
+                settings.audio_profile = "calibrated"
+                return
+            elif action in ("select", "back"):
+                return
+
+# Main Options
+def options_menu():
+    settings = game.settings
+    selected_option = 0
+    scheduler = ScreenScheduler()  # Static screen: redraws only when events arrive.
+    enter_pressed = False  # Flag to track whether Enter is held down
+    options = [
+        ('keybinds', 'Keyboard Keybinds'),
+        ('controller_keybinds', 'Controller Keybinds'),
+        ('difficulty', 'Difficulty'),
+        ('board_size', 'Board Size'),
+        ('wall_boards', 'Spectator Boards'),
+        ('flame_trails', 'Flame Trails'),
+        ('grid_opacity', 'Grid Opacity'),
+        ('grid_lines', 'Grid Lines'),
+        ('ghost_piece', 'Ghost Piece'),
+        ('finesse_trainer', 'Finesse Trainer'),
+        ('das', 'DAS'),
+        ('arr', 'ARR'),
+        ('show_input_latency', 'Input Latency'),
+        ('target_fps', 'Target FPS'),
+        ('vsync', 'VSync'),
+        ('display_scaling', 'Scaling'),
+        ('threaded_render', 'Threaded Render'),
+        ('render_backend', 'Renderer'),
+        ('stack_renderer', 'Stack Renderer'),
+        ('record_stats', 'Record Stats'),
+        ('audio_profile', 'Audio Latency'),
+        ('calibrate_audio', 'Buffer Jitter Test'),
+        ('quality_tier', 'Effects Quality'),
+        ('music_enabled', 'Music'),
+        ('use_custom_music', 'Use Custom Music'),
+        ('select_music_dir', 'Select Music Directory'),
+        ('back', 'Back to Main Menu')
+    ]
+    changing_key = None
+
+    # Define vertical spacing for options (tighter once the list outgrows the screen) and desired extra bottom padding.
+    option_spacing = min(45, (game.SCREEN_HEIGHT - 20) // len(options))
+    extra_bottom_padding = 0
+
+    # Total height = (number of options * spacing) + extra bottom padding
+    total_options_height = (len(options) * option_spacing) + extra_bottom_padding
+
+    # Calculate base_y so that the list is vertically centered.
+    base_y = (game.SCREEN_HEIGHT - total_options_height) // 2
+
+    # --- Sub-Function: process_navigation_events ---
+    def process_navigation_events(options, selected_option, changing_key, enter_pressed, events):
+        """
+        Processes both keyboard and controller (including D-pad) navigation events
+        for the options menu. Returns updated values for selected_option, changing_key,
+        enter_pressed, and an action flag (which will be the current option key if selected,
+        or "back" if the user wants to exit).
+        """
+        action = None  # Action flag to indicate an option was chosen.
+        for event in events:
+            # ---------------------- QUIT EVENT ----------------------
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            # ---------------------- MUSIC END EVENT ----------------------
+            elif event.type == game.MUSIC_END_EVENT:
+                game.handle_music_end_event()
+            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
+            elif event.type == pygame.JOYBUTTONDOWN:
+                if changing_key is None:  # Only process navigation if not capturing a new key binding.
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action == "up":
+                        selected_option = (selected_option - 1) % len(options)
+                    elif nav_action == "down":
+                        selected_option = (selected_option + 1) % len(options)
+                    elif nav_action == "select":
+                        current_key = options[selected_option][0]
+                        # For options that capture keyboard bindings, ignore controller select.
+                        if current_key not in settings.controls:
+                            action = current_key
+                    elif nav_action == "back":
+                        action = "back"
+            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
+            elif event.type == pygame.JOYHATMOTION:
+                if changing_key is None:
+                    hx, hy = event.value
+                    if hy == 1:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif hy == -1:
+                        selected_option = (selected_option + 1) % len(options)
+            # ---------------------- KEYBOARD EVENTS (NAVIGATION & BINDING) ----------------------
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    if changing_key is not None:
+                        changing_key = None  # Cancel pending binding capture.
+                    else:
+                        action = "back"
+                elif changing_key is not None:
+                    # When capturing a new key binding, only keyboard keys are processed.
+                    settings.controls[changing_key] = event.key
+                    settings.notify('controls')
+                    changing_key = None
+                elif event.key == pygame.K_RETURN and not enter_pressed:
+                    enter_pressed = True  # Mark Enter as pressed.
+                    current_key = options[selected_option][0]
+                    if current_key in settings.controls:
+                        # Begin capturing a new keyboard binding.
+                        changing_key = current_key
+                    else:
+                        action = current_key
+                elif event.key == pygame.K_UP:
+                    selected_option = (selected_option - 1) % len(options)
+                elif event.key == pygame.K_DOWN:
+                    selected_option = (selected_option + 1) % len(options)
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_RETURN:
+                    enter_pressed = False
+        return selected_option, changing_key, enter_pressed, action
+
+    # ---------------------- MAIN LOOP FOR OPTIONS MENU ----------------------
+    while True:
+        game.screen.fill(BLACK)
+        title_text = game.tetris_font_large.render("Options", True, WHITE)
+        game.screen.blit(title_text, (game.SCREEN_WIDTH // 2 - title_text.get_width() // 2, 50))
+        
+        # Render each option.
+        for i, (key, label) in enumerate(options):
+            color = game.RED if i == selected_option else WHITE
+            text = label
+            if key in settings.controls:
+                text = f"{label}: {pygame.key.name(settings.controls[key]).upper()}"
+            elif key == 'difficulty':
+                text = f"Difficulty: {settings.difficulty.capitalize()}"
+            elif key == 'board_size':
+                text = f"Board: {settings.board_size.title()} {'x'.join(map(str, BOARD_SIZES[settings.board_size]))}"
+            elif key == 'wall_boards':
+                text = f"Spectator Boards: {settings.wall_boards}"
+            elif key == 'flame_trails':
+                text = f"Flame Trails: {'On' if settings.flame_trails else 'Off'}"
+            elif key == 'grid_opacity':
+                text = f"Grid Opacity: {settings.grid_opacity}"
+            elif key == 'grid_lines':
+                text = f"Grid Lines: {'On' if settings.grid_lines else 'Off'}"
+            elif key == 'ghost_piece':
+                text = f"Ghost Piece: {'On' if settings.ghost_piece else 'Off'}"
+            elif key == 'finesse_trainer':
+                text = f"Finesse Trainer: {'On' if settings.finesse_trainer else 'Off'}"
+            elif key == 'das':
+                text = f"DAS: {settings.das} ms"
+            elif key == 'arr':
+                text = f"ARR: {settings.arr} ms"
+            elif key == 'show_input_latency':
+                text = f"Input Latency: {'On' if settings.show_input_latency else 'Off'}"
+            elif key == 'target_fps':
+                fps = settings.target_fps
+                text = f"Target FPS: {fps if fps else 'Uncapped'}"
+            elif key == 'display_scaling':
+                text = f"Scaling: {settings.display_scaling.title()}"
+            elif key == 'vsync':
+                text = f"VSync: {'On' if settings.vsync else 'Off'} (restart)"
+            elif key == 'threaded_render':
+                text = f"Threaded Render: {'On' if settings.threaded_render else 'Off'}"
+            elif key == 'render_backend':
+                text = f"Renderer: {'GPU' if settings.render_backend == 'gpu' else 'CPU'} (restart)"
+            elif key == 'stack_renderer':
+                if settings.stack_renderer == 'tilemap':
+                    text = f"Stack: Tile Map{'' if game.numpy else ' (needs NumPy)'}"
+                else:
+                    text = "Stack: Blits"
+            elif key == 'record_stats':
+                text = f"Record Stats: {'On' if settings.record_stats else 'Off'}"
+            elif key == 'quality_tier':
+                if settings.quality_tier == 'auto':
+                    text = f"Effects: Auto ({game.quality_governor.name.title()})"
+                else:
+                    text = f"Effects: {settings.quality_tier.title()}"
+            elif key == 'audio_profile':
+                profile = "Tuned" if settings.audio_profile == "calibrated" else settings.audio_profile.split('_')[0].title()
+                text = f"Audio: {profile} {mixer_profile_config(settings)[1]}"
+            elif key == 'music_enabled':
+                text = f"Music: {'On' if settings.music_enabled else 'Off'}"
+            elif key == 'use_custom_music':
+                text = f"Use Custom Music: {'On' if settings.use_custom_music else 'Off'}"
+            elif key == 'select_music_dir':
+                dir_display = settings.music_directory
+                text = f"Dir: {dir_display}" if dir_display else "Music Dir: Not Selected"
+            option_text = game.tetris_font_medium.render(text, True, color)
+            # Scale the text for select_music_dir based on whether a valid path is set.
+            if key == 'select_music_dir':
+                if settings.music_directory:
+                    scale_factor = 0.6  # When a valid music directory is set.
+                else:
+                    scale_factor = 1.0  # When no valid music directory is set.
+                scaled_width = int(option_text.get_width() * scale_factor)
+                scaled_height = int(option_text.get_height() * scale_factor)
+                option_text = pygame.transform.scale(option_text, (scaled_width, scaled_height))
+            y_coordinate = base_y + i * option_spacing
+            game.screen.blit(option_text, (game.SCREEN_WIDTH // 2 - option_text.get_width() // 2, y_coordinate))
+        
+        game.present_display()
+
+        # Call the navigation sub-function to process events.
+        selected_option, changing_key, enter_pressed, action = process_navigation_events(
+            options, selected_option, changing_key, enter_pressed, scheduler.wait()
+        )
+        # Process the returned action flag.
+        if action is not None:
+            current_key = action
+            if current_key == 'keybinds':
+                keyboard_keybinds_menu()
+                pygame.event.clear()
+            elif current_key == 'controller_keybinds':
+                controller_keybinds_menu()
+                pygame.event.clear()
+            elif current_key == 'difficulty':
+                difficulties = ['easy', 'normal', 'hard', 'very hard']
+                new_idx = (difficulties.index(settings.difficulty) + 1) % len(difficulties)
+                settings.difficulty = difficulties[new_idx]
+            elif current_key == 'stack_renderer':
+                settings.stack_renderer = 'tilemap' if settings.stack_renderer == 'blits' else 'blits'
+            elif current_key == 'board_size':
+                sizes = list(BOARD_SIZES)
+                settings.board_size = sizes[(sizes.index(settings.board_size) + 1) % len(sizes)]
+            elif current_key == 'wall_boards':
+                current = settings.wall_boards
+                settings.wall_boards = next((v for v in game.WALL_BOARD_CHOICES if v > current), game.WALL_BOARD_CHOICES[0])
+            elif current_key == 'flame_trails':
+                settings.flame_trails = not settings.flame_trails
+            elif current_key == 'grid_opacity':
+                if settings.grid_opacity < 255:
+                    new_opacity = settings.grid_opacity + 64
+                    settings.grid_opacity = new_opacity if new_opacity <= 255 else 255
+                else:
+                    settings.grid_opacity = 0
+            elif current_key == 'grid_lines':
+                settings.grid_lines = not settings.grid_lines
+            elif current_key == 'ghost_piece':
+                settings.ghost_piece = not settings.ghost_piece
+            elif current_key == 'finesse_trainer':
+                settings.finesse_trainer = not settings.finesse_trainer
+            elif current_key == 'das':
+                current = settings.das
+                settings.das = next((v for v in DAS_CHOICES if v > current), DAS_CHOICES[0])
+            elif current_key == 'arr':
+                current = settings.arr
+                settings.arr = next((v for v in ARR_CHOICES if v > current), ARR_CHOICES[0])
+            elif current_key == 'show_input_latency':
+                settings.show_input_latency = not settings.show_input_latency
+            elif current_key == 'target_fps':
+                current = settings.target_fps
+                index = game.FPS_CHOICES.index(current) if current in game.FPS_CHOICES else 0
+                settings.target_fps = game.FPS_CHOICES[(index + 1) % len(game.FPS_CHOICES)]
+            elif current_key == 'display_scaling':
+                settings.display_scaling = 'integer' if settings.display_scaling == 'smooth' else 'smooth'
+            elif current_key == 'vsync':
+                settings.vsync = not settings.vsync
+            elif current_key == 'threaded_render':
+                settings.threaded_render = not settings.threaded_render
+            elif current_key == 'render_backend':
+                settings.render_backend = 'software' if settings.render_backend == 'gpu' else 'gpu'
+            elif current_key == 'record_stats':
+                settings.record_stats = not settings.record_stats
+            elif current_key == 'audio_profile':
+                index = MIXER_PROFILE_NAMES.index(settings.audio_profile)
+                settings.audio_profile = MIXER_PROFILE_NAMES[(index + 1) % len(MIXER_PROFILE_NAMES)]
+            elif current_key == 'quality_tier':
+                names = ("auto",) + game.QUALITY_TIER_NAMES
+                settings.quality_tier = names[(names.index(settings.quality_tier) + 1) % len(names)]
+            elif current_key == 'calibrate_audio':
+                calibrate_audio_screen()
+                pygame.event.clear()
+            elif current_key == 'music_enabled':
+                settings.music_enabled = not settings.music_enabled
+                if not settings.music_enabled:
+                    game.stop_music()
+                else:
+                    if settings.use_custom_music:
+                        game.play_custom_music(settings)
+                    else:
+                        try:
+                            pygame.mixer.music.load(game.BACKGROUND_MUSIC_PATH)
+                            pygame.mixer.music.play(-1)
+                        except Exception as e:
+                            print(f"Error loading default music: {e}")
+            elif current_key == 'use_custom_music':
+                settings.use_custom_music = not settings.use_custom_music
+                game.last_track_index = None
+                if settings.music_enabled:
+                    if settings.use_custom_music:
+                        game.play_custom_music(settings)
+                    else:
+                        try:
+                            pygame.mixer.music.load(game.BACKGROUND_MUSIC_PATH)
+                            pygame.mixer.music.play(-1)
+                        except Exception as e:
+                            print(f"Error loading default background music: {e}")
+                else:
+                    game.stop_music()
+            elif current_key == 'select_music_dir':
+                selected_dir = select_music_directory()
+                if selected_dir:
+                    settings.music_directory = selected_dir
+                    game.last_track_index = None
+                    if settings.use_custom_music and settings.music_enabled:
+                        game.play_custom_music(settings)
+            elif current_key == 'back':
+                game.save_settings(settings)
+                return
+
+# Options Keyboard Controls            
+def keyboard_keybinds_menu():
+    settings = game.settings
+    selected_option = 0
+    scheduler = ScreenScheduler()  # Static screen: redraws only when events arrive.
+    changing_key = None
+    enter_pressed = False  # Flag to track whether Enter is held down
+
+    # List of keybind options: first element is the setting key,
+    # second element is a label to show.
+    keybind_options = [
+        ('left', 'Move Left'),
+        ('right', 'Move Right'),
+        ('down', 'Soft Drop'),
+        ('rotate', 'Rotate'),
+        ('hard_drop', 'Hard Drop'),
+        ('hold', 'Hold Piece'),
+        ('pause', 'Pause'),
+        ('skip_track', 'Skip Track'),
+        ('back', 'Back to Options')
+    ]
+    option_spacing = 45
+    base_y = 150  # starting vertical position
+
+    # --- Sub-Function: process_kb_nav_events ---
+    def process_kb_nav_events(options, selected_option, changing_key, enter_pressed, events):
+        """
+        Processes both keyboard and controller (including D-pad) navigation events
+        for the keyboard keybinds menu. Returns updated values for selected_option,
+        changing_key, enter_pressed, and an action flag.
+        
+        NOTE:
+          - This menu supports full controller navigation so that you can move up and down
+            and use the controller "back" button to exit.
+          - When the controller's select button is pressed on a bindable option,
+            binding capture is triggered (changing_key is set) so that subsequent controller keys
+            will not bind anything; only a keyboard key will be accepted.
+          - The action flag will be "back" if the user wants to exit, or None otherwise.
+        """
+        action = None  # Will hold the action if one is triggered.
+        # ---------------------- Process Each Event ----------------------
+        for event in events:
+            # ---------------------- QUIT EVENT ----------------------
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            # ---------------------- MUSIC END EVENT ----------------------
+            elif event.type == game.MUSIC_END_EVENT:
+                game.handle_music_end_event()
+            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
+            elif event.type == pygame.JOYBUTTONDOWN:
+                # Only process controller navigation if NOT in binding mode.
+                if changing_key is None:
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action == "up":
+                        selected_option = (selected_option - 1) % len(options)
+                    elif nav_action == "down":
+                        selected_option = (selected_option + 1) % len(options)
+                    # Controller Back button exits the menu.
+                    elif nav_action == "back":
+                        action = "back"
+                    # Controller Select triggers binding mode for bindable options.
+                    elif nav_action == "select":
+                        current_key = options[selected_option][0]
+                        if current_key == "back":
+                            action = "back"
+                        else:
+                            # Trigger binding capture if this option is bindable.
+                            if current_key in settings.controls:
+                                changing_key = current_key
+            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
+            elif event.type == pygame.JOYHATMOTION:
+                if changing_key is None:
+                    hx, hy = event.value
+                    if hy == 1:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif hy == -1:
+                        selected_option = (selected_option + 1) % len(options)
+            # ---------------------- KEYBOARD EVENTS (NAVIGATION & BINDING) ----------------------
+            elif event.type == pygame.KEYDOWN:
+                # ESC cancels binding capture or exits the menu.
+                if event.key == pygame.K_ESCAPE:
+                    if changing_key is not None:
+                        changing_key = None  # Cancel pending binding
+                    else:
+                        action = "back"
+                # If waiting for a new key, capture the key press (keyboard only).
+                elif changing_key is not None:
+                    settings.controls[changing_key] = event.key
+                    settings.notify('controls')
+                    changing_key = None
+                # Process selection with Enter (keyboard only).
+                elif event.key == pygame.K_RETURN and not enter_pressed:
+                    enter_pressed = True  # Mark Enter as pressed.
+                    current_key = options[selected_option][0]
+                    if current_key == 'back':
+                        action = "back"
+                    else:
+                        # Begin capturing a new binding for this option (keyboard only).
+                        changing_key = current_key
+                # Navigate using Up arrow.
+                elif event.key == pygame.K_UP:
+                    selected_option = (selected_option - 1) % len(options)
+                # Navigate using Down arrow.
+                elif event.key == pygame.K_DOWN:
+                    selected_option = (selected_option + 1) % len(options)
+            # ---------------------- KEYUP EVENT ----------------------
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_RETURN:
+                    enter_pressed = False  # Reset flag when Enter is released
+        return selected_option, changing_key, enter_pressed, action
+
+    # ---------------------- MAIN LOOP FOR KEYBOARD KEYBINDS MENU ----------------------
+    while True:
+        game.screen.fill(BLACK)
+        title_text = game.tetris_font_large.render("Keyboard Keybinds", True, WHITE)
+        scaled_title = pygame.transform.scale(
+            title_text,
+            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
+        )
+        game.screen.blit(
+            scaled_title,
+            (game.SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
+        )
+    
+        # Render each keybind option.
+        for i, (key, label) in enumerate(keybind_options):
+            # Decide the overall color for the label (red if selected, else white).
+            color = game.RED if i == selected_option else WHITE
+        
+            # Y-position for this line
+            y_coordinate = base_y + i * option_spacing
+            x_center = game.SCREEN_WIDTH // 2  # We'll center things horizontally
+
+            # If key is in our controls dict, we do two-part rendering: label + key
+            if key in settings.controls:
+                # 1) Label portion
+                label_text = label + ": "
+                label_surface = game.tetris_font_medium.render(label_text, True, color)
+
+                # 2) Key portion - if we are capturing a binding (changing_key == key), show it in yellow
+                if changing_key == key:
+                    key_color = game.YELLOW
+                else:
+                    key_color = color
+
+                key_name = pygame.key.name(settings.controls[key]).upper()
+                key_surface = game.tetris_font_medium.render(key_name, True, key_color)
+
+                # Now blit them side by side (still centered as a whole).
+                combined_width = label_surface.get_width() + key_surface.get_width()
+                x_start = x_center - combined_width // 2
+                game.screen.blit(label_surface, (x_start, y_coordinate))
+                game.screen.blit(key_surface, (x_start + label_surface.get_width(), y_coordinate))
+
+            else:
+                # If it's not actually in settings.controls, just render a single label.
+                display_text = label
+                option_text = game.tetris_font_medium.render(display_text, True, color)
+                game.screen.blit(
+                    option_text,
+                    (x_center - option_text.get_width() // 2, y_coordinate)
+                )
+    
+        game.present_display()
+
+        # Call the navigation sub-function to process events.
+        selected_option, changing_key, enter_pressed, action = process_kb_nav_events(
+            keybind_options, selected_option, changing_key, enter_pressed, scheduler.wait()
+        )
+
+        # Process any action returned from the sub-function.
+        if action is not None:
+            if action == "back":
+                return
+
+# Options Controller Controls         
+def controller_keybinds_menu():
+    settings = game.settings
+    selected_option = 0
+    scheduler = ScreenScheduler()  # Static screen: redraws only when events arrive.
+    changing_button = None
+    enter_pressed = False  # Flag to track whether Enter is held down
+
+    # Define your controller options.
+    controller_options = [
+        ('controller_menu_keybinds', 'Menu Nav Bindings'),
+        ('left', 'Move Left'),
+        ('right', 'Move Right'),
+        ('down', 'Soft Drop'),
+        ('rotate', 'Rotate'),
+        ('hard_drop', 'Hard Drop'),
+        ('hold', 'Hold Piece'),
+        ('pause', 'Pause'),
+        ('back', 'Back to Options')
+    ]
+    
+    # Define which options are bindable in controller_controls.
+    bindable_keys = {"left", "right", "down", "rotate", "hard_drop", "hold", "pause", "skip_track"}
+
+    option_spacing = 45
+    base_y = 150  # starting vertical position for options
+
+    # --- Sub-Function: process_ctrl_nav_events ---
+    def process_ctrl_nav_events(options, selected_option, changing_button, enter_pressed, events):
+        """
+        Processes both keyboard and controller (including D-pad) navigation events
+        for the controller keybinds menu. Returns updated values for selected_option,
+        changing_button, enter_pressed, and an action flag.
+        
+        NOTE:
+          - In this menu, controller keys CAN bind to controller_controls.
+          - Keyboard events are allowed for navigation and for triggering binding mode via Enter;
+            however, once binding mode is active (i.e. changing_button is not None), only
+            controller key inputs (JOYBUTTONDOWN) will update the binding.
+          - The action flag will be:
+              • "back" if the user wants to exit the menu,
+              • "menu_nav" if the user selects the "controller_menu_keybinds" option.
+          - If the "controller_menu_navigation" settings are not defined, then controller button
+            navigation via JOYBUTTONDOWN will not work—but D-pad (JOYHATMOTION) and keyboard navigation
+            will still be available.
+        """
+        action = None  # Will hold the action if one is triggered.
+        for event in events:
+            # ---------------------- QUIT EVENT ----------------------
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            # ---------------------- MUSIC END EVENT ----------------------
+            elif event.type == game.MUSIC_END_EVENT:
+                game.handle_music_end_event()
+            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
+            elif event.type == pygame.JOYBUTTONDOWN:
+                if changing_button is not None:
+                    # In binding mode: capture the controller button and update the binding.
+                    settings.controller_controls[changing_button] = event.button
+                    settings.notify('controller_controls')
+                    changing_button = None
+                else:
+                    # Not in binding mode: process navigation via controller buttons.
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action == "up":
+                        selected_option = (selected_option - 1) % len(options)
+                    elif nav_action == "down":
+                        selected_option = (selected_option + 1) % len(options)
+                    elif nav_action == "back":
+                        action = "back"
+                    elif nav_action == "select":
+                        current_option = options[selected_option][0]
+                        if current_option == 'back':
+                            action = "back"
+                        elif current_option == 'controller_menu_keybinds':
+                            # New: trigger the menu navigation submenu.
+                            action = "menu_nav"
+                        else:
+                            # Trigger binding capture for this option if it is bindable.
+                            if current_option in settings.controller_controls:
+                                changing_button = current_option
+            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
+            elif event.type == pygame.JOYHATMOTION:
+                if changing_button is None:
+                    hx, hy = event.value
+                    if hy == 1:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif hy == -1:
+                        selected_option = (selected_option + 1) % len(options)
+            # ---------------------- KEYBOARD EVENTS (NAVIGATION) ----------------------
+            elif event.type == pygame.KEYDOWN:
+                # Keyboard navigation is allowed, but keyboard keys will not be used to bind.
+                if event.key == pygame.K_ESCAPE:
+                    if changing_button is not None:
+                        changing_button = None
+                    else:
+                        action = "back"
+                elif changing_button is None:
+                    if event.key == pygame.K_UP:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif event.key == pygame.K_DOWN:
+                        selected_option = (selected_option + 1) % len(options)
+                    # Use Enter to trigger binding capture (keyboard can trigger, but only controller keys will update).
+                    elif event.key == pygame.K_RETURN and not enter_pressed:
+                        enter_pressed = True
+                        current_option = options[selected_option][0]
+                        if current_option == 'back':
+                            action = "back"
+                        elif current_option == 'controller_menu_keybinds':
+                            # Trigger menu navigation submenu from keyboard as well.
+                            action = "menu_nav"
+                        else:
+                            if current_option in settings.controller_controls:
+                                changing_button = current_option
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_RETURN:
+                    enter_pressed = False
+        return selected_option, changing_button, enter_pressed, action
+
+    # ---------------------- MAIN LOOP FOR CONTROLLER KEYBINDS MENU ----------------------
+    while True:
+        game.screen.fill(BLACK)
+        title_text = game.tetris_font_large.render("Controller Keybinds", True, WHITE)
+        scaled_title = pygame.transform.scale(
+            title_text,
+            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
+        )
+        game.screen.blit(
+            scaled_title,
+            (game.SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
+        )
+    
+        # Render each controller option.
+        for i, (key, label) in enumerate(controller_options):
+            # Overall color (red if selected, white otherwise).
+            color = game.RED if i == selected_option else WHITE
+        
+            # Determine position
+            y_coordinate = base_y + i * option_spacing
+            x_center = game.SCREEN_WIDTH // 2
+        
+            # If it's bindable, split into label + button binding
+            if key in bindable_keys:
+                # 1) label portion
+                label_text = label + ": "
+                label_surface = game.tetris_font_medium.render(label_text, True, color)
+
+                # 2) binding portion
+                current_binding = settings.controller_controls.get(key)
+                if current_binding is not None:
+                    binding_str = f"Button {current_binding}"
+                else:
+                    binding_str = "(none)"
+            
+                # If currently capturing a new binding for this key => YELLOW
+                if changing_button == key:
+                    binding_color = game.YELLOW
+                else:
+                    binding_color = color
+
+                binding_surface = game.tetris_font_medium.render(binding_str, True, binding_color)
+            
+                # Position them side by side
+                combined_width = label_surface.get_width() + binding_surface.get_width()
+                x_start = x_center - (combined_width // 2)
+            
+                # Blit them
+                game.screen.blit(label_surface, (x_start, y_coordinate))
+                game.screen.blit(binding_surface, (x_start + label_surface.get_width(), y_coordinate))
+        
+            else:
+                # Non-bindable option => single string
+                display_text = label
+                option_text = game.tetris_font_medium.render(display_text, True, color)
+                x_pos = x_center - (option_text.get_width() // 2)
+                game.screen.blit(option_text, (x_pos, y_coordinate))
+    
+        game.present_display()
+
+        # Process events and handle actions.
+        selected_option, changing_button, enter_pressed, action = process_ctrl_nav_events(
+            controller_options, selected_option, changing_button, enter_pressed, scheduler.wait()
+        )
+        if action is not None:
+            if action == "back":
+                return
+            elif action == "menu_nav":
+                # Call the controller menu navigation bindings submenu.
+                controller_menu_nav_menu()
+
+# Options Controller Menu Keybinds
+def controller_menu_nav_menu():
+    settings = game.settings
+    selected_option = 0
+    scheduler = ScreenScheduler()  # Static screen: redraws only when events arrive.
+    changing_button = None
+    enter_pressed = False  # Flag to track whether Enter is held down
+
+    # Define menu navigation options.
+    # The first four options are bindable; the final option ("exit") is non-bindable.
+    menu_nav_options = [
+        ("up", "Menu Up"),
+        ("down", "Menu Down"),
+        ("select", "Menu Select"),
+        ("back", "Menu Back"),
+        ("exit", "Back to Controller Keybinds")
+    ]
+    
+    # Define which options are bindable.
+    bindable_keys = {"up", "down", "select", "back"}
+
+    option_spacing = 45
+    base_y = 150  # Starting vertical position for the options
+
+    # --- Sub-Function: process_menu_nav_events ---
+    def process_menu_nav_events(options, selected_option, changing_button, enter_pressed, events):
+        """
+        Processes both keyboard and controller (including D-pad) navigation events
+        for the controller menu navigation bindings menu. Returns updated values for 
+        selected_option, changing_button, enter_pressed, and an action flag.
+        
+        NOTE:
+          - In this menu, binding capture is triggered by Enter (keyboard) or the controller
+            select button. However, once binding mode is active (i.e. changing_button is not None),
+            only controller key inputs (JOYBUTTONDOWN) will update the binding in settings.controller_menu_navigation.
+          - Keyboard events are allowed for navigation but are not used to update the binding.
+          - The action flag will be "exit" (or "back") if the user selects that option.
+        """
+        action = None  # Will hold the action if one is triggered.
+        # ---------------------- Process Each Event ----------------------
+        for event in events:
+            # ---------------------- QUIT EVENT ----------------------
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            # ---------------------- MUSIC END EVENT ----------------------
+            elif event.type == game.MUSIC_END_EVENT:
+                game.handle_music_end_event()
+            # ---------------------- CONTROLLER EVENTS (JOYBUTTONDOWN) ----------------------
+            elif event.type == pygame.JOYBUTTONDOWN:
+                if changing_button is not None:
+                    # In binding mode: capture the controller button and update the binding.
+                    settings.controller_menu_navigation[changing_button] = event.button
+                    settings.notify('controller_menu_navigation')
+                    changing_button = None
+                else:
+                    # Not in binding mode: process navigation via controller buttons.
+                    # Look the button up in the compiled menu navigation table.
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action == "up":
+                        selected_option = (selected_option - 1) % len(options)
+                    elif nav_action == "down":
+                        selected_option = (selected_option + 1) % len(options)
+                    elif nav_action == "back":
+                        action = "back"
+                    elif nav_action == "select":
+                        current_option = options[selected_option][0]
+                        if current_option == "exit":
+                            action = "exit"
+                        else:
+                            # Trigger binding capture for this option if it is bindable.
+                            if current_option in bindable_keys:
+                                changing_button = current_option
+            # ---------------------- D-PAD (JOYHATMOTION) NAVIGATION ----------------------
+            elif event.type == pygame.JOYHATMOTION:
+                if changing_button is None:
+                    hx, hy = event.value
+                    if hy == 1:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif hy == -1:
+                        selected_option = (selected_option + 1) % len(options)
+            # ---------------------- KEYBOARD EVENTS (NAVIGATION) ----------------------
+            elif event.type == pygame.KEYDOWN:
+                # Keyboard navigation is allowed, but keyboard keys will not update the binding.
+                if event.key == pygame.K_ESCAPE:
+                    if changing_button is not None:
+                        changing_button = None  # Cancel pending binding.
+                    else:
+                        action = "back"
+                elif changing_button is None:
+                    if event.key == pygame.K_UP:
+                        selected_option = (selected_option - 1) % len(options)
+                    elif event.key == pygame.K_DOWN:
+                        selected_option = (selected_option + 1) % len(options)
+                    # Use Enter to trigger binding capture (keyboard can trigger, but binding update is done via controller).
+                    elif event.key == pygame.K_RETURN and not enter_pressed:
+                        enter_pressed = True
+                        current_option = options[selected_option][0]
+                        if current_option == "exit":
+                            action = "exit"
+                        else:
+                            if current_option in bindable_keys:
+                                changing_button = current_option
+            elif event.type == pygame.KEYUP:
+                if event.key == pygame.K_RETURN:
+                    enter_pressed = False
+        return selected_option, changing_button, enter_pressed, action
+
+    # ---------------------- MAIN LOOP FOR CONTROLLER MENU NAV KEYBINDS ----------------------
+    while True:
+        game.screen.fill(BLACK)
+        title_text = game.tetris_font_large.render("Menu Nav Bindings", True, WHITE)
+        scaled_title = pygame.transform.scale(
+            title_text,
+            (int(title_text.get_width() * 0.8), int(title_text.get_height() * 0.8))
+        )
+        game.screen.blit(
+            scaled_title,
+            (game.SCREEN_WIDTH // 2 - scaled_title.get_width() // 2, 50)
+        )
+    
+        # Render each menu navigation option.
+        for i, (key, label) in enumerate(menu_nav_options):
+            # Decide the overall color (red if selected, else white).
+            color = game.RED if i == selected_option else WHITE
+        
+            y_coordinate = base_y + i * option_spacing
+            x_center = game.SCREEN_WIDTH // 2
+        
+            if key in bindable_keys:
+                # 1) Render the label part
+                label_text = label + ": "
+                label_surface = game.tetris_font_medium.render(label_text, True, color)
+            
+                # 2) Decide on the actual button text
+                current_binding = settings.controller_menu_navigation.get(key)
+                if current_binding is not None:
+                    binding_str = f"Button {current_binding}"
+                else:
+                    binding_str = "(none)"
+
+                # If we're currently capturing this key's binding, make it yellow
+                if changing_button == key:
+                    binding_color = game.YELLOW
+                else:
+                    binding_color = color
+
+                binding_surface = game.tetris_font_medium.render(binding_str, True, binding_color)
+
+                # Combine side by side, still center as a whole
+                combined_width = label_surface.get_width() + binding_surface.get_width()
+                x_start = x_center - (combined_width // 2)
+            
+                # Blit
+                game.screen.blit(label_surface, (x_start, y_coordinate))
+                game.screen.blit(binding_surface, (x_start + label_surface.get_width(), y_coordinate))
+        
+            else:
+                # Non-bindable option (e.g. "exit"). Render as a single string.
+                display_text = label
+                option_text = game.tetris_font_medium.render(display_text, True, color)
+            
+                # If this is the "exit" option, scale it as before.
+                if key == "exit":
+                    option_text = pygame.transform.scale(
+                        option_text,
+                        (int(option_text.get_width() * 0.85), int(option_text.get_height() * 0.85))
+                    )
+            
+                game.screen.blit(
+                    option_text,
+                    (x_center - option_text.get_width() // 2, y_coordinate)
+                )
+
+        game.present_display()
+
+        # Process events and handle actions.
+        selected_option, changing_button, enter_pressed, action = process_menu_nav_events(
+            menu_nav_options, selected_option, changing_button, enter_pressed, scheduler.wait()
+        )
+        if action is not None:
+            if action == "exit" or action == "back":
+                return
+
+def pause_game():
+    settings = game.settings
+    pause_text = game.tetris_font_large.render("PAUSED", True, WHITE)
+    paused = True
+    pygame.event.clear(pygame.KEYDOWN)
+    
+    # Pause the music as soon as the game is paused
+    if pygame.mixer.get_init():
+        pygame.mixer.music.pause()
+    
+    scheduler = ScreenScheduler()
+    while paused:
+        game.screen.fill(BLACK)
+        game.screen.blit(pause_text, (game.SCREEN_WIDTH // 2 - pause_text.get_width() // 2, game.SCREEN_HEIGHT // 2))
+        game.present_display()
+        
+        for event in scheduler.wait():
+            if event.type == pygame.QUIT:
+                game.save_settings(settings)
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.KEYDOWN:
+                # Unpause if the pause key (or Escape) is pressed on the keyboard.
+                if event.key == settings.controls['pause'] or event.key == pygame.K_ESCAPE:
+                    paused = False
+            elif event.type == pygame.JOYBUTTONDOWN:
+                # Unpause if the controller's pause/back button is pressed.
+                if game.input_mapper.game_table.get(("button", event.button)) == 'pause':
+                    paused = False
+
+    # Unpause the music when the game is resumed.
+    if pygame.mixer.get_init():
+        pygame.mixer.music.unpause()
+
+def draw_leaderboard(title, entries, y):
+    """Draws a ranked board on the game-over screen and returns the y below it."""
+    title_text = game.tetris_font_small.render(title, True, WHITE)
+    game.screen.blit(title_text, (game.SCREEN_WIDTH//2 - title_text.get_width()//2, y))
+    y += 30
+    if not entries:
+        entries_text = game.tetris_font_tiny.render("No scores yet", True, WHITE)
+        game.screen.blit(entries_text, (game.SCREEN_WIDTH//2 - entries_text.get_width()//2, y))
+        return y + 40
+    for rank, entry in enumerate(entries, 1):
+        row_text = game.tetris_font_tiny.render(
+            f"{rank:>2}. {entry['name']:<3} {entry['score']:>7}  L{entry['level']}", True, WHITE)
+        game.screen.blit(row_text, (game.SCREEN_WIDTH//2 - row_text.get_width()//2, y))
+        y += 22
+    return y + 18
+
+def draw_leaderboards(difficulty, y, k=5):
+    y = draw_leaderboard(f"Today ({difficulty.capitalize()})", game.leaderboard.today(difficulty, k), y)
+    draw_leaderboard("All-Time", game.leaderboard.top(difficulty, k), y)
+
+def display_game_over(score, stats):
+    """
+    stats carries the rest of the finished game for the leaderboard: difficulty, lines,
+    level, pieces, duration (ms) and seed. Returns a new game scene to restart, or None
+    to go back to the main menu.
+    """
+    settings = game.settings
+    difficulty = stats["difficulty"]
+
+    # ---------------- Helper Functions for Duplicate Logic ----------------
+    def restart_game():
+        if settings.music_enabled:
+            if settings.use_custom_music:
+                game.play_custom_music(settings)
+            else:
+                try:
+                    pygame.mixer.music.load(game.BACKGROUND_MUSIC_PATH)
+                    pygame.mixer.music.play(-1)
+                except Exception as e:
+                    print(f"Error loading default background music: {e}")
+        else:
+            game.stop_music()
+        return game.run_game()
+
+    # ---------------- NEW HIGH SCORE BRANCH ----------------
+    if game.leaderboard.qualifies(difficulty, score):
+        initials = ""
+        input_active = True
+        scheduler = ScreenScheduler()
+        while input_active:
+            game.screen.fill(BLACK)
+            game_over_text = game.tetris_font_large.render("NEW HIGH SCORE!", True, game.RED)
+            score_text = game.tetris_font_medium.render(f"Score: {score}", True, WHITE)
+            initials_text = game.tetris_font_medium.render(f"Enter Initials: {initials}", True, WHITE)
+            menu_text = game.tetris_font_small.render("Press M for Menu or ENTER to Save", True, WHITE)
+            game.screen.blit(game_over_text, (game.SCREEN_WIDTH//2 - game_over_text.get_width()//2, 50))
+            game.screen.blit(score_text, (game.SCREEN_WIDTH//2 - score_text.get_width()//2, 150))
+            game.screen.blit(initials_text, (game.SCREEN_WIDTH//2 - initials_text.get_width()//2, 250))
+            game.screen.blit(menu_text, (game.SCREEN_WIDTH//2 - menu_text.get_width()//2, 350))
+            draw_leaderboards(difficulty, 420)
+            game.present_display()
+            for event in scheduler.wait():
+                if event.type == pygame.QUIT:
+                    game.save_settings(settings)
+                    pygame.quit()
+                    sys.exit()
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_RETURN and initials:
+                        game.leaderboard.submit(dict(stats, name=initials, score=score))
+                        input_active = False
+                    elif event.key == pygame.K_BACKSPACE:
+                        initials = initials[:-1]
+                    elif len(initials) < 3 and event.unicode.isalnum():
+                        initials += event.unicode.upper()
+                    elif event.key == pygame.K_m:
+                        return None  # Back to the main menu.
+                elif event.type == pygame.JOYBUTTONDOWN:
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action:
+                        # Controller select acts like ENTER.
+                        if nav_action == "select":
+                            if initials:
+                                game.leaderboard.submit(dict(stats, name=initials, score=score))
+                                input_active = False
+                        # Controller back acts like M (menu).
+                        elif nav_action == "back":
+                            return None  # Back to the main menu.
+        # After saving the high score, restart the game.
+        return restart_game()
+
+    # ---------------- NORMAL GAME OVER BRANCH ----------------
+    else:
+        game.screen.fill(BLACK)
+        game_over_text = game.tetris_font_large.render("GAME OVER", True, game.RED)
+        score_text = game.tetris_font_medium.render(f"Score: {score}", True, WHITE)
+        restart_text = game.tetris_font_small.render("Press R to Restart", True, WHITE)
+        menu_text = game.tetris_font_small.render("Press M for Menu", True, WHITE)
+        game.screen.blit(game_over_text, (game.SCREEN_WIDTH//2 - game_over_text.get_width()//2, 50))
+        game.screen.blit(score_text, (game.SCREEN_WIDTH//2 - score_text.get_width()//2, 150))
+        draw_leaderboards(difficulty, 230)
+        game.screen.blit(restart_text, (game.SCREEN_WIDTH//2 - restart_text.get_width()//2, game.SCREEN_HEIGHT-130))
+        game.screen.blit(menu_text, (game.SCREEN_WIDTH//2 - menu_text.get_width()//2, game.SCREEN_HEIGHT-100))
+        scheduler = ScreenScheduler()
+        while True:
+            game.present_display()  # The screen is static; this only re-presents after input (e.g. a resize).
+            for event in scheduler.wait():
+                if event.type == pygame.QUIT:
+                    game.save_settings(settings)
+                    pygame.quit()
+                    sys.exit()
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_r:
+                        return restart_game()
+                    elif event.key == pygame.K_m:
+                        return None  # Back to the main menu.
+                elif event.type == pygame.JOYBUTTONDOWN:
+                    nav_action = game.input_mapper.menu_action(event)
+                    if nav_action:
+                        # Controller select acts as R (restart).
+                        if nav_action == "select":
+                            return restart_game()
+                        # Controller back acts as M (menu).
+                        elif nav_action == "back":
+                            return None  # Back to the main menu.
+
+# -------------------------- Scenes --------------------------
+class SceneManager:
+    """
+    Runs the screens from a single loop. A scene is a generator: each value it yields is a
+    scene pushed on top of it (it resumes once that one finishes), and the value it returns
+    replaces it (None pops it). Screens hand control back instead of calling each other, so
+    the stack stays flat and a finished game's state is released before the next one starts.
+    """
+    def __init__(self, scene):
+        self.stack = [scene]
+
+    def run(self):
+        while self.stack:
+            try:
+                pushed = next(self.stack[-1])
+            except StopIteration as finished:
+                self.stack.pop().close()
+                if finished.value is not None:
+                    self.stack.append(finished.value)
+                continue
+            self.stack.append(pushed)
+
+def screen_scene(screen_function, *args):
+    """Wraps a blocking screen function as a scene; its return value replaces it."""
+    return screen_function(*args)
+    yield  # Unreachable; makes this a generator.